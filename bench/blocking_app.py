@@ -0,0 +1,18 @@
+"""main1:app, в котором записи очереди выполняются прямо в цикле событий.
+
+Так обработчики работали до AsyncQueueManager: commit в SQLite
+останавливает цикл, и все остальные запросы ждут его. Нужен только для
+сравнения в bench/load_async.py, сам по себе не запускается.
+"""
+import profiler
+from main1 import app, queue
+
+
+async def run_blocking(func, *args):
+    """Замена AsyncQueueManager._run: запись без потока базы, в цикле событий"""
+    return queue._write(profiler.current_trace(), func, *args)
+
+
+queue._run = run_blocking
+
+__all__ = ["app"]
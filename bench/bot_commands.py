@@ -0,0 +1,139 @@
+"""Задержка команд бота (tg_bot.py) до API очереди: общий клиент против клиента на каждый вызов.
+
+Каждая команда бота - это запрос к API: /status - GET /status/{номер},
+/list - GET /queue, /leave - POST /leave/{номер}, /next - GET
+/next/batch. Тест поднимает API со свежей базой, ставит в очередь
+--preload человек и выполняет эти запросы так, как их делает бот:
+
+    shared   - tg_bot.api_request через общий keep-alive клиент из on_startup;
+    per_call - прежний api_request: новый httpx.AsyncClient на каждый
+               вызов, то есть новое TCP-соединение.
+
+--users чатов вызывают команды одновременно, по --calls раз каждый,
+команда выбирается по весам --mix. Telegram не нужен: время ответа
+пользователю здесь - только время запроса к API. Отчет - JSON с p50/p99
+по каждой команде для обоих вариантов.
+
+    python bench/bot_commands.py --calls 200 --users 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+
+from common import ROOT, percentiles, report, run_api
+
+COMMANDS = ("status", "list", "leave", "next")
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        if name not in COMMANDS:
+            raise argparse.ArgumentTypeError(f"неизвестная команда: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def per_call_request(api_url: str):
+    """api_request до общего клиента: свой AsyncClient на каждый запрос"""
+    async def request(method: str, endpoint: str, data=None, retries=None):
+        async with httpx.AsyncClient() as client:
+            if method == "GET":
+                response = await client.get(f"{api_url}{endpoint}")
+            else:
+                response = await client.post(f"{api_url}{endpoint}", json=data)
+            return response.json()
+    return request
+
+
+async def command(request, name: str, ids: list, rng: random.Random):
+    """Запрос к API, который делает обработчик команды name"""
+    if name == "status":
+        await request("GET", f"/status/{rng.choice(ids)}")
+    elif name == "list":
+        await request("GET", "/queue?limit=20")
+    elif name == "leave":
+        await request("POST", f"/leave/{ids.pop()}", {})
+    else:
+        await request("GET", "/next/batch?count=1", retries=0)
+
+
+async def chat(request, args, ids: list, seed: int, latencies: dict):
+    rng = random.Random(seed)
+    names, weights = list(args.mix), list(args.mix.values())
+    for _ in range(args.calls):
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        await command(request, name, ids, rng)
+        latencies[name].append(time.perf_counter() - started)
+
+
+async def run(api_url: str, args, shared: bool) -> dict:
+    import tg_bot  # Импорт после настройки окружения: бот читает его при загрузке
+
+    await tg_bot.on_startup(tg_bot.dp)
+    try:
+        ids = []
+        for start in range(0, args.preload, 1000):
+            tickets = [{"client_id": f"cmd-{shared}-{index}", "name": f"user{index}"}
+                       for index in range(start, min(args.preload, start + 1000))]
+            response = await tg_bot.api_request("POST", "/join/batch", {"tickets": tickets})
+            ids.extend(ticket["user_id"] for ticket in response["tickets"])
+        random.Random(args.seed).shuffle(ids)
+
+        request = tg_bot.api_request if shared else per_call_request(api_url)
+        latencies = {name: [] for name in args.mix}
+        started = time.perf_counter()
+        await asyncio.gather(*(chat(request, args, ids, args.seed + index, latencies)
+                               for index in range(args.users)))
+        elapsed = time.perf_counter() - started
+    finally:
+        for task in asyncio.all_tasks() - {asyncio.current_task()}:
+            task.cancel()  # Слушатель /events/all, запущенный on_startup
+        await tg_bot.on_shutdown(tg_bot.dp)
+        await (await tg_bot.bot.get_session()).close()
+
+    results = {"commands_per_sec": round(sum(map(len, latencies.values())) / elapsed, 1)}
+    for name, samples in latencies.items():
+        results[name] = percentiles(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200, help="команд от каждого чата")
+    parser.add_argument("--users", type=int, default=20, help="чатов, присылающих команды одновременно")
+    parser.add_argument("--mix", type=parse_mix, default="status=10,list=3,leave=1,next=1",
+                        help="веса команд")
+    parser.add_argument("--preload", type=int, default=10000, help="человек в очереди до начала")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл для отчета JSON")
+    args = parser.parse_args()
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+
+    sys.path.insert(0, ROOT)
+    results = {}
+    for variant in ("per_call", "shared"):
+        with tempfile.TemporaryDirectory() as directory, run_api(directory) as (api_url, pid):
+            os.environ.update({
+                "TELEGRAM_BOT_TOKEN": "123456:bench-token",
+                "ADMINS": "1",
+                "SUBSCRIPTIONS_DB": os.path.join(directory, "subscriptions.db"),
+                "QUEUE_API_URL": api_url,
+            })
+            # Бот запоминает адрес API при загрузке: каждый вариант - со своим сервером
+            sys.modules.pop("tg_bot", None)
+            sys.modules.pop("config", None)
+            results[variant] = asyncio.run(run(api_url, args, variant == "shared"))
+    report("bot_commands", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
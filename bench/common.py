@@ -0,0 +1,155 @@
+"""Общие части нагрузочных тестов: запуск API, замер памяти, перцентили, отчет JSON"""
+from contextlib import contextmanager
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Тесты мерят сервер, а не лимиты /join: без них один адрес не упрется в 429
+NO_JOIN_LIMITS = {"JOIN_RATE_CLIENT": "0", "JOIN_RATE_QUEUE": "0", "JOIN_SHED_MS": "0"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: int = None) -> dict:
+    """Текущая и пиковая резидентная память процесса в МиБ (Linux, /proc)"""
+    memory = {}
+    with open(f"/proc/{pid or 'self'}/status") as f:
+        for line in f:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                key = "rss_mb" if line.startswith("VmRSS") else "peak_rss_mb"
+                memory[key] = round(int(line.split()[1]) / 1024, 1)
+    return memory
+
+
+def process_tree(pid: int) -> list:
+    """pid и номера всех его потомков (Linux, /proc)"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except OSError:
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def tree_rss_mb(pid: int) -> dict:
+    """Суммарная резидентная память процесса и всех его потомков в МиБ"""
+    total = 0.0
+    for current in process_tree(pid):
+        try:
+            total += rss_mb(current).get("rss_mb", 0)
+        except OSError:
+            pass
+    return {"rss_mb": round(total, 1)}
+
+
+def cpu_seconds(pid: int) -> float:
+    """Процессорное время (user + system) процесса и всех его потомков в секундах"""
+    total = 0
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        total += int(fields[11]) + int(fields[12])  # utime и stime в тиках
+    return total / os.sysconf("SC_CLK_TCK")
+
+
+def percentiles(samples) -> dict:
+    """count, p50/p95/p99 и max в миллисекундах по списку длительностей в секундах"""
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0}
+
+    def at(share):
+        return round(samples[min(len(samples) - 1, int(share * len(samples)))] * 1000, 3)
+
+    return {"count": len(samples), "p50_ms": at(0.50), "p95_ms": at(0.95),
+            "p99_ms": at(0.99), "max_ms": round(samples[-1] * 1000, 3)}
+
+
+def wait_http(url: str, timeout: float = 20):
+    """Ждет, пока сервер начнет отвечать на GET url"""
+    import httpx
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} не ответил за {timeout} с")
+            time.sleep(0.1)
+
+
+@contextmanager
+def run_api(directory: str, workers: int = 0, env: dict = None, app: str = "main1:app"):
+    """Запускает app на свободном порту со свежей базой в directory.
+
+    workers=0 - один процесс uvicorn, как при разработке; больше 0 -
+    supervisor.py с workers процессами API и отдельным владельцем очередей
+    (всегда main1:app). env дополняет окружение сервера; лимиты /join
+    выключены, если env их не задает. app - модуль:приложение от корня
+    проекта, например "bench.blocking_app:app".
+    """
+    port = free_port()
+    env = {**os.environ, "QUEUE_DB": os.path.join(directory, "queue.db"), **NO_JOIN_LIMITS, **(env or {})}
+    if workers:
+        env.update({"API_HOST": "127.0.0.1", "API_PORT": str(port), "API_WORKERS": str(workers),
+                    "RUN_BOT": "0", "API_LOG_LEVEL": "warning"})
+        args = [sys.executable, "supervisor.py"]
+    else:
+        args = [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1",
+                "--port", str(port), "--log-level", "warning"]
+    process = subprocess.Popen(args, cwd=ROOT, env=env)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_http(f"{url}/queues")
+        yield url, process.pid
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def report(name: str, params: dict, results: dict, output: str = None):
+    """Печатает отчет и, если задан output, сохраняет его в файл для сравнения между коммитами"""
+    data = {
+        "benchmark": name,
+        "revision": git_revision(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    text = json.dumps(data, indent=2, ensure_ascii=False)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
@@ -0,0 +1,149 @@
+"""Отзывчивость экрана киоска (robot_interface.py) во время /join: интервалы между кадрами Tk.
+
+Проба - цикл root.after(--frame-ms): каждый вызов записывает время с
+предыдущего. Пока главный поток Tk свободен, интервал близок к 16 мс
+(60 кадров в секунду); если поток занят запросом к серверу, экран
+замирает и интервал растет до длительности запроса. kiosk_join_seconds
+меряет сеть, а не экран, поэтому смотреть нужно сюда.
+
+Вместо API - заглушка, которая отвечает на /join через --latency секунд
+(медленная сеть киоска). Тест --joins раз вводит имя и нажимает
+"Продолжить" в двух вариантах:
+
+    blocking - /join прямо в главном потоке Tk, как до фонового потока;
+    threaded - CatQueueApp как есть: join_worker в потоке, poll_join
+               проверяет ответ каждые POLL_MS.
+
+Нужен экран; на сервере без него - через Xvfb:
+
+    xvfb-run -a python bench/kiosk_frames.py --joins 20 --latency 0.3
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import ROOT, percentiles, report
+
+SLOW_FRAME = 0.05  # Интервал больше - пропущено не меньше двух кадров при 60 fps
+
+
+class SlowApi(BaseHTTPRequestHandler):
+    """/join отвечает через latency секунд; /join/batch - пустой ответ для синхронизации журнала"""
+
+    latency = 0.3
+    issued = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+        if self.path == "/join":
+            time.sleep(self.latency)
+            SlowApi.issued += 1
+            data = {"user_id": SlowApi.issued, "name": body.get("name"), "position": 1}
+        else:
+            data = {"tickets": []}
+        payload = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def blocking_queue_info(app):
+    """show_queue_info до фонового потока: запрос выполняется в главном потоке Tk"""
+    name = app.name_entry.get().strip()
+    app.show_wait_frame()
+    results = queue.Queue()
+    app.join_worker(name, app.join_key, results)
+    app.poll_join(name, results)
+
+
+def run(args, blocking: bool) -> dict:
+    import tkinter as tk
+    import robot_interface
+
+    root = tk.Tk()
+    app = robot_interface.CatQueueApp(root)
+    if blocking:
+        app.show_queue_info = lambda: blocking_queue_info(app)
+    intervals, joins = [], []
+    state = {"last": None, "started": None}
+
+    def tick():
+        now = time.perf_counter()
+        if state["last"] is not None:
+            intervals.append(now - state["last"])
+        state["last"] = now
+        root.after(args.frame_ms, tick)
+
+    def start_join():
+        app.show_name_frame()
+        app.name_entry.insert(0, "bench")
+        state["started"] = time.perf_counter()
+        app.show_queue_info()  # Нажатие "Продолжить"
+        root.after(robot_interface.POLL_MS, wait_ticket)
+
+    def wait_ticket():
+        if app.current_frame is not app.frames["ticket"]:
+            root.after(robot_interface.POLL_MS, wait_ticket)
+            return
+        joins.append(time.perf_counter() - state["started"])
+        if len(joins) == args.joins:
+            root.quit()
+            return
+        app.show_welcome_frame()
+        root.after(int(args.pause * 1000), start_join)
+
+    root.after(args.frame_ms, tick)
+    root.after(500, start_join)  # Окно успевает появиться
+    root.mainloop()
+    root.destroy()
+
+    return {"frames": percentiles(intervals), "join": percentiles(joins),
+            "slow_frames": sum(interval > SLOW_FRAME for interval in intervals)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--joins", type=int, default=20, help="записей в очередь на вариант")
+    parser.add_argument("--latency", type=float, default=0.3, help="секунд до ответа /join")
+    parser.add_argument("--pause", type=float, default=0.2, help="секунд между записями")
+    parser.add_argument("--frame-ms", type=int, default=16, help="период пробы, мс")
+    parser.add_argument("--output", help="файл для отчета JSON")
+    args = parser.parse_args()
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    if not os.environ.get("DISPLAY"):
+        sys.exit("Нужен экран; без него: xvfb-run -a python bench/kiosk_frames.py")
+
+    SlowApi.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    sys.path.insert(0, ROOT)
+    import robot_interface
+    robot_interface.API_URL = f"http://127.0.0.1:{server.server_address[1]}"
+
+    results = {}
+    for variant in ("blocking", "threaded"):
+        # Журнал и настройки киоска - в текущем каталоге: у каждого варианта свой
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copy(os.path.join(ROOT, "qr_bot.jpg"), directory)
+            os.chdir(directory)
+            results[variant] = run(args, variant == "blocking")
+            os.chdir(ROOT)
+    server.shutdown()
+    report("kiosk_frames", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
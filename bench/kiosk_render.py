@@ -0,0 +1,148 @@
+"""Время смены экрана в киоске (robot_interface.py) и организаторе (organizator.py).
+
+Смена экрана меряется вместе с отрисовкой: вызов и root.update(), после
+которого окно уже перерисовано. Оба окна проходят свои экраны по кругу
+--cycles раз в двух вариантах:
+
+    rebuild - как до сборки экранов один раз: текущий экран уничтожается
+              и следующий строится заново (clear_frame/clear_content), тема
+              ttk выбирается заново там, где это делал старый код;
+    tkraise - приложение как есть: готовый экран поднимается наверх.
+
+Отдельно - время запуска окна (startup_ms): в варианте tkraise все экраны
+строятся при запуске. Нужен экран; на сервере без него - через Xvfb:
+
+    xvfb-run -a python bench/kiosk_render.py --cycles 50
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from common import ROOT, percentiles, report
+
+KIOSK_SCREENS = ("welcome", "name", "wait", "ticket", "qr")
+ORGANIZER_SCREENS = ("dashboard", "queue", "settings")
+TICKET = {"user_id": 42, "position": 5, "estimated_wait": 600}
+
+
+def timed(root, switch) -> float:
+    started = time.perf_counter()
+    switch()
+    root.update()
+    return time.perf_counter() - started
+
+
+def kiosk_switches(app, rebuild: bool) -> dict:
+    """Функции смены экрана киоска по имени экрана"""
+    if not rebuild:
+        return {
+            "welcome": app.show_welcome_frame,
+            "name": app.show_name_frame,
+            "wait": app.show_wait_frame,
+            "ticket": lambda: app.show_ticket_frame("bench", TICKET),
+            "qr": app.show_qr_frame,
+        }
+    builders = {
+        "welcome": app.build_welcome_frame,
+        "name": app.build_name_frame,
+        "wait": app.build_wait_frame,
+        "ticket": app.build_ticket_frame,
+        "qr": app.build_qr_frame,
+    }
+    for frame in app.frames.values():
+        if frame is not app.current_frame:
+            frame.destroy()
+
+    def switch(name):
+        app.current_frame.destroy()
+        if name == "welcome":
+            app.setup_style()  # Старый show_welcome_frame заново выбирал тему
+        app.current_frame = builders[name]()
+        app.current_frame.grid(row=0, column=0, sticky="nsew")
+        if name == "ticket":
+            app.ticket_name_label.config(text="bench, ваш номер:")
+            app.ticket_number_label.config(text=str(TICKET["user_id"]))
+
+    return {name: (lambda name=name: switch(name)) for name in KIOSK_SCREENS}
+
+
+def organizer_switches(app, rebuild: bool) -> dict:
+    """Функции смены экрана организатора по имени экрана"""
+    if not rebuild:
+        return {"dashboard": app.show_dashboard, "queue": app.show_queue_interface,
+                "settings": app.show_settings}
+    builders = {"dashboard": app.build_dashboard, "queue": app.build_queue_interface,
+                "settings": app.build_settings}
+
+    def switch(name):
+        for widget in app.content_frame.winfo_children():
+            widget.destroy()
+        frame = builders[name]()
+        frame.grid(row=0, column=0, sticky="nsew")
+        if name == "queue":
+            app.queue_frame = frame
+            app.style.theme_use('clam')  # Старый show_queue_interface заново выбирал тему
+            app.apply_preview_colors()
+
+    return {name: (lambda name=name: switch(name)) for name in ORGANIZER_SCREENS}
+
+
+def run(make_app, switches, screens, args, rebuild: bool) -> dict:
+    import tkinter as tk
+
+    root = tk.Tk()
+    started = time.perf_counter()
+    app = make_app(root)
+    root.update()
+    startup = time.perf_counter() - started
+
+    by_name = switches(app, rebuild)
+    samples = {name: [] for name in screens}
+    for _ in range(args.cycles):
+        for name in screens:
+            samples[name].append(timed(root, by_name[name]))
+    root.destroy()
+
+    results = {"startup_ms": round(startup * 1000, 3),
+               "switch": percentiles([sample for values in samples.values() for sample in values])}
+    for name, values in samples.items():
+        results[name] = percentiles(values)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=50, help="проходов по всем экранам на вариант")
+    parser.add_argument("--output", help="файл для отчета JSON")
+    args = parser.parse_args()
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    if not os.environ.get("DISPLAY"):
+        sys.exit("Нужен экран; без него: xvfb-run -a python bench/kiosk_render.py")
+
+    sys.path.insert(0, ROOT)
+    import organizator
+    import robot_interface
+    organizator.API_URL = "http://127.0.0.1:9"  # Лента изменений сразу получает отказ
+
+    windows = {
+        "kiosk": (robot_interface.CatQueueApp, kiosk_switches, KIOSK_SCREENS),
+        "organizer": (organizator.RobotQueueOrganizer, organizer_switches, ORGANIZER_SCREENS),
+    }
+    results = {}
+    for window, (make_app, switches, screens) in windows.items():
+        results[window] = {}
+        for variant in ("rebuild", "tkraise"):
+            # Журнал киоска и settings.json - в текущем каталоге: у каждого прогона свои
+            with tempfile.TemporaryDirectory() as directory:
+                shutil.copy(os.path.join(ROOT, "qr_bot.jpg"), directory)
+                os.chdir(directory)
+                results[window][variant] = run(make_app, switches, screens, args, variant == "rebuild")
+                os.chdir(ROOT)
+    report("kiosk_render", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Нагрузочный тест API очереди (main1.py) смесью запросов join/status/next.
+
+Поднимает uvicorn со свежей базой во временном каталоге (с --workers -
+supervisor.py с несколькими процессами API; или использует уже
+запущенный сервер через --url), заполняет очередь и в течение
+--duration секунд держит --concurrency параллельных клиентов. Каждый
+клиент выбирает запрос по весам --mix и, если задан --think, ждет
+начала следующего, как киоск или бот, опрашивающий раз в несколько
+секунд. Отчет - JSON с пропускной способностью, p50/p95/p99 по каждому
+виду запроса и памятью сервера.
+
+    python bench/load_api.py --duration 20 --concurrency 50 --mix join=1,status=20,next=1
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+
+import httpx
+
+from common import percentiles, report, rss_mb, run_api, tree_rss_mb
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        if name not in ("join", "status", "next"):
+            raise argparse.ArgumentTypeError(f"неизвестный запрос: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+async def preload(client: httpx.AsyncClient, count: int) -> list:
+    """Ставит count человек в очередь пачками и возвращает их номера"""
+    ids = []
+    for start in range(0, count, 1000):
+        tickets = [{"client_id": f"preload-{index}", "name": f"user{index}"}
+                   for index in range(start, min(count, start + 1000))]
+        response = await client.post("/join/batch", json={"tickets": tickets})
+        ids.extend(ticket["user_id"] for ticket in response.json()["tickets"])
+    return ids
+
+
+async def worker(client: httpx.AsyncClient, rng: random.Random, mix: dict, ids: list,
+                 deadline: float, latencies: dict, errors: dict, think: float = 0.0):
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            if name == "join":
+                response = await client.post("/join", json={"name": "bench"})
+                if response.status_code == 200:
+                    ids.append(response.json()["user_id"])
+            elif name == "status":
+                response = await client.get(f"/status/{rng.choice(ids) if ids else 0}")
+            else:
+                response = await client.get("/next")
+            failed = response.status_code >= 500
+        except httpx.HTTPError:
+            failed = True
+        elapsed = time.perf_counter() - started
+        latencies[name].append(elapsed)
+        if failed:
+            errors[name] += 1
+        if think:
+            await asyncio.sleep(max(0.0, think - elapsed))
+
+
+async def run(url: str, args) -> dict:
+    mix = args.mix
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=30, limits=limits) as client:
+        ids = await preload(client, args.preload)
+        latencies = {name: [] for name in mix}
+        errors = {name: 0 for name in mix}
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            worker(client, random.Random(args.seed + index), mix, ids, deadline, latencies, errors, args.think)
+            for index in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    results = {"total_rps": round(sum(map(len, latencies.values())) / elapsed, 1)}
+    for name in mix:
+        results[name] = {**percentiles(latencies[name]),
+                         "rps": round(len(latencies[name]) / elapsed, 1),
+                         "errors": errors[name]}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="адрес уже запущенного API; по умолчанию запускается свой")
+    parser.add_argument("--duration", type=float, default=10, help="секунд нагрузки")
+    parser.add_argument("--concurrency", type=int, default=50, help="параллельных клиентов")
+    parser.add_argument("--mix", type=parse_mix, default="join=1,status=20,next=1",
+                        help="веса запросов")
+    parser.add_argument("--preload", type=int, default=10000, help="человек в очереди до начала")
+    parser.add_argument("--think", type=float, default=0,
+                        help="секунд от начала запроса клиента до следующего (0 - без пауз)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="процессов API под supervisor.py (0 - один uvicorn)")
+    parser.add_argument("--output", help="файл для отчета JSON")
+    args = parser.parse_args()
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+
+    if args.url:
+        results = asyncio.run(run(args.url, args))
+    else:
+        with tempfile.TemporaryDirectory() as directory, \
+                run_api(directory, args.workers) as (url, pid):
+            results = asyncio.run(run(url, args))
+            results["server_memory"] = tree_rss_mb(pid) if args.workers else rss_mb(pid)
+    results["client_memory"] = rss_mb()
+    report("load_api", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
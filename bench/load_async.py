@@ -0,0 +1,58 @@
+"""Нагрузочный тест: записи в цикле событий против потока базы AsyncQueueManager.
+
+Тот же сервер и та же смесь, что в load_api.py, по --concurrency
+клиентов (по умолчанию 200), в двух вариантах, каждый на свежей базе:
+
+    blocking - bench/blocking_app.py: add_user, get_next и remove_user
+               выполняются прямо в цикле событий, как до AsyncQueueManager,
+               и каждый commit задерживает все остальные запросы;
+    async    - main1:app как есть: записи в отдельном потоке базы.
+
+Записи в обоих вариантах с commit на каждую (QUEUE_FLUSH_INTERVAL=0),
+поэтому разница - только в том, где ждут commit. Клиенты делают паузы
+(--think), чтобы нагрузка была ниже предела сервера: при насыщении оба
+варианта упираются в процессор и задержки сравнивать бессмысленно.
+Клиенты работают на той же машине, поэтому абсолютные задержки выше,
+чем у настоящих киосков; сравнивать стоит варианты между собой. Отчет -
+JSON с p50/p99 по каждому виду запроса для обоих вариантов.
+
+    python bench/load_async.py --duration 10 --concurrency 200
+"""
+import argparse
+import asyncio
+import tempfile
+
+from common import report, run_api
+from load_api import parse_mix, run
+
+VARIANTS = {
+    "blocking": "bench.blocking_app:app",
+    "async": "main1:app",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10, help="секунд нагрузки на вариант")
+    parser.add_argument("--concurrency", type=int, default=200, help="параллельных клиентов")
+    parser.add_argument("--mix", type=parse_mix, default="join=1,status=20,next=1",
+                        help="веса запросов")
+    parser.add_argument("--preload", type=int, default=10000, help="человек в очереди до начала")
+    parser.add_argument("--think", type=float, default=1.0,
+                        help="секунд от начала запроса клиента до следующего: нагрузка ниже предела сервера")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="какие варианты прогонять")
+    parser.add_argument("--output", help="файл для отчета JSON")
+    args = parser.parse_args()
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+
+    results = {}
+    for variant in args.variants.split(","):
+        with tempfile.TemporaryDirectory() as directory, \
+                run_api(directory, env={"QUEUE_FLUSH_INTERVAL": "0"}, app=VARIANTS[variant]) as (url, pid):
+            results[variant] = asyncio.run(run(url, args))
+    report("load_async", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Нагрузочный тест уведомлений бота (tg_bot.py) с заглушкой вместо Telegram.
+
+Поднимает API очереди и telegram_stub.py, ставит в очередь --tickets
+человек и подписывает на них --subscribers чатов. Затем --cycles раз
+вызывает check_queue_and_notify (как опрос бота) и продвигает очередь
+на --advance человек, как команда /next. Поток /events/all бот слушает так
+же, как в работе. Отчет - JSON с длительностью цикла опроса, задержкой
+отправки сообщений, числом отправленных и памятью процессов.
+
+    python bench/load_bot.py --subscribers 5000 --tickets 2000 --cycles 30
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from common import ROOT, free_port, percentiles, report, rss_mb, run_api, wait_http
+
+
+async def run(stub_url: str, args) -> dict:
+    sys.path.insert(0, ROOT)
+    import tg_bot  # Импорт после настройки окружения: бот читает его при загрузке
+
+    send_latencies = []
+    send_message = tg_bot.bot.send_message
+
+    async def timed_send_message(*call_args, **call_kwargs):
+        started = time.perf_counter()
+        try:
+            return await send_message(*call_args, **call_kwargs)
+        finally:
+            send_latencies.append(time.perf_counter() - started)
+
+    tg_bot.bot.send_message = timed_send_message
+    await tg_bot.on_startup(tg_bot.dp)
+
+    ticket_ids = []
+    for start in range(0, args.tickets, 1000):
+        tickets = [{"client_id": f"bot-{index}", "name": f"user{index}"}
+                   for index in range(start, min(args.tickets, start + 1000))]
+        response = await tg_bot.api_request("POST", "/join/batch", {"tickets": tickets})
+        ticket_ids.extend(ticket["user_id"] for ticket in response["tickets"])
+
+    started = time.perf_counter()
+    for index in range(args.subscribers):
+        tg_bot.user_data.subscribe(100000 + index, ticket_ids[index % len(ticket_ids)])
+    subscribe_seconds = time.perf_counter() - started
+
+    cycles = []
+    started = time.perf_counter()
+    for _ in range(args.cycles):
+        cycle_started = time.perf_counter()
+        await tg_bot.check_queue_and_notify()
+        cycles.append(time.perf_counter() - cycle_started)
+        response = await tg_bot.api_request("GET", f"/next/batch?count={args.advance}", retries=0)
+        for user in response.get("users", []):
+            await tg_bot.notify_served(user["user_id"])
+    elapsed = time.perf_counter() - started
+
+    for task in asyncio.all_tasks() - {asyncio.current_task()}:
+        task.cancel()  # Слушатель /events/all, запущенный on_startup
+    await tg_bot.on_shutdown(tg_bot.dp)
+    await (await tg_bot.bot.get_session()).close()
+    async with httpx.AsyncClient() as client:
+        stub = (await client.get(f"{stub_url}/stats")).json()
+
+    return {
+        "subscribe_per_sec": round(args.subscribers / subscribe_seconds, 1),
+        "poll_cycle": percentiles(cycles),
+        "send": {**percentiles(send_latencies), "rps": round(len(send_latencies) / elapsed, 1)},
+        "telegram_stub": stub,
+        "subscribers_left": len(tg_bot.user_data),
+        "bot_memory": rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=5000, help="подписанных чатов")
+    parser.add_argument("--tickets", type=int, default=2000, help="человек в очереди")
+    parser.add_argument("--cycles", type=int, default=30, help="циклов опроса")
+    parser.add_argument("--advance", type=int, default=3, help="вызовов /next между циклами")
+    parser.add_argument("--latency", type=float, default=50, help="задержка заглушки Telegram, мс")
+    parser.add_argument("--fail-rate", type=float, default=0.01, help="доля ответов 403 от заглушки")
+    parser.add_argument("--output", help="файл для отчета JSON")
+    args = parser.parse_args()
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+
+    stub_port = free_port()
+    stub = subprocess.Popen([sys.executable, os.path.join(ROOT, "bench", "telegram_stub.py"),
+                             "--port", str(stub_port), "--latency", str(args.latency),
+                             "--fail-rate", str(args.fail_rate)])
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    try:
+        wait_http(f"{stub_url}/stats")
+        with tempfile.TemporaryDirectory() as directory, run_api(directory) as (api_url, pid):
+            os.environ.update({
+                "TELEGRAM_BOT_TOKEN": "123456:bench-token",
+                "ADMINS": "1",
+                "SUBSCRIPTIONS_DB": os.path.join(directory, "subscriptions.db"),
+                "QUEUE_API_URL": api_url,
+                "TELEGRAM_API_URL": stub_url,
+            })
+            results = asyncio.run(run(stub_url, args))
+            results["api_memory"] = rss_mb(pid)
+    finally:
+        stub.terminate()
+        stub.wait(10)
+    report("load_bot", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
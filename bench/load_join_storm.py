@@ -0,0 +1,136 @@
+"""Нагрузочный тест шквала /join: держится ли /status тех, кто уже в очереди.
+
+--pollers клиентов раз в --poll-every секунд запрашивают /status/{свой
+номер}, а --stormers клиентов вместе шлют --storm-rate /join в секунду,
+не дожидаясь ответов, как скрипт или залипшая кнопка киоска. Каждый
+шлющий ходит со своего адреса 127.0.x.y (в Linux весь 127/8 - локальный),
+чтобы лимит клиента и лимит очереди срабатывали как у настоящих
+клиентов. Нагрузка задана частотой, а не числом параллельных клиентов,
+поэтому отказы не ускоряют шквал. Варианты, каждый на свежем сервере:
+
+    calm    - без шквала, только опрос: точка отсчета;
+    storm   - шквал без лимитов (JOIN_RATE_*=0, JOIN_SHED_MS=0);
+    limited - шквал с лимитами и отказами по умолчанию (ratelimit.py).
+
+Отчет - JSON с p50/p99 и пропускной способностью /status, кодами ответов
+/join и временем принятых /join.
+
+    python bench/load_join_storm.py --duration 10 --pollers 50 --storm-rate 300
+"""
+import argparse
+import asyncio
+import collections
+import tempfile
+import time
+
+import httpx
+
+from common import percentiles, report, run_api
+
+LIMITS = {"JOIN_RATE_CLIENT": "1", "JOIN_BURST_CLIENT": "5", "JOIN_RATE_QUEUE": "20",
+          "JOIN_BURST_QUEUE": "100", "JOIN_SHED_MS": "500"}
+VARIANTS = {
+    # имя: (шквал, окружение сервера)
+    "calm": (False, {}),
+    "storm": (True, {}),
+    "limited": (True, LIMITS),
+}
+
+
+def client(url: str, index: int, connections: int) -> httpx.AsyncClient:
+    """Клиент со своим адресом 127.0.x.y"""
+    address = f"127.0.{index // 250}.{index % 250 + 2}"
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    return httpx.AsyncClient(base_url=url, timeout=30,
+                             transport=httpx.AsyncHTTPTransport(local_address=address, limits=limits))
+
+
+async def poller(http: httpx.AsyncClient, user_id: int, every: float, deadline: float, stats: dict):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await http.get(f"/status/{user_id}")
+            if response.status_code != 200:
+                stats["errors"] += 1
+        except httpx.HTTPError:
+            stats["errors"] += 1
+        elapsed = time.perf_counter() - started
+        stats["status"].append(elapsed)
+        await asyncio.sleep(max(0.0, every - elapsed))
+
+
+async def join(http: httpx.AsyncClient, stats: dict):
+    started = time.perf_counter()
+    try:
+        response = await http.post("/join", json={"name": "storm"})
+    except httpx.HTTPError:
+        stats["codes"]["error"] += 1
+        return
+    stats["codes"][str(response.status_code)] += 1
+    if response.status_code == 200:
+        stats["join"].append(time.perf_counter() - started)
+
+
+async def stormer(http: httpx.AsyncClient, every: float, deadline: float, stats: dict):
+    """Шлет /join раз в every секунд, не дожидаясь ответов на предыдущие"""
+    pending = set()
+    while time.perf_counter() < deadline:
+        task = asyncio.create_task(join(http, stats))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        await asyncio.sleep(every)
+    await asyncio.gather(*pending)
+
+
+async def run(url: str, args, storm: bool) -> dict:
+    pollers = client(url, 0, args.pollers)
+    stormers = [client(url, 1 + index, 10) for index in range(args.stormers if storm else 0)]
+    try:
+        tickets = [{"client_id": f"storm-{index}", "name": f"user{index}"} for index in range(args.pollers)]
+        response = await pollers.post("/join/batch", json={"tickets": tickets})
+        ids = [ticket["user_id"] for ticket in response.json()["tickets"]]
+
+        stats = {"status": [], "join": [], "codes": collections.Counter(), "errors": 0}
+        started = time.perf_counter()
+        deadline = started + args.duration
+        every = args.stormers / args.storm_rate
+        await asyncio.gather(*(poller(pollers, user_id, args.poll_every, deadline, stats) for user_id in ids),
+                             *(stormer(http, every, deadline, stats) for http in stormers))
+        elapsed = time.perf_counter() - started
+    finally:
+        for http in [pollers] + stormers:
+            await http.aclose()
+
+    return {
+        "status": {**percentiles(stats["status"]), "rps": round(len(stats["status"]) / elapsed, 1),
+                   "errors": stats["errors"]},
+        "join": {**percentiles(stats["join"]), "accepted_rps": round(len(stats["join"]) / elapsed, 1),
+                 "codes": dict(stats["codes"])},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10, help="секунд нагрузки на вариант")
+    parser.add_argument("--pollers", type=int, default=50, help="клиентов, опрашивающих /status")
+    parser.add_argument("--poll-every", type=float, default=0.2, help="секунд между опросами клиента")
+    parser.add_argument("--stormers", type=int, default=50, help="адресов, с которых идет шквал /join")
+    parser.add_argument("--storm-rate", type=float, default=300, help="/join в секунду от всех вместе")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="какие варианты прогонять")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="процессов API под supervisor.py (0 - один uvicorn)")
+    parser.add_argument("--output", help="файл для отчета JSON")
+    args = parser.parse_args()
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+
+    results = {}
+    for variant in args.variants.split(","):
+        storm, env = VARIANTS[variant]
+        with tempfile.TemporaryDirectory() as directory, \
+                run_api(directory, args.workers, env) as (url, pid):
+            results[variant] = asyncio.run(run(url, args, storm))
+    report("load_join_storm", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Нагрузочный тест опроса: много клиентов читают очередь, которая меняется редко.
+
+Так работают киоск, панель организатора и бот: --pollers клиентов
+непрерывно опрашивают /status/{свой номер}, /queue и /queue/changes
+(веса - --mix), а оператор раз в --next-every секунд вызывает /next и
+ставит в очередь нового человека. Тест прогоняется в нескольких
+вариантах, каждый на свежем сервере:
+
+    nocache - кэш ответов выключен (RESPONSE_CACHE_SIZE=0), без ETag;
+    cache   - кэш ответов на сервере, клиенты не присылают If-None-Match;
+    etag    - кэш и If-None-Match: неизменившийся ответ приходит как 304.
+
+Отчет - JSON с пропускной способностью, p50/p99, долей ответов 304,
+объемом ответов, процессорным временем сервера на запрос и статистикой
+кэша сервера (/cache/stats).
+
+    python bench/load_poll.py --duration 10 --pollers 200
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+
+import httpx
+
+from common import cpu_seconds, percentiles, report, run_api
+
+VARIANTS = {
+    # имя: (размер кэша на сервере, присылать If-None-Match)
+    "nocache": (0, False),
+    "cache": (10000, False),
+    "etag": (10000, True),
+}
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        if name not in ("status", "queue", "changes"):
+            raise argparse.ArgumentTypeError(f"неизвестный запрос: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+async def poller(client: httpx.AsyncClient, rng: random.Random, mix: dict, user_id: int,
+                 etag: bool, deadline: float, stats: dict):
+    names, weights = list(mix), list(mix.values())
+    etags = {}  # {url: последний ETag}
+    version = 0
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        if name == "status":
+            url = f"/status/{user_id}"
+        elif name == "queue":
+            url = "/queue?limit=20"
+        else:
+            url = f"/queue/changes?since={version}"
+        headers = {"If-None-Match": etags[url]} if etag and url in etags else {}
+        started = time.perf_counter()
+        try:
+            response = await client.get(url, headers=headers)
+        except httpx.HTTPError:
+            stats["errors"] += 1
+            continue
+        stats["latency"][name].append(time.perf_counter() - started)
+        stats["bytes"] += len(response.content)
+        if response.status_code == 304:
+            stats["not_modified"] += 1
+        elif response.status_code >= 500:
+            stats["errors"] += 1
+        elif response.status_code == 200:
+            if "etag" in response.headers:
+                etags[url] = response.headers["etag"]
+            if name == "changes":
+                version = response.json()["version"]
+
+
+async def operator(client: httpx.AsyncClient, every: float, deadline: float):
+    """Вызывает следующего и ставит нового, чтобы длина очереди не менялась"""
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(every)
+        await client.get("/next")
+        await client.post("/join", json={"name": "bench"})
+
+
+async def run(url: str, pid: int, args, etag: bool) -> dict:
+    limits = httpx.Limits(max_connections=args.pollers, max_keepalive_connections=args.pollers)
+    async with httpx.AsyncClient(base_url=url, timeout=30, limits=limits) as client:
+        tickets = [{"client_id": f"poll-{index}", "name": f"user{index}"}
+                   for index in range(args.queue)]
+        ids = []
+        for start in range(0, len(tickets), 1000):
+            response = await client.post("/join/batch", json={"tickets": tickets[start:start + 1000]})
+            ids.extend(ticket["user_id"] for ticket in response.json()["tickets"])
+
+        stats = {"latency": {name: [] for name in args.mix}, "bytes": 0, "not_modified": 0,
+                 "errors": 0}
+        started = time.perf_counter()
+        cpu_started = cpu_seconds(pid)
+        deadline = started + args.duration
+        await asyncio.gather(
+            operator(client, args.next_every, deadline),
+            *(poller(client, random.Random(args.seed + index), args.mix,
+                     ids[-1 - index % len(ids)], etag, deadline, stats)
+              for index in range(args.pollers)))
+        elapsed = time.perf_counter() - started
+        cpu = cpu_seconds(pid) - cpu_started
+        cache = (await client.get("/cache/stats")).json()
+
+    total = sum(map(len, stats["latency"].values()))
+    results = {
+        "total_rps": round(total / elapsed, 1),
+        "not_modified_share": round(stats["not_modified"] / total, 4) if total else None,
+        "kib_per_request": round(stats["bytes"] / 1024 / total, 3) if total else None,
+        "server_cpu_us_per_request": round(cpu / total * 1e6) if total else None,
+        "errors": stats["errors"],
+        "server_cache": cache,
+    }
+    for name, samples in stats["latency"].items():
+        results[name] = percentiles(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10, help="секунд нагрузки на вариант")
+    parser.add_argument("--pollers", type=int, default=200, help="опрашивающих клиентов")
+    parser.add_argument("--mix", type=parse_mix, default="status=8,queue=1,changes=1",
+                        help="веса запросов")
+    parser.add_argument("--queue", type=int, default=500, help="человек в очереди")
+    parser.add_argument("--next-every", type=float, default=1.0, help="секунд между вызовами /next")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="какие варианты прогонять")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="процессов API под supervisor.py (0 - один uvicorn)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл для отчета JSON")
+    args = parser.parse_args()
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+
+    results = {}
+    for variant in args.variants.split(","):
+        cache_size, etag = VARIANTS[variant]
+        with tempfile.TemporaryDirectory() as directory, \
+                run_api(directory, args.workers, {"RESPONSE_CACHE_SIZE": str(cache_size)}) as (url, pid):
+            results[variant] = asyncio.run(run(url, pid, args, etag))
+    report("load_poll", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Время get_position и get_page от длины очереди: от 100 до 1M стоящих.
+
+Для каждой длины из --sizes очередь заполняется в памяти (база
+":memory:", журнал не сбрасывается до закрытия), затем меряются
+--samples вызовов get_position и get_page по случайным номерам. После
+этого --churn циклов "пришел один - вызван один" проверяют, что индекс
+полосы (ids и дерево Фенвика) растет с длиной очереди, а не с числом
+приходов: в отчете его размер до и после.
+
+    python bench/position_scale.py --sizes 100,1000,10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import percentiles, report  # noqa: E402
+from queue_manager import DEFAULT_QUEUE, QueueManager  # noqa: E402
+
+BATCH = 10000  # Человек в одном add_users при заполнении
+
+
+def measure(call, ids, samples: int, rng: random.Random) -> dict:
+    latencies = []
+    for _ in range(samples):
+        user_id = rng.choice(ids)
+        started = time.perf_counter()
+        call(user_id)
+        latencies.append(time.perf_counter() - started)
+    return percentiles(latencies)
+
+
+def run(size: int, args) -> dict:
+    rng = random.Random(args.seed)
+    queue = QueueManager(":memory:", flush_interval=3600)
+    try:
+        started = time.perf_counter()
+        ids = []
+        for first in range(0, size, BATCH):
+            users = queue.add_users((f"user{index}", None, 0, None)
+                                    for index in range(first, min(size, first + BATCH)))
+            ids.extend(user.id for user in users)
+        fill_seconds = time.perf_counter() - started
+        lane = queue._queue(DEFAULT_QUEUE).lanes[0]
+
+        results = {
+            "fill_us_per_user": round(fill_seconds / size * 1e6, 3),
+            "position": measure(queue.get_position, ids, args.samples, rng),
+            "page": measure(lambda user_id: queue.get_page(after=user_id, limit=20), ids, args.samples, rng),
+            "index_before_churn": len(lane.ids),
+        }
+        for index in range(args.churn):
+            queue.add_user(f"churn{index}")
+            queue.get_next()
+        results["index_after_churn"] = len(lane.ids)
+        ids = queue.get_head(min(size, 1000))
+        results["position_after_churn"] = measure(queue.get_position, ids, args.samples, rng)
+    finally:
+        queue.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000,100000,1000000", help="длины очереди через запятую")
+    parser.add_argument("--samples", type=int, default=20000, help="замеров на вызов и длину")
+    parser.add_argument("--churn", type=int, default=200000, help="циклов пришел-вызван после замеров")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл для отчета JSON")
+    args = parser.parse_args()
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+
+    results = {}
+    for size in map(int, args.sizes.split(",")):
+        results[str(size)] = run(size, args)
+    report("position_scale", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
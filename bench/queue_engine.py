@@ -0,0 +1,144 @@
+"""Пропускная способность QueueManager: SQLite на каждый вызов против очереди в памяти с журналом.
+
+Варианты на свежей базе во временном каталоге, одна и та же смесь
+join/status/next (веса --mix) из одного потока:
+
+    sql          - как до очереди в памяти: каждый вызов - запрос к SQLite,
+                   каждая запись - свой commit (SqlQueue ниже);
+    sync         - QueueManager(flush_interval=0): чтения из памяти, commit на запись;
+    write_behind - QueueManager(flush_interval=--flush-interval): записи
+                   копятся в журнале и уходят в базу одной транзакцией.
+
+Все варианты открывают базу с настройками StorageProfile.from_env(),
+поэтому, например, SQLITE_SYNCHRONOUS=FULL меняет их одинаково. Отчет -
+JSON с операциями в секунду и временем каждого вида вызова.
+
+    python bench/queue_engine.py --seconds 5 --queue 10000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import percentiles, report  # noqa: E402
+from queue_manager import QueueManager  # noqa: E402
+from storage import StorageProfile  # noqa: E402
+
+
+class SqlQueue:
+    """Очередь без состояния в памяти: запрос к SQLite на каждый вызов, commit на каждую запись"""
+
+    def __init__(self, db_path: str):
+        self.conn = StorageProfile.from_env().connect(db_path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS users ("
+                          "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL,"
+                          " joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+        self.conn.commit()
+
+    def add_user(self, name: str) -> int:
+        cursor = self.conn.execute("INSERT INTO users (name) VALUES (?)", (name,))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def get_position(self, user_id: int):
+        if self.conn.execute("SELECT 1 FROM users WHERE id = ?", (user_id,)).fetchone() is None:
+            return None
+        return self.conn.execute("SELECT COUNT(*) FROM users WHERE id <= ?", (user_id,)).fetchone()[0]
+
+    def get_next(self):
+        row = self.conn.execute("SELECT id, name FROM users ORDER BY id LIMIT 1").fetchone()
+        if row is not None:
+            self.conn.execute("DELETE FROM users WHERE id = ?", (row[0],))
+            self.conn.commit()
+        return row
+
+    def close(self):
+        self.conn.close()
+
+
+class ManagerQueue:
+    """QueueManager с тем же интерфейсом, что у SqlQueue"""
+
+    def __init__(self, db_path: str, flush_interval: float):
+        self.manager = QueueManager(db_path, flush_interval)
+
+    def add_user(self, name: str) -> int:
+        return self.manager.add_user(name).id
+
+    def get_position(self, user_id: int):
+        return self.manager.get_position(user_id)
+
+    def get_next(self):
+        return self.manager.get_next()
+
+    def close(self):
+        self.manager.close()
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        if name not in ("join", "status", "next"):
+            raise argparse.ArgumentTypeError(f"неизвестный вызов: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def run(queue, args) -> dict:
+    rng = random.Random(args.seed)
+    ids = [queue.add_user(f"user{index}") for index in range(args.queue)]
+    names, weights = list(args.mix), list(args.mix.values())
+    latencies = {name: [] for name in names}
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        call_started = time.perf_counter()
+        if name == "join":
+            ids.append(queue.add_user("bench"))
+        elif name == "status":
+            queue.get_position(rng.choice(ids))
+        else:
+            queue.get_next()
+        latencies[name].append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    close_started = time.perf_counter()
+    queue.close()  # Остаток журнала write_behind тоже пишется в базу
+    results = {"ops_per_sec": round(sum(map(len, latencies.values())) / elapsed),
+               "close_ms": round((time.perf_counter() - close_started) * 1000, 3)}
+    for name, samples in latencies.items():
+        results[name] = percentiles(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5, help="секунд на вариант")
+    parser.add_argument("--queue", type=int, default=10000, help="человек в очереди до начала")
+    parser.add_argument("--mix", type=parse_mix, default="join=1,status=20,next=1", help="веса вызовов")
+    parser.add_argument("--flush-interval", type=float, default=0.5,
+                        help="секунд между сбросами журнала в варианте write_behind")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл для отчета JSON")
+    args = parser.parse_args()
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+
+    variants = {
+        "sql": lambda path: SqlQueue(path),
+        "sync": lambda path: ManagerQueue(path, 0),
+        "write_behind": lambda path: ManagerQueue(path, args.flush_interval),
+    }
+    results = {}
+    for name, make in variants.items():
+        with tempfile.TemporaryDirectory() as directory:
+            results[name] = run(make(os.path.join(directory, "queue.db")), args)
+    report("queue_engine", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Прогоняет все нагрузочные тесты и сохраняет общий отчет для сравнения между коммитами.
+
+Отчет пишется в bench/results/<коммит>.json; сравнить два прогона можно
+любым diff для JSON.
+
+    python bench/run_all.py --quick
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import ROOT, git_revision
+
+BENCHMARKS = {
+    # имя: (скрипт, аргументы полного прогона, аргументы быстрого прогона)
+    "load_api": ("load_api.py", ["--duration", "20"], ["--duration", "5", "--preload", "2000"]),
+    "load_bot": ("load_bot.py", [], ["--subscribers", "1000", "--tickets", "500", "--cycles", "10"]),
+    "bot_commands": ("bot_commands.py", [], ["--calls", "30", "--users", "10", "--preload", "1000"]),
+    "load_poll": ("load_poll.py", [], ["--duration", "3", "--pollers", "50"]),
+    "load_join_storm": ("load_join_storm.py", [], ["--duration", "3"]),
+    "load_async": ("load_async.py", [], ["--duration", "3", "--preload", "2000"]),
+    "queue_engine": ("queue_engine.py", [], ["--seconds", "1", "--queue", "2000"]),
+    "position_scale": ("position_scale.py", [], ["--sizes", "100,10000", "--samples", "2000", "--churn", "20000"]),
+    "sqlite_profile": ("sqlite_profile.py", [], ["--seconds", "2"]),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="короткий прогон для проверки")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), help="какие тесты запускать")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.only or BENCHMARKS:
+            script, full, quick = BENCHMARKS[name]
+            output = os.path.join(directory, f"{name}.json")
+            command = [sys.executable, os.path.join(ROOT, "bench", script)] + (quick if args.quick else full)
+            if name != "sqlite_profile":
+                command += ["--output", output]
+                subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+                with open(output) as f:
+                    results[name] = json.load(f)
+            else:  # Печатает JSON в stdout
+                results[name] = json.loads(subprocess.run(command, check=True, capture_output=True,
+                                                          text=True).stdout)
+
+    os.makedirs(os.path.join(ROOT, "bench", "results"), exist_ok=True)
+    path = os.path.join(ROOT, "bench", "results", f"{git_revision()}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Сравнение настроек SQLite: значения по умолчанию SQLite против StorageProfile.
+
+Для каждого профиля на свежей базе во временном каталоге измеряются:
+записи в синхронном режиме (commit на каждую постановку), /status из
+нескольких потоков одновременно с постановками и запросы /stats к
+архиву одновременно с записью пачек.
+
+    python bench/sqlite_profile.py --seconds 5 --readers 8
+"""
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import CALLED, JOINED, VisitHistory  # noqa: E402
+from queue_manager import QueueManager  # noqa: E402
+from storage import StorageProfile  # noqa: E402
+
+PROFILES = {
+    # Как было: sqlite3.connect без настроек
+    "default": StorageProfile(journal_mode="DELETE", synchronous="FULL", busy_timeout=5000,
+                              mmap_size=0, cache_size=-2000, cached_statements=128),
+    "tuned": StorageProfile(),
+}
+
+
+def run_for(seconds: float, workers):
+    """Запускает функции-работники в потоках на seconds секунд и возвращает их счетчики.
+
+    Первый работник - писатель, остальные - читатели. Читатель отдает GIL
+    после каждого запроса, как обработчик FastAPI между запросами; без
+    этого потоки-читатели почти не пускают писателя к интерпретатору.
+    """
+    stop = threading.Event()
+    counts = [0] * len(workers)
+
+    def loop(index, work):
+        while not stop.is_set():
+            work()
+            counts[index] += 1
+            if index:
+                time.sleep(0)
+
+    threads = [threading.Thread(target=loop, args=(index, work)) for index, work in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def bench_queue(directory: str, profile: StorageProfile, seconds: float, readers: int):
+    queue = QueueManager(os.path.join(directory, "queue.db"), flush_interval=0, profile=profile)
+    started = time.perf_counter()
+    joins = 0
+    while time.perf_counter() - started < seconds:
+        queue.add_user("bench")
+        joins += 1
+    joins_alone = joins / (time.perf_counter() - started)
+
+    ids = [user["user_id"] for user in queue.get_all_users()]
+    counts = run_for(seconds, [lambda: queue.add_user("bench")] +
+                     [lambda: queue.get_status(ids[len(ids) // 2])] * readers)
+    queue.close()
+    return {"joins_per_sec": round(joins_alone),
+            "joins_per_sec_with_readers": round(counts[0] / seconds),
+            "status_per_sec": round(sum(counts[1:]) / seconds)}
+
+
+def bench_history(directory: str, profile: StorageProfile, seconds: float, readers: int):
+    history = VisitHistory(os.path.join(directory, "history.db"), profile=profile)
+    at = [datetime.now() - timedelta(days=30)]
+
+    def write_batch():
+        for user_id in range(500):
+            at[0] += timedelta(seconds=5)
+            history.add("default", user_id, JOINED, at[0])
+            history.add("default", user_id, CALLED, at[0], 300.0)
+        history.flush()
+
+    since = time.time() - 31 * 86400
+    counts = run_for(seconds, [write_batch] +
+                     [lambda: history.stats(since=since, bucket=86400)] * readers)
+    history.close()
+    return {"events_per_sec": round(counts[0] * 1000 / seconds),
+            "stats_per_sec": round(sum(counts[1:]) / seconds)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=8, help="потоков чтения")
+    args = parser.parse_args()
+
+    results = {}
+    for name, profile in PROFILES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            results[name] = {**bench_queue(directory, profile, args.seconds, args.readers),
+                             **bench_history(directory, profile, args.seconds, args.readers)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
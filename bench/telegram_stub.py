@@ -0,0 +1,68 @@
+"""Локальная заглушка Telegram Bot API для нагрузочных тестов бота.
+
+Отвечает на любые методы вида /bot<token>/<method>, как настоящий
+сервер: sendMessage возвращает сообщение, остальные - true. Задержка
+ответа и доля ошибок 403 ("бот заблокирован") задаются аргументами.
+GET /stats возвращает число принятых сообщений и ошибок.
+
+    python bench/telegram_stub.py --port 8081 --latency 50
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python tg_bot.py
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from aiohttp import web
+
+
+def create_app(latency: float = 0.0, fail_rate: float = 0.0, seed: int = 1) -> web.Application:
+    rng = random.Random(seed)
+    counters = {"sent": 0, "failed": 0, "other": 0}
+
+    async def method(request: web.Request):
+        if latency:
+            await asyncio.sleep(latency / 1000)
+        name = request.match_info["method"]
+        if name == "getMe":
+            return web.json_response({"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "stub", "username": "stub_bot"}})
+        if name != "sendMessage":
+            counters["other"] += 1
+            return web.json_response({"ok": True, "result": True})
+
+        data = dict(await request.post()) or await request.json()
+        if rng.random() < fail_rate:
+            counters["failed"] += 1
+            return web.json_response({"ok": False, "error_code": 403,
+                                      "description": "Forbidden: bot was blocked by the user"},
+                                     status=403)
+        counters["sent"] += 1
+        return web.json_response({"ok": True, "result": {
+            "message_id": counters["sent"],
+            "date": int(time.time()),
+            "chat": {"id": int(data["chat_id"]), "type": "private"},
+            "text": data.get("text", ""),
+        }})
+
+    async def stats(request: web.Request):
+        return web.json_response(counters)
+
+    app = web.Application()
+    app.router.add_route("*", "/bot{token}/{method}", method)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0, help="задержка ответа, мс")
+    parser.add_argument("--fail-rate", type=float, default=0, help="доля ответов 403")
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency, args.fail_rate), host="127.0.0.1", port=args.port,
+                print=None)
+
+
+if __name__ == "__main__":
+    main()
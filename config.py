@@ -6,5 +6,9 @@ load_dotenv()
 class Config:
     TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
     ADMINS = os.getenv('ADMINS')
+    SUBSCRIPTIONS_DB = os.getenv('SUBSCRIPTIONS_DB', 'subscriptions.db')
+    API_URL = os.getenv('QUEUE_API_URL', 'http://192.168.0.104:8000')
+    TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')  # Свой сервер Bot API или заглушка для нагрузочных тестов
+    METRICS_PORT = os.getenv('BOT_METRICS_PORT')  # Порт /metrics бота; не задан - метрики не публикуются
     if not TOKEN:
         raise ValueError("Не найден TELEGRAM_BOT_TOKEN в .env файле!")
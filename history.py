@@ -0,0 +1,213 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+import calendar
+import sqlite3
+import threading
+import time
+from storage import SQLITE_FAILURES, SQLITE_ROWS, SQLITE_SECONDS, ReaderPool, StorageProfile
+
+# Коды событий визита в таблицах истории
+JOINED, CALLED, FINISHED, LEFT = range(4)
+HISTORY_BATCH = 500  # Сколько событий копить перед записью в базу
+HISTORY_MAX_AGE = 5  # Секунд, дольше которых событие не ждет полной пачки
+HOUR = 3600
+
+
+class VisitHistory:
+    """Архив визитов: события только дописываются, пачками, в таблицы по дням.
+
+    Каждое событие (встал, вызван, обслужен, ушел) попадает в таблицу
+    visits_ГГГГММДД своего дня, старые дни удаляются целиком через
+    retention_days. Одновременно с записью пачки обновляется почасовая
+    сводка rollup_hourly, поэтому /stats читает несколько сотен строк
+    сводки, а не миллионы событий. Запросы /stats идут через пул
+    читателей и не ждут записи очередной пачки.
+    """
+
+    def __init__(self, db_path: str = "history.db", retention_days: int = 90,
+                 profile: Optional[StorageProfile] = None):
+        profile = profile or StorageProfile()
+        self.conn = profile.connect(db_path)
+        # База в памяти видна только своему соединению, читаем через писателя
+        self.readers = ReaderPool(db_path, profile) if db_path != ":memory:" else None
+        self.retention_days = retention_days
+        self._lock = threading.Lock()     # буфер событий
+        self._db_lock = threading.Lock()  # соединение с базой
+        self._buffer = []  # (at, queue, user_id, event, seconds)
+        self._buffered_at = 0.0  # time.monotonic() первого события в буфере
+        self._tables = set()  # Уже созданные таблицы дней
+        self._init_db()
+
+    def _init_db(self):
+        """Создает почасовую сводку и находит существующие таблицы дней"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_hourly (
+                queue TEXT NOT NULL,
+                hour INTEGER NOT NULL,
+                joined INTEGER NOT NULL DEFAULT 0,
+                called INTEGER NOT NULL DEFAULT 0,
+                finished INTEGER NOT NULL DEFAULT 0,
+                left_queue INTEGER NOT NULL DEFAULT 0,
+                wait_sum REAL NOT NULL DEFAULT 0,
+                wait_max REAL NOT NULL DEFAULT 0,
+                service_sum REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (queue, hour)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'visits_%'")
+        self._tables = {row[0] for row in cursor}
+
+    def add(self, queue: str, user_id: int, event: int, at: datetime, seconds: Optional[float] = None):
+        """Добавляет событие в буфер; seconds - ожидание для CALLED, обслуживание для FINISHED.
+
+        В базу ничего не пишет, поэтому можно вызывать под блокировкой очереди.
+        """
+        with self._lock:
+            if not self._buffer:
+                self._buffered_at = time.monotonic()
+            self._buffer.append((at.timestamp(), queue, user_id, event, seconds))
+
+    def flush(self, min_events: int = 1):
+        """Записывает буфер в таблицы дней и сводку одной транзакцией.
+
+        Пишет, если в буфере не меньше min_events событий или первое из них
+        ждет дольше HISTORY_MAX_AGE секунд. Если запись не удалась, события
+        возвращаются в начало буфера.
+        """
+        if not self._buffer or (len(self._buffer) < min_events
+                                and time.monotonic() - self._buffered_at < HISTORY_MAX_AGE):
+            return
+        with self._db_lock:
+            with self._lock:
+                events, self._buffer = self._buffer, []
+            if not events:
+                return
+            try:
+                self._write(events)
+            except Exception:
+                self.conn.rollback()
+                with self._lock:
+                    self._buffer[:0] = events
+                SQLITE_FAILURES.inc("history_flush")
+                raise
+            SQLITE_ROWS.inc("history_flush", amount=len(events))
+
+    def _write(self, events: List):
+        days = defaultdict(list)
+        rollups = defaultdict(lambda: [0, 0, 0, 0, 0.0, 0.0, 0.0])
+        for at, queue, user_id, event, seconds in events:
+            days[time.strftime("visits_%Y%m%d", time.localtime(at))].append(
+                (int(at), queue, user_id, event, seconds))
+            rollup = rollups[(queue, int(at) // HOUR * HOUR)]
+            rollup[event] += 1
+            if event == CALLED:
+                rollup[4] += seconds
+                rollup[5] = max(rollup[5], seconds)
+            elif event == FINISHED:
+                rollup[6] += seconds
+
+        with SQLITE_SECONDS.time("history_flush"):
+            cursor = self.conn.cursor()
+            for table, rows in days.items():
+                if table not in self._tables:
+                    self._rotate(cursor, table)
+                cursor.executemany(f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?)", rows)
+            cursor.executemany("""
+                INSERT INTO rollup_hourly VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (queue, hour) DO UPDATE SET
+                    joined = joined + excluded.joined,
+                    called = called + excluded.called,
+                    finished = finished + excluded.finished,
+                    left_queue = left_queue + excluded.left_queue,
+                    wait_sum = wait_sum + excluded.wait_sum,
+                    wait_max = max(wait_max, excluded.wait_max),
+                    service_sum = service_sum + excluded.service_sum
+            """, [key + tuple(values) for key, values in rollups.items()])
+            self.conn.commit()
+
+    def _rotate(self, cursor: sqlite3.Cursor, table: str):
+        """Создает таблицу нового дня и удаляет дни старше retention_days"""
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                at INTEGER NOT NULL,
+                queue TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                event INTEGER NOT NULL,
+                seconds REAL
+            )
+        """)
+        self._tables.add(table)
+        border = time.strftime("visits_%Y%m%d", time.localtime(time.time() - self.retention_days * 86400))
+        # Только что созданную таблицу не удаляем, даже если ее день старше срока
+        # хранения (часы очереди подменены, как в bench/scheduler_sim.py): в нее пишется пачка
+        for old in sorted(name for name in self._tables if name < border and name != table):
+            cursor.execute(f"DROP TABLE {old}")
+            self._tables.discard(old)
+
+    def stats(self, queue: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None, bucket: int = HOUR) -> Dict:
+        """Сводка за [since, until) по сводке rollup_hourly с шагом bucket секунд (кратно часу).
+
+        Интервалы считаются по местному времени, как и таблицы дней:
+        суточный начинается в местную полночь, в том числе в дни
+        перехода на летнее время. Чтение не сбрасывает буфер, поэтому
+        события последних секунд (до пачки или HISTORY_MAX_AGE) появляются
+        в сводке со следующей записью.
+        """
+        until = until if until is not None else time.time()
+        since = since if since is not None else until - 86400
+        bucket = max(HOUR, bucket // HOUR * HOUR)
+        query = """
+            SELECT hour, sum(joined), sum(called), sum(finished), sum(left_queue),
+                   sum(wait_sum), max(wait_max), sum(service_sum)
+            FROM rollup_hourly WHERE hour >= ? AND hour < ?
+        """
+        params = [int(since) // HOUR * HOUR, until]
+        if queue is not None:
+            query += " AND queue = ?"
+            params.append(queue)
+        query += " GROUP BY hour ORDER BY hour"
+        if self.readers is None:
+            with self._db_lock, SQLITE_SECONDS.time("history_stats"):
+                rows = self.conn.execute(query, params).fetchall()
+        else:
+            with self.readers.connection() as conn, SQLITE_SECONDS.time("history_stats"):
+                rows = conn.execute(query, params).fetchall()
+
+        buckets = {}  # {начало интервала: сумма часов}, часы идут по порядку
+        for hour, *values in rows:
+            total = buckets.setdefault(self._bucket_start(hour, bucket), [0, 0, 0, 0, 0.0, 0.0, 0.0])
+            for index, value in enumerate(values):
+                total[index] = max(total[index], value) if index == 5 else total[index] + value
+        series = [self._summary(values, at=start) for start, values in buckets.items()]
+        totals = [sum(row[index] for row in rows) for index in range(1, 8)]
+        totals[5] = max((row[6] for row in rows), default=0.0)
+        return {"queue": queue, "since": since, "until": until, "bucket": bucket,
+                "totals": self._summary(totals), "series": series}
+
+    @staticmethod
+    def _bucket_start(hour: int, bucket: int) -> int:
+        """Unix-время начала интервала bucket по местному времени, в который попадает час hour"""
+        if bucket == HOUR:
+            return hour
+        local = calendar.timegm(time.localtime(hour))  # Местные часы как секунды от эпохи
+        start = time.gmtime(local - local % bucket)
+        return int(time.mktime(start[:8] + (-1,)))
+
+    @staticmethod
+    def _summary(values: List, **extra) -> Dict:
+        joined, called, finished, left, wait_sum, wait_max, service_sum = values
+        return {
+            **extra,
+            "joined": joined, "called": called, "finished": finished, "left": left,
+            "avg_wait": wait_sum / called if called else None,
+            "max_wait": wait_max if called else None,
+            "avg_service": service_sum / finished if finished else None,
+        }
+
+    def close(self):
+        """Записывает остаток буфера"""
+        self.flush()
@@ -1,65 +1,596 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from queue_manager import QueueManager  # Импорт класса очереди
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from metrics import CONTENT_TYPE, REGISTRY, render
+import profiler
+from queue_manager import AsyncQueueManager, DEFAULT_QUEUE, PRIORITY_LEVELS, User  # Импорт класса очереди
+from queue_service import QueueUnavailable, RemoteQueue
+
+QUEUE_NAME = re.compile(r"[A-Za-z0-9_-]{1,32}")  # Допустимое название очереди
+CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))  # Ответов чтений в кэше; 0 - без кэша
+CACHE_TTL = 5  # Секунд, через которые ответ пересчитывается, даже если очередь не менялась
+METRICS_INTERVAL = 5  # Секунд между отправками метрик процесса владельцу очередей
+# /join отвечает 503, если новая запись прождет в потоке базы дольше; 0 - не отказывать
+JOIN_SHED_MS = float(os.getenv("JOIN_SHED_MS", "500"))
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "api_request_seconds", "Время ответа API до конца тела, секунд; route - шаблон пути",
+    ("method", "route", "status"))
+REQUEST_ERRORS = REGISTRY.counter(
+    "api_unhandled_exceptions_total", "Исключения, не превращенные обработчиком в ответ",
+    ("route", "exception"))
+JOIN_REJECTED = REGISTRY.counter(
+    "api_join_rejected_total", "Отказы /join: client и queue - лимиты частоты, overload - очередь записей",
+    ("reason",))
+
+
+class RequestMetrics:
+    """ASGI-прослойка: время ответа по методу, маршруту и коду ответа.
+
+    Маршрут - шаблон пути (/status/{user_id}), который роутер FastAPI
+    записывает в scope, поэтому число рядов не растет с числом номеров.
+    Обычная @app.middleware("http") заметно дороже на каждом запросе.
+    Пока включена трассировка (profiler), медленные запросы сохраняются
+    вместе с вызовами очереди и их SQL.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500  # Если ответ не начался, клиент получит 500 от Starlette
+        trace = profiler.start_trace()
+
+        async def send_and_record(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        except Exception as e:
+            REQUEST_ERRORS.inc(self.route(scope), type(e).__name__)
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            REQUEST_SECONDS.observe(seconds, scope["method"], self.route(scope), str(status))
+            if trace is not None:
+                profiler.finish_trace(trace, seconds, method=scope["method"], path=scope["path"],
+                                      route=self.route(scope), status=status)
+
+    @staticmethod
+    def route(scope) -> str:
+        route = scope.get("route")
+        return route.path if route is not None else "unmatched"
+
+
+class QueueWatcher:
+    """Подписчик всех очередей: какие очереди изменились с прошлого чтения"""
+
+    def __init__(self):
+        self.changed = asyncio.Event()
+        self.queues = set()  # qid изменившихся очередей; None - неизвестно каких, то есть всех
+
+    def take(self) -> set:
+        self.changed.clear()
+        queues, self.queues = self.queues, set()
+        return queues
+
+
+class QueueEvents:
+    """Будит подписчиков потока /events при каждом изменении их очереди"""
+
+    def __init__(self):
+        self.subscribers = {}  # {qid: {asyncio.Event, ...}}
+        self.watchers = set()  # {QueueWatcher, ...} потока /events/all
+
+    def subscribe(self, qid: str) -> asyncio.Event:
+        changed = asyncio.Event()
+        self.subscribers.setdefault(qid, set()).add(changed)
+        return changed
+
+    def unsubscribe(self, qid: str, changed: asyncio.Event):
+        subscribers = self.subscribers.get(qid, set())
+        subscribers.discard(changed)
+        if not subscribers:
+            self.subscribers.pop(qid, None)
+
+    def publish(self, qid: Optional[str] = None):
+        """Будит подписчиков очереди qid (всех, если очередь неизвестна)"""
+        # Подписчик, не успевший прочитать прошлое изменение, получит
+        # одно актуальное состояние вместо пачки устаревших
+        if qid is None:
+            groups = list(self.subscribers.values())
+        else:
+            groups = [self.subscribers.get(qid, ())]
+        for subscribers in groups:
+            for changed in subscribers:
+                changed.set()
+        for watcher in self.watchers:
+            watcher.queues.add(qid)
+            watcher.changed.set()
+
+
+class ResponseCache:
+    """Кэш ответов чтений, привязанный к версии очереди.
+
+    Ответ пересчитывается, только если очередь изменилась (версия из
+    AsyncQueueManager.version) или прошло CACHE_TTL секунд: оценка
+    ожидания и наступившие записи зависят еще и от времени. ETag - хэш
+    тела, поэтому If-None-Match дает 304, пока ответ тот же, в том
+    числе после пересчета. Вытесняются давно не запрошенные ответы.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # {ключ: (версия, срок годности, etag, тело)}
+        self.hits = 0           # Ответ взят из кэша
+        self.misses = 0         # Ответ посчитан заново
+        self.not_modified = 0   # Из них и из попаданий - ответов 304
+
+    async def respond(self, request: Request, key: tuple, version, compute) -> Response:
+        """Ответ из кэша или от compute() (корутина, возвращает данные для JSON)"""
+        now = time.monotonic()
+        entry = self.entries.get(key)
+        if entry is not None and version is not None and entry[0] == version and entry[1] > now:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            etag, body = entry[2], entry[3]
+        else:
+            self.misses += 1
+            # Тело кодируется так же, как JSONResponse, поэтому ответы не отличаются
+            body = json.dumps(await compute(), ensure_ascii=False, allow_nan=False,
+                              separators=(",", ":")).encode("utf-8")
+            etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+            if version is not None and self.size:
+                self.entries[key] = (version, now + self.ttl, etag, body)
+                self.entries.move_to_end(key)
+                if len(self.entries) > self.size:
+                    self.entries.popitem(last=False)
+
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if self.matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    @staticmethod
+    def matches(header: Optional[str], etag: str) -> bool:
+        """Есть ли etag среди меток If-None-Match; слабые (W/) сравниваются как сильные"""
+        if not header:
+            return False
+        for tag in header.split(","):
+            tag = tag.strip()
+            if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == etag:
+                return True
+        return False
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_rate": round(self.hits / requests, 4) if requests else None,
+            "entries": len(self.entries),
+        }
+
 
 app = FastAPI(title="Queue API for Robot")
-queue = QueueManager()  # Инициализация менеджера очереди
+app.add_middleware(RequestMetrics)
+# Под supervisor.py очереди держит отдельный процесс (QUEUE_SOCKET), иначе - этот
+queue = AsyncQueueManager(manager=RemoteQueue.from_env())
+events = QueueEvents()
+cache = ResponseCache()
+REGISTRY.counter("response_cache_requests_total", "Ответы чтений: из кэша (hit) и посчитанные (miss)",
+                 ("result",), lambda: {("hit",): cache.hits, ("miss",): cache.misses})
+REGISTRY.counter("response_cache_not_modified_total", "Ответы 304 на If-None-Match", (),
+                 lambda: {(): cache.not_modified})
+REGISTRY.gauge("response_cache_entries", "Ответов в кэше", (), lambda: {(): len(cache.entries)})
 
 
 # Модели запросов/ответов
 class UserRequest(BaseModel):
     name: str  # Пользователь вводит имя на экране робота
+    priority: int = Field(0, ge=0, lt=PRIORITY_LEVELS)  # 0 - обычная, 1 - льготная, 2 - вне очереди
+    slot_at: Optional[datetime] = None  # Время записи, если пользователь записался заранее
 
 
 class UserResponse(BaseModel):
     user_id: int
-    position: int
+    position: Optional[int] = None  # None - повтор по Idempotency-Key, когда номер уже вызван или ушел
+    estimated_wait: Optional[float] = None  # Секунд до вызова; None, пока нет замеров
+
+
+class TicketRequest(BaseModel):
+    client_id: str  # Ключ, по которому повторная отправка вернет тот же номер
+    name: str
+
+
+class JoinBatchRequest(BaseModel):
+    tickets: List[TicketRequest] = Field(..., max_items=1000)
+
+
+class StatusBatchRequest(BaseModel):
+    user_ids: List[int] = Field(..., max_items=10000)
+
+
+@app.on_event("startup")
+async def startup():
+    """Подписывается на изменения, сделанные через соседние процессы API"""
+    if queue.remote:
+        queue.watch(events.publish)
+        app.state.report_metrics = asyncio.create_task(report_metrics())
+
+
+async def report_metrics():
+    """Отправляет метрики процесса владельцу очередей, чтобы /metrics любого процесса их учитывал"""
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL)
+        try:
+            await queue.collect_metrics(REGISTRY.snapshot())
+        except QueueUnavailable:
+            pass  # Владелец перезапускается; следующий снимок содержит все то же самое
+
+
+@app.on_event("shutdown")
+def shutdown():
+    """Дописывает незавершенные изменения очереди в базу"""
+    queue.close()
+
+
+@app.exception_handler(QueueUnavailable)
+async def queue_unavailable(request: Request, exc: QueueUnavailable):
+    """Владелец очередей перезапускается: клиент может повторить запрос"""
+    return JSONResponse({"detail": "Queue service unavailable"}, status_code=503,
+                        headers={"Retry-After": "1"})
+
+
+def check_queue(qid: Optional[str]) -> Optional[str]:
+    """Проверяет название очереди из пути или параметра запроса"""
+    if qid is not None and not QUEUE_NAME.fullmatch(qid):
+        raise HTTPException(status_code=400, detail="Invalid queue name")
+    return qid
+
+
+@app.get("/health", summary="Процесс API жив")
+async def health():
+    """Отвечает, пока процесс обрабатывает запросы; для перезапуска зависшего процесса"""
+    return {"status": "ok", "pid": os.getpid()}
+
+
+@app.get("/ready", summary="Процесс API готов принимать запросы")
+async def ready():
+    """Проверяет, что очереди доступны (владелец очередей отвечает); иначе 503"""
+    await queue.get_queues()
+    return {"status": "ready", "pid": os.getpid()}
+
+
+# Эндпоинты. Каждый доступен и по старому пути (очередь по умолчанию),
+# и внутри /queues/{qid} для именованной очереди (услуги)
+@app.get("/metrics", summary="Метрики в формате Prometheus")
+async def metrics():
+    """Время ответов, вызовов очереди и операций SQLite, длины очередей, кэш.
+
+    Под supervisor.py - сумма по всем процессам API и владельцу очередей;
+    метрики соседних процессов запаздывают не больше чем на METRICS_INTERVAL.
+    """
+    snapshot = await queue.collect_metrics(REGISTRY.snapshot())
+    return Response(render(snapshot).encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+
+def check_profile_token(request: Request):
+    """/debug/* доступны только с X-Profile-Token = PROFILE_TOKEN; для остальных их нет"""
+    if not profiler.authorized(request.headers.get("x-profile-token")):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@app.get("/debug/profile", include_in_schema=False)
+async def debug_profile(request: Request, seconds: float = Query(10, gt=0, le=profiler.MAX_SECONDS),
+                        output: str = Query("collapsed", alias="format", regex="^(collapsed|speedscope)$")):
+    """Сэмплирует стеки этого процесса API и владельца очередей seconds секунд.
+
+    Ответ - collapsed stacks или JSON speedscope; корень стека - процесс и поток.
+    """
+    check_profile_token(request)
+    label = f"api-{os.getpid()}"
+    loop = asyncio.get_running_loop()
+    local, remote = await asyncio.gather(loop.run_in_executor(None, profiler.sample, seconds, label),
+                                         queue.sample_stacks(seconds))
+    content_type, body = profiler.export(local + remote, output, label)
+    return Response(body, headers={"Content-Type": content_type})
+
+
+@app.get("/debug/slow", include_in_schema=False)
+async def debug_slow(request: Request, seconds: float = Query(0, ge=0, le=3600)):
+    """Последние медленные запросы этого процесса API с вызовами очереди и SQL.
+
+    seconds > 0 включает трассировку в этом процессе на столько секунд
+    (PROFILE=1 включает ее во всех процессах с запуска).
+    """
+    check_profile_token(request)
+    if seconds:
+        profiler.trace_for(seconds)
+    return {"pid": os.getpid(), "tracing": profiler.tracing(), "slow_ms": profiler.SLOW_MS,
+            "requests": list(profiler.SLOW)}
+
+
+@app.get("/cache/stats", summary="Статистика кэша ответов")
+async def cache_stats():
+    """Попадания, промахи и ответы 304 кэша чтений этого процесса API"""
+    return cache.stats()
+
+
+@app.get("/queues", summary="Список очередей")
+async def list_queues(request: Request):
+    """Возвращает названия очередей и их длину"""
+    async def compute():
+        return {"queues": await queue.get_queues()}
+
+    return await cache.respond(request, ("queues",), queue.version(), compute)
+
+
+async def ticket_response(user: User) -> Dict:
+    """Ответ /join: номер с позицией и ожиданием (без них, если номер уже вызван)"""
+    status = await queue.get_status(user.id)
+    return {
+        "user_id": user.id,
+        **(status or {})
+    }
 
 
-# Эндпоинты
 @app.post("/join", response_model=UserResponse, summary="Добавить пользователя в очередь")
-async def join_queue(request: UserRequest):
-    """Добавляет пользователя в очередь и возвращает его номер"""
+@app.post("/queues/{qid}/join", response_model=UserResponse, summary="Добавить пользователя в очередь qid")
+async def join_queue(request: UserRequest, http: Request, qid: str = DEFAULT_QUEUE,
+                     idempotency_key: Optional[str] = Header(None, min_length=1, max_length=64)):
+    """Добавляет пользователя в очередь и возвращает его номер.
+
+    Повтор с тем же заголовком Idempotency-Key возвращает тот же номер,
+    даже если его уже вызвали (тогда position - null). Если записи не
+    успевают (JOIN_SHED_MS) или клиент либо очередь превысили лимит
+    частоты (ratelimit.py), ответ - 503 или 429 с Retry-After; чтения при
+    этом не замедляются. Повтор уже выданного номера отвечает сразу: он
+    не тратит лимит и не получает отказа.
+    """
+    check_queue(qid)
+    if idempotency_key:
+        user = await queue.get_ticket(idempotency_key, qid)
+        if user is not None:
+            return await ticket_response(user)
+    delay = queue.write_delay()
+    if JOIN_SHED_MS and delay * 1000 > JOIN_SHED_MS:
+        JOIN_REJECTED.inc("overload")
+        raise HTTPException(status_code=503, detail="Queue is overloaded, retry later",
+                            headers={"Retry-After": str(math.ceil(delay))})
+    denied = await queue.admit_join(http.client.host if http.client else "unknown", qid)
+    if denied is not None:
+        limit, wait = denied
+        JOIN_REJECTED.inc(limit)
+        raise HTTPException(status_code=429, detail=f"Too many joins per {limit}, retry later",
+                            headers={"Retry-After": str(math.ceil(wait))})
     try:
-        user = queue.add_user(request.name)
-        position = queue.get_position(user.id)
-        return {
-            "user_id": user.id,
-            "position": position
-        }
+        slot_at = request.slot_at
+        if slot_at and slot_at.tzinfo:
+            slot_at = slot_at.astimezone().replace(tzinfo=None)  # Очередь хранит местное время
+        user = await queue.add_user(request.name, idempotency_key, qid=qid,
+                                    priority=request.priority, slot_at=slot_at)
+        events.publish(qid)
+        return await ticket_response(user)
+    except QueueUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/join/batch", summary="Добавить билеты, выданные роботом без связи")
+@app.post("/queues/{qid}/join/batch", summary="Добавить билеты в очередь qid")
+async def join_batch(request: JoinBatchRequest, qid: str = DEFAULT_QUEUE):
+    """Идемпотентно добавляет билеты в их порядке и возвращает присвоенные номера"""
+    check_queue(qid)
+    users = await queue.add_users([(ticket.name, ticket.client_id, 0, None)
+                                   for ticket in request.tickets], qid)
+    events.publish(qid)
+    positions = await queue.get_positions(user.id for user in users)
+    return {"tickets": [
+        {"client_id": user.client_id, "user_id": user.id, "position": positions.get(user.id)}
+        for user in users
+    ]}
+
+
 @app.post("/leave/{user_id}", summary="Покинуть очередь")
-async def leave_queue(user_id: int):
-    """Удаление из очереди"""
-    success = queue.remove_user(user_id)
+@app.post("/queues/{qid}/leave/{user_id}", summary="Покинуть очередь qid")
+async def leave_queue(user_id: int, qid: Optional[str] = None):
+    """Удаление из очереди (номер ищется во всех очередях, если qid не задана)"""
+    check_queue(qid)
+    success = await queue.remove_user(user_id, qid)
+    if success:
+        events.publish(qid)
     return {"success": success}
 
 
 @app.get("/status/{user_id}", summary="Проверить позицию в очереди")
-async def get_status(user_id: int):
-    """Возвращает текущую позицию пользователя"""
-    position = queue.get_position(user_id)
-    if not position:
-        raise HTTPException(status_code=404, detail="User not found")
-    return {"position": position}
+@app.get("/queues/{qid}/status/{user_id}", summary="Проверить позицию в очереди qid")
+async def get_status(request: Request, user_id: int, qid: Optional[str] = None):
+    """Возвращает текущую позицию пользователя и ожидаемое время до вызова"""
+    check_queue(qid)
+
+    async def compute():
+        status = await queue.get_status(user_id, qid)
+        if not status:
+            raise HTTPException(status_code=404, detail="User not found")
+        return status
+
+    return await cache.respond(request, ("status", user_id, qid), queue.version(qid), compute)
+
+
+@app.post("/status/batch", summary="Проверить позиции сразу нескольких пользователей")
+async def get_status_batch(request: StatusBatchRequest):
+    """Возвращает {user_id: позиция} для тех, кто еще стоит в очереди"""
+    return {"positions": await queue.get_positions(request.user_ids)}
 
 
 @app.get("/next", summary="Получить следующего пользователя")
-async def get_next():
+@app.get("/queues/{qid}/next", summary="Получить следующего пользователя очереди qid")
+async def get_next(qid: str = DEFAULT_QUEUE):
     """Удаляет первого в очереди и возвращает его данные"""
-    user = queue.get_next()
+    check_queue(qid)
+    user = await queue.get_next(qid)
     if not user:
         raise HTTPException(status_code=404, detail="Queue is empty")
+    events.publish(qid)
     return {"user_id": user.id, "name": user.name}
 
 
-@app.get("/queue", summary="Получить всю очередь")
-async def get_queue():
-    """Возвращает список всех user_id"""
-    return {"queue": queue.get_all_users()}
+@app.get("/next/batch", summary="Вызвать сразу несколько пользователей")
+@app.get("/queues/{qid}/next/batch", summary="Вызвать несколько пользователей очереди qid")
+async def get_next_batch(count: int = Query(1, ge=1, le=50), qid: str = DEFAULT_QUEUE):
+    """Удаляет первых count пользователей (по одному на окно) и возвращает их данные"""
+    check_queue(qid)
+    users = await queue.get_next_batch(count, qid)
+    if not users:
+        raise HTTPException(status_code=404, detail="Queue is empty")
+    events.publish(qid)
+    return {"users": [{"user_id": user.id, "name": user.name} for user in users]}
+
+
+@app.post("/done/{user_id}", summary="Отметить окончание обслуживания")
+@app.post("/queues/{qid}/done/{user_id}", summary="Отметить окончание обслуживания в очереди qid")
+async def finish_service(user_id: int, qid: str = DEFAULT_QUEUE):
+    """Записывает длительность обслуживания вызванного пользователя для оценки ожидания"""
+    check_queue(qid)
+    success = await queue.finish_user(user_id, qid)
+    if success:
+        events.publish(qid)
+    return {"success": success}
+
+
+@app.get("/queue", summary="Получить очередь постранично")
+@app.get("/queues/{qid}", summary="Получить очередь qid постранично")
+async def get_queue(request: Request, after: Optional[int] = None, before: Optional[int] = None,
+                    limit: int = Query(100, ge=1, le=1000), stream: bool = False,
+                    qid: str = DEFAULT_QUEUE):
+    """Возвращает страницу очереди по курсору (after/before - номер в очереди).
+
+    stream=true отдает всю очередь после after построчно в NDJSON,
+    читая ее страницами, поэтому память не растет с длиной очереди.
+    """
+    check_queue(qid)
+    if not stream:
+        async def compute():
+            return await queue.get_page(after, before, limit, qid)
+
+        return await cache.respond(request, ("page", qid, after, before, limit),
+                                   queue.version(qid), compute)
+
+    async def rows():
+        cursor = after
+        while True:
+            page = await queue.get_page(after=cursor, limit=limit, qid=qid)
+            for row in page["queue"]:
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+            if page["next_after"] is None:
+                break
+            cursor = page["next_after"]
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+@app.get("/queue/changes", summary="Изменения очереди после версии since")
+@app.get("/queues/{qid}/changes", summary="Изменения очереди qid после версии since")
+async def get_queue_changes(request: Request, since: int = 0, qid: str = DEFAULT_QUEUE):
+    """Возвращает изменения после since и сводку; при устаревшем курсоре - полный снимок"""
+    check_queue(qid)
+
+    async def compute():
+        return await queue.get_changes(since, qid)
+
+    return await cache.respond(request, ("changes", qid, since), queue.version(qid), compute)
+
+
+@app.get("/stats", summary="Статистика визитов из архива")
+@app.get("/queues/{qid}/stats", summary="Статистика визитов очереди qid из архива")
+async def get_stats(since: Optional[float] = None, until: Optional[float] = None,
+                    bucket: int = Query(3600, ge=3600, le=31 * 86400), qid: Optional[str] = None):
+    """Итоги и ряд по интервалам bucket секунд за [since, until) (unix-время, по умолчанию - сутки).
+
+    Считается по почасовой сводке, поэтому не зависит от числа визитов.
+    Интервалы идут по местному времени сервера: суточные - с полуночи.
+    Без qid суммирует все очереди.
+    """
+    check_queue(qid)
+    return await queue.get_stats(qid, since, until, bucket)
+
+
+@app.get("/events", summary="Поток изменений очереди (Server-Sent Events)")
+@app.get("/queues/{qid}/events", summary="Поток изменений очереди qid (Server-Sent Events)")
+async def queue_events(request: Request, head: int = Query(5, ge=1, le=100),
+                       qid: str = DEFAULT_QUEUE):
+    """При подключении и после каждого изменения присылает номера первых head человек"""
+    check_queue(qid)
+
+    async def stream():
+        changed = events.subscribe(qid)
+        try:
+            while not await request.is_disconnected():
+                changed.clear()
+                try:
+                    head_ids = await queue.get_head(head, qid)
+                except QueueUnavailable:
+                    await asyncio.sleep(1)  # Владелец очередей перезапускается
+                    continue
+                yield f"data: {json.dumps({'head': head_ids})}\n\n"
+                await changed.wait()
+        finally:
+            events.unsubscribe(qid, changed)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/events/all", summary="Поток изменений всех очередей (Server-Sent Events)")
+async def all_queue_events(request: Request, head: int = Query(5, ge=1, le=100)):
+    """При подключении - первые head человек каждой очереди, затем - каждой изменившейся.
+
+    Событие - {"queue": qid, "head": [номера]}; так бот следит за всеми
+    очередями одним соединением.
+    """
+    async def stream():
+        watcher = QueueWatcher()
+        watcher.queues.add(None)
+        events.watchers.add(watcher)
+        try:
+            while not await request.is_disconnected():
+                queues = watcher.take()
+                try:
+                    if None in queues:
+                        queues = {entry["queue"] for entry in await queue.get_queues()}
+                    for qid in sorted(queues):
+                        head_ids = await queue.get_head(head, qid)
+                        yield f"data: {json.dumps({'queue': qid, 'head': head_ids})}\n\n"
+                except QueueUnavailable:
+                    watcher.queues.add(None)  # Владелец очередей перезапускается: позже все заново
+                    await asyncio.sleep(1)
+                    continue
+                await watcher.changed.wait()
+        finally:
+            events.watchers.discard(watcher)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
 
 
 if __name__ == "__main__":
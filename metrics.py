@@ -0,0 +1,259 @@
+"""Метрики в текстовом формате Prometheus без сторонних библиотек.
+
+Счетчики, гистограммы и датчики регистрируются в REGISTRY процесса при
+импорте модуля, который их пишет. Запись - одно сложение под
+блокировкой метрики (гистограмма еще ищет корзину bisect), поэтому
+таймеры можно ставить на горячий путь. Снимок REGISTRY.snapshot() -
+обычные словари: его можно передать в другой процесс и сложить со
+снимками соседей (merge), а render превращает снимок в ответ /metrics.
+
+    REQUESTS = REGISTRY.histogram("api_request_seconds", "Время ответа", ("route",))
+    with REQUESTS.time("/join"):
+        ...
+    serve(9101)  # /metrics процесса без HTTP-сервера (бот, киоск)
+"""
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl
+import threading
+import time
+
+# Границы корзин по умолчанию, секунд: от долей миллисекунды (чтение из
+# памяти) до секунд (commit на медленном диске, запрос к Telegram)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    """Монотонный счетчик с метками.
+
+    collect - функция {значения меток: число}, если счетчик уже ведет
+    сам объект (например, попадания ResponseCache): тогда inc не нужен.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 collect: Optional[Callable[[], Dict]] = None):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = None
+        self.collect = collect
+        self._values = {}  # {значения меток: число}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def values(self) -> Dict:
+        if self.collect is not None:
+            return dict(self.collect())
+        with self._lock:
+            return dict(self._values)
+
+
+class _Timer:
+    """Контекстный менеджер Histogram.time: записывает длительность блока"""
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: "Histogram", labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Histogram:
+    """Распределение значений (обычно длительностей в секундах) по корзинам"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # {значения меток: [по корзинам..., выше последней, сумма]}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)  # Граница le включается в корзину
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def time(self, *labels) -> _Timer:
+        return _Timer(self, labels)
+
+    def values(self) -> Dict:
+        with self._lock:
+            return {labels: list(counts) for labels, counts in self._values.items()}
+
+
+class Gauge:
+    """Текущее значение, которое collect() вычисляет в момент снимка.
+
+    collect возвращает {значения меток: число}; так длина очереди не
+    пересчитывается на каждом изменении, а читается, только когда нужна.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 collect: Optional[Callable[[], Dict]] = None):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = None
+        self.collect = collect or dict
+
+    def values(self) -> Dict:
+        return dict(self.collect())
+
+
+class Registry:
+    """Метрики одного процесса по именам"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric, replace: bool = False):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not replace:
+                if existing.kind != metric.kind or existing.labels != metric.labels:
+                    raise ValueError(f"metric {metric.name} already registered differently")
+                return existing  # Модуль импортирован повторно
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                collect: Optional[Callable[[], Dict]] = None) -> Counter:
+        """Счетчик; с collect повторная регистрация заменяет функцию, как у gauge"""
+        return self._register(Counter(name, description, labels, collect), replace=collect is not None)
+
+    def histogram(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, labels, buckets))
+
+    def gauge(self, name: str, description: str, labels: Tuple[str, ...] = (),
+              collect: Optional[Callable[[], Dict]] = None) -> Gauge:
+        """Датчик с функцией collect; повторная регистрация заменяет функцию"""
+        return self._register(Gauge(name, description, labels, collect), replace=True)
+
+    def snapshot(self) -> Dict:
+        """{имя: (вид, описание, метки, корзины, {значения меток: значение})}"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: (metric.kind, metric.description, metric.labels, metric.buckets, metric.values())
+                for metric in metrics}
+
+
+def merge(snapshots: Iterable[Dict]) -> Dict:
+    """Сумма снимков нескольких процессов: счетчики, корзины и датчики складываются"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, (kind, description, labels, buckets, values) in snapshot.items():
+            entry = merged.get(name)
+            if entry is None:
+                entry = merged[name] = (kind, description, labels, buckets, {})
+            elif entry[0] != kind or entry[3] != buckets:
+                continue  # Процесс со старой версией метрики
+            total = entry[4]
+            for key, value in values.items():
+                if kind == "histogram":
+                    counts = total.get(key)
+                    total[key] = list(value) if counts is None else [a + b for a, b in zip(counts, value)]
+                else:
+                    total[key] = total.get(key, 0) + value
+    return merged
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(snapshot: Dict) -> str:
+    """Снимок в текстовом формате Prometheus (version 0.0.4)"""
+    lines = []
+    for name in sorted(snapshot):
+        kind, description, labels, buckets, values = snapshot[name]
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key in sorted(values, key=lambda key: tuple(map(str, key))):
+            value = values[key]
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(labels, key)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + (float("inf"),), value):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{name}_bucket{_labels(labels, key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels, key)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(labels, key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def serve(port: int, host: str = "0.0.0.0", registry: Registry = REGISTRY,
+          routes: Optional[Dict[str, Callable]] = None) -> ThreadingHTTPServer:
+    """Отдает GET /metrics реестра registry из фонового потока.
+
+    routes - другие адреса {путь: функция(параметры запроса, заголовки) -> (код, Content-Type, тело)},
+    например profiler.http_profile.
+    """
+    routes = routes or {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            if path == "/metrics":
+                status, content_type, body = 200, CONTENT_TYPE, render(registry.snapshot()).encode("utf-8")
+            elif path in routes:
+                status, content_type, body = routes[path](dict(parse_qsl(query)), self.headers)
+            else:
+                self.send_error(404)
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Prometheus опрашивает каждые несколько секунд, журнал не нужен
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -2,6 +2,14 @@ import tkinter as tk
 from tkinter import ttk, colorchooser, messagebox
 import json
 import os
+import queue
+import threading
+import time
+import requests
+
+API_URL = "http://192.168.0.104:8000"  # Адрес FastAPI-сервера
+API_TIMEOUT = 5  # Секунд ожидания ответа сервера
+DASHBOARD_REFRESH = 2  # Секунд между запросами ленты изменений
 
 
 class RobotQueueOrganizer:
@@ -38,9 +46,15 @@ class RobotQueueOrganizer:
             self.save_settings()
 
     def save_settings(self):
-        """Сохраняет текущие настройки в файл"""
-        with open(self.settings_file, 'w') as f:
+        """Сохраняет текущие настройки в файл.
+
+        Файл подменяется целиком, чтобы робот, следящий за ним,
+        никогда не прочитал наполовину записанные настройки.
+        """
+        tmp_file = self.settings_file + ".tmp"
+        with open(tmp_file, 'w') as f:
             json.dump(self.settings, f, indent=4)
+        os.replace(tmp_file, self.settings_file)
 
     def create_widgets(self):
         """Создаёт интерфейс организатора"""
@@ -49,8 +63,10 @@ class RobotQueueOrganizer:
         self.nav_frame.pack(side="left", fill="y", padx=30, pady=5)
 
         # Кнопки навигации
+        ttk.Button(self.nav_frame, text="Очередь онлайн",
+                   command=self.show_dashboard).pack(pady=(300, 10), fill="x")
         ttk.Button(self.nav_frame, text="Интерфейс очереди",
-                   command=self.show_queue_interface).pack(pady=(300, 10), fill="x")
+                   command=self.show_queue_interface).pack(pady=10, fill="x")
         ttk.Button(self.nav_frame, text="Настройки цветов",
                    command=self.show_settings).pack(pady=10, fill="x")
         ttk.Button(self.nav_frame, text="Выход",
@@ -59,50 +75,165 @@ class RobotQueueOrganizer:
         # Основная область контента
         self.content_frame = tk.Frame(self.root)
         self.content_frame.pack(side="right", fill="both", expand=True)
+        self.content_frame.grid_rowconfigure(0, weight=1)
+        self.content_frame.grid_columnconfigure(0, weight=1)
+
+        # Стиль настраивается один раз, дальше меняются только цвета
+        self.style = ttk.Style()
+        self.style.theme_use('clam')
+
+        # Экраны строятся один раз и переключаются через tkraise
+        self.dashboard_frame = self.build_dashboard()
+        self.queue_frame = self.build_queue_interface()
+        self.settings_frame = self.build_settings()
+        for frame in (self.dashboard_frame, self.queue_frame, self.settings_frame):
+            frame.grid(row=0, column=0, sticky="nsew")
+
+        # Лента изменений читается в фоновом потоке, окно не ждет сеть
+        self.queue_version = 0
+        self.queue_ids = []  # Номера в очереди в порядке строк списка
+        self.feed_results = queue.Queue()
+        threading.Thread(target=self.feed_worker, daemon=True).start()
+        self.root.after(200, self.poll_feed)
 
         # Показываем интерфейс очереди по умолчанию
         self.show_queue_interface()
 
-    def show_queue_interface(self):
-        """Показывает основной интерфейс очереди"""
-        self.clear_content()
+    def build_dashboard(self):
+        """Создает панель с текущим состоянием очереди"""
+        frame = tk.Frame(self.content_frame)
 
+        tk.Label(frame, text="Очередь онлайн", font=("Arial", 20)).pack(pady=(60, 20))
+
+        self.dashboard_labels = {}
+        for key, title in (("length", "В очереди"), ("now_serving", "Сейчас обслуживается"),
+                           ("avg_wait", "Среднее ожидание"), ("served_per_hour", "Обслужено за час")):
+            row = tk.Frame(frame)
+            row.pack(pady=5)
+            tk.Label(row, text=f"{title}:", font=("Arial", 14)).pack(side="left", padx=10)
+            self.dashboard_labels[key] = tk.Label(row, text="—", font=("Arial", 14, "bold"))
+            self.dashboard_labels[key].pack(side="left")
+
+        self.dashboard_status = tk.Label(frame, text="", font=("Arial", 10), fg="gray")
+        self.dashboard_status.pack(pady=5)
+
+        self.queue_listbox = tk.Listbox(frame, font=("Arial", 12), width=40, height=20)
+        self.queue_listbox.pack(pady=20)
+        return frame
+
+    def show_dashboard(self):
+        """Показывает панель с текущим состоянием очереди"""
+        self.dashboard_frame.tkraise()
+
+    def feed_worker(self):
+        """Фоновый поток: забирает из /queue/changes только новые изменения"""
+        session = requests.Session()
+        etag = None  # Если ответ не изменился, сервер вернет 304 без тела
+        while True:
+            try:
+                response = session.get(f"{API_URL}/queue/changes",
+                                       params={"since": self.queue_version}, timeout=API_TIMEOUT,
+                                       headers={"If-None-Match": etag} if etag else {})
+                if response.status_code != 304:
+                    response.raise_for_status()
+                    feed = response.json()
+                    self.queue_version = feed["version"]
+                    etag = response.headers.get("ETag")
+                    self.feed_results.put(feed)
+            except (requests.RequestException, ValueError):
+                etag = None  # После восстановления связи панель получит ответ целиком
+                self.feed_results.put(None)
+            time.sleep(DASHBOARD_REFRESH)
+
+    def poll_feed(self):
+        """Применяет полученные изменения к панели в главном потоке"""
+        while not self.feed_results.empty():
+            feed = self.feed_results.get_nowait()
+            if feed is None:
+                self.dashboard_status.config(text="Нет связи с сервером")
+                continue
+            self.dashboard_status.config(text="")
+            if feed.get("reset"):
+                self.queue_ids = []
+                self.queue_listbox.delete(0, "end")
+                for user in feed["queue"]:
+                    self.queue_ids.append(user["user_id"])
+                    self.queue_listbox.insert("end", f"{user['user_id']}. {user['name']}")
+            for change in feed.get("changes", []):
+                if change["type"] == "book":
+                    continue  # Записавшийся появится в списке, когда наступит его время
+                if change["type"] in ("join", "due"):
+                    # Приоритетные и записавшиеся встают не в конец, а на свою позицию
+                    index = change.get("position", len(self.queue_ids) + 1) - 1
+                    self.queue_ids.insert(index, change["user_id"])
+                    self.queue_listbox.insert(index, f"{change['user_id']}. {change['name']}")
+                elif change["user_id"] in self.queue_ids:
+                    index = self.queue_ids.index(change["user_id"])
+                    del self.queue_ids[index]
+                    self.queue_listbox.delete(index)
+            self.update_dashboard_stats(feed["stats"])
+        self.root.after(200, self.poll_feed)
+
+    def update_dashboard_stats(self, stats):
+        avg_wait = stats["avg_wait"]
+        self.dashboard_labels["length"].config(text=str(stats["length"]))
+        self.dashboard_labels["now_serving"].config(text=str(stats["now_serving"] or "—"))
+        self.dashboard_labels["avg_wait"].config(
+            text=f"{avg_wait / 60:.1f} мин" if avg_wait is not None else "—")
+        self.dashboard_labels["served_per_hour"].config(text=f"{stats['served_per_hour']:.0f}")
+        # В предпросмотре показываем последний выданный номер вместо примера
+        if self.queue_ids:
+            self.preview_number.config(text=str(max(self.queue_ids)))
+
+    def build_queue_interface(self):
+        """Создает экран предпросмотра интерфейса очереди"""
         # Основной фрейм с текущими настройками цветов
-        frame = tk.Frame(self.content_frame, bg=self.settings["bg_color"])
-        frame.pack(fill="both", expand=True)
+        frame = tk.Frame(self.content_frame)
 
         # Центральный контент
-        center_frame = tk.Frame(frame, bg=self.settings["bg_color"])
-        center_frame.place(relx=0.5, rely=0.5, anchor="center")
+        self.preview_center = tk.Frame(frame)
+        self.preview_center.place(relx=0.5, rely=0.5, anchor="center")
 
         # Пример интерфейса очереди
-        tk.Label(center_frame, text="Текущий интерфейс очереди",
-                 font=("Arial", 24), bg=self.settings["bg_color"],
-                 fg=self.settings["text_color"]).pack(pady=20)
+        self.preview_title = tk.Label(self.preview_center, text="Текущий интерфейс очереди",
+                                      font=("Arial", 24))
+        self.preview_title.pack(pady=20)
 
-        tk.Label(center_frame, text='15',
-                 font=("Arial", 48, "bold"), bg=self.settings['bg_color'], fg=self.settings['num_color']).pack(pady=10)
+        self.preview_number = tk.Label(self.preview_center, text='15',
+                                       font=("Arial", 48, "bold"))
+        self.preview_number.pack(pady=10)
 
         # Пример кнопки со стилем
-        style = ttk.Style()
-        style.theme_use('clam')
-        style.configure("Custom.TButton", background=self.settings['btn_color'], foreground="black",
-                        font=("Arial", 12, "bold"))
-
-        style.map('Custom.TButton',
-                  background=[('active', self.settings['btn_color']),
-                              ('disabled', self.settings['btn_color'])],
-                  foreground=[('pressed', 'black'),
-                              ('active', 'black')])
-
-        ttk.Button(center_frame, text="Пример кнопки",
+        ttk.Button(self.preview_center, text="Пример кнопки",
                    style="Custom.TButton").pack(pady=20, ipadx=20, ipady=10)
+        return frame
 
-    def show_settings(self):
-        """Показывает панель настроек"""
-        self.clear_content()
+    def apply_preview_colors(self):
+        """Перекрашивает готовый экран предпросмотра по текущим настройкам"""
+        bg = self.settings["bg_color"]
+        self.queue_frame.config(bg=bg)
+        self.preview_center.config(bg=bg)
+        self.preview_title.config(bg=bg, fg=self.settings["text_color"])
+        self.preview_number.config(bg=bg, fg=self.settings["num_color"])
 
-        frame = tk.Frame(self.content_frame)
+        self.style.configure("Custom.TButton", background=self.settings['btn_color'], foreground="black",
+                             font=("Arial", 12, "bold"))
+
+        self.style.map('Custom.TButton',
+                       background=[('active', self.settings['btn_color']),
+                                   ('disabled', self.settings['btn_color'])],
+                       foreground=[('pressed', 'black'),
+                                   ('active', 'black')])
+
+    def show_queue_interface(self):
+        """Показывает основной интерфейс очереди"""
+        self.apply_preview_colors()
+        self.queue_frame.tkraise()
+
+    def build_settings(self):
+        """Создает панель настроек"""
+        outer = tk.Frame(self.content_frame)
+        frame = tk.Frame(outer)
         frame.pack(fill="both", expand=True, padx=20, pady=20)
 
         # Заголовок
@@ -152,6 +283,11 @@ class RobotQueueOrganizer:
         # Кнопка предпросмотра
         ttk.Button(frame, text="Предпросмотр",
                    command=self.show_queue_interface).pack(pady=10)
+        return outer
+
+    def show_settings(self):
+        """Показывает панель настроек"""
+        self.settings_frame.tkraise()
 
     def choose_color(self, color_type):
         """Открывает диалог выбора цвета"""
@@ -176,11 +312,6 @@ class RobotQueueOrganizer:
         except ValueError:
             messagebox.showerror("Ошибка", "Размер QR-кода должен быть числом")
 
-    def clear_content(self):
-        """Очищает основную область контента"""
-        for widget in self.content_frame.winfo_children():
-            widget.destroy()
-
 
 if __name__ == "__main__":
     root = tk.Tk()
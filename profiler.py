@@ -0,0 +1,229 @@
+"""Профилирование по запросу без сторонних инструментов: сэмплы стеков и трассы медленных запросов.
+
+Сэмплер (sample) раз в PROFILE_INTERVAL секунд снимает стеки всех
+потоков процесса через sys._current_frames - в том числе цикла событий
+uvicorn или aiogram, который выполняет текущую корутину. Ни ptrace, ни
+perf не нужны, поэтому работает в обычном контейнере. Результат -
+collapsed stacks (flamegraph.pl, speedscope, inferno) или JSON speedscope.
+
+Трассы: пока трассировка включена (PROFILE=1 или окно, открытое через
+/debug/slow), каждый запрос API собирает вызовы методов QueueManager с
+их временем и выполненным SQL. Запросы дольше PROFILE_SLOW_MS попадают
+в SLOW и в журнал "profile". SQL перехватывается trace callback
+соединений SQLite, которые открыты при включенном профилировании
+(PROFILE=1 или задан PROFILE_TOKEN); литералы в тексте заменяются на ?.
+
+Доступ к /debug/* - по заголовку X-Profile-Token, равному PROFILE_TOKEN;
+без PROFILE_TOKEN эти адреса не отвечают.
+"""
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import contextvars
+import json
+import logging
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))  # Секунд между сэмплами
+MAX_SECONDS = 60  # Самое длинное окно сэмплирования
+SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "100"))  # Порог медленного запроса
+SLOW_KEEP = 100  # Сколько последних медленных запросов хранить
+SQL_LIMIT = 50  # Сколько разных запросов SQL хранить в записи одного вызова
+ENABLED = os.getenv("PROFILE", "0") == "1"  # Трассировать все запросы с запуска
+TOKEN = os.getenv("PROFILE_TOKEN") or None
+FORMATS = ("collapsed", "speedscope")
+
+# Строковые и числовые литералы (числа внутри имен вроде visits_20240101 не трогаются)
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+logger = logging.getLogger("profile")
+SLOW = deque(maxlen=SLOW_KEEP)  # Медленные запросы этого процесса
+
+_trace = contextvars.ContextVar("profile_trace", default=None)
+_local = threading.local()  # Вызов QueueManager, в который записывается SQL этого потока
+_tracing_until = 0.0  # time.monotonic(), до которого открыто окно трассировки
+
+
+# Сэмплирование стеков
+
+def _frame(code) -> tuple:
+    """(функция, файл, строка объявления): так стеки группируются по функциям, а не по строкам"""
+    path = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return code.co_name, "/".join(path[-2:]), code.co_firstlineno
+
+
+def sample(seconds: float, label: Optional[str] = None, interval: float = SAMPLE_INTERVAL) -> Counter:
+    """Снимает стеки всех потоков, кроме своего, seconds секунд: Counter {стек: число сэмплов}.
+
+    Стек - кортеж кадров от корня: метка процесса label, имя потока,
+    затем (функция, файл, строка). Кадр цикла событий в selectors.select
+    означает, что процесс ждал работы.
+    """
+    label = label or f"pid-{os.getpid()}"
+    me = threading.get_ident()
+    frames = {}  # {code: кадр} - один разбор на функцию
+    stacks = Counter()
+    deadline = time.monotonic() + min(seconds, MAX_SECONDS)
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                entry = frames.get(code)
+                if entry is None:
+                    entry = frames[code] = _frame(code)
+                stack.append(entry)
+                frame = frame.f_back
+            stack.append((names.get(ident, f"thread-{ident}"), "", 0))
+            stack.append((label, "", 0))
+            stacks[tuple(reversed(stack))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def _name(frame: tuple) -> str:
+    name, path, line = frame
+    return f"{name} ({path}:{line})" if path else name
+
+
+def collapsed(stacks: Counter) -> str:
+    """Строки "корень;...;лист число" для flamegraph.pl и speedscope"""
+    return "".join(";".join(map(_name, stack)) + f" {count}\n" for stack, count in stacks.most_common())
+
+
+def speedscope(stacks: Counter, name: str) -> Dict:
+    """Файл speedscope: отдельный профиль на каждый поток каждого процесса, вес - число сэмплов"""
+    frames, index, profiles = [], {}, {}
+    for stack, count in sorted(stacks.items()):
+        ids = []
+        for frame in stack[2:]:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            ids.append(index[frame])
+        samples, weights = profiles.setdefault(stack[:2], ([], []))
+        samples.append(ids)
+        weights.append(count)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "profiler.py",
+        "shared": {"frames": frames},
+        "profiles": [{"type": "sampled", "name": f"{root[0][0]} {root[1][0]}", "unit": "none",
+                      "startValue": 0, "endValue": sum(weights), "samples": samples, "weights": weights}
+                     for root, (samples, weights) in profiles.items()],
+    }
+
+
+def export(stacks: Counter, output: str, name: str) -> Tuple[str, bytes]:
+    """(Content-Type, тело) профиля в формате output из FORMATS"""
+    if output == "speedscope":
+        return "application/json", json.dumps(speedscope(stacks, name)).encode("utf-8")
+    return "text/plain; charset=utf-8", collapsed(stacks).encode("utf-8")
+
+
+# Трассы запросов
+
+def tracing() -> bool:
+    return ENABLED or time.monotonic() < _tracing_until
+
+
+def trace_for(seconds: float):
+    """Включает трассировку запросов этого процесса на seconds секунд"""
+    global _tracing_until
+    _tracing_until = max(_tracing_until, time.monotonic() + seconds)
+
+
+class Trace:
+    """Вызовы QueueManager одного запроса; активна в контексте, где создана"""
+
+    __slots__ = ("calls", "token")
+
+    def __init__(self):
+        self.calls = []
+        self.token = _trace.set(self)
+
+
+def start_trace() -> Optional[Trace]:
+    """Начинает трассу запроса, если трассировка включена; иначе None"""
+    return Trace() if tracing() else None
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def finish_trace(trace: Trace, seconds: float, **request):
+    """Завершает трассу; медленный запрос сохраняет в SLOW и пишет в журнал"""
+    _trace.reset(trace.token)
+    if seconds * 1000 < SLOW_MS:
+        return
+    entry = {"at": round(time.time(), 3), **request, "ms": round(seconds * 1000, 3), "calls": trace.calls}
+    SLOW.append(entry)
+    logger.warning("slow request %s", json.dumps(entry, ensure_ascii=False))
+
+
+@contextmanager
+def record(calls: List, method: str):
+    """Записывает в calls вызов method с его временем и SQL, выполненным этим потоком"""
+    started = time.perf_counter()
+    call = _local.call = {"method": method, "sql": []}
+    _local.started = started
+    try:
+        yield call
+    finally:
+        _local.call = None
+        call["ms"] = round((time.perf_counter() - started) * 1000, 3)
+        calls.append(call)
+
+
+def on_sql(statement: str):
+    """trace callback SQLite: запрос попадает в вызов, который сейчас записывает этот поток.
+
+    Каждая строка executemany - отдельный запрос; одинаковые подряд
+    склеиваются в [смещение от начала вызова в мс, сколько раз, SQL].
+    """
+    call = getattr(_local, "call", None)
+    if call is None:
+        return
+    offset = round((time.perf_counter() - _local.started) * 1000, 3)
+    statement = " ".join(LITERALS.sub("?", statement).split())
+    sql = call["sql"]
+    if sql and sql[-1][2] == statement:
+        sql[-1][1] += 1
+    elif len(sql) < SQL_LIMIT:
+        sql.append([offset, 1, statement])
+
+
+def trace_sql(conn):
+    """Подключает on_sql к соединению, если профилирование включено окружением"""
+    if ENABLED or TOKEN:
+        conn.set_trace_callback(on_sql)
+
+
+def authorized(token: Optional[str]) -> bool:
+    """Разрешен ли доступ к /debug/* с заголовком X-Profile-Token = token"""
+    return TOKEN is not None and token is not None and secrets.compare_digest(token, TOKEN)
+
+
+def http_profile(query: Dict[str, str], headers) -> Tuple[int, str, bytes]:
+    """/debug/profile?seconds=&format= для процессов без FastAPI (бот): сэмплирует этот процесс"""
+    if not authorized(headers.get("X-Profile-Token")):
+        return 404, "text/plain; charset=utf-8", b"Not Found"
+    try:
+        seconds = float(query.get("seconds", "10"))
+    except ValueError:
+        seconds = 0
+    output = query.get("format", "collapsed")
+    if not 0 < seconds <= MAX_SECONDS or output not in FORMATS:
+        return 400, "text/plain; charset=utf-8", f"seconds: 0..{MAX_SECONDS}, format: {FORMATS}".encode("utf-8")
+    label = f"{os.path.basename(sys.argv[0]) or 'python'}-{os.getpid()}"
+    return (200, *export(sample(seconds, label), output, label))
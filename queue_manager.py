@@ -1,73 +1,1210 @@
-from datetime import datetime
-from typing import Optional
-import sqlite3
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import chain, groupby, islice
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import atexit
+import logging
+import os
+import threading
+import time
+from history import CALLED, FINISHED, HISTORY_BATCH, JOINED, LEFT, VisitHistory
+from metrics import REGISTRY
+import profiler
+from ratelimit import JoinLimiter
+from storage import SQLITE_FAILURES, SQLITE_ROWS, SQLITE_SECONDS, StorageProfile
 
 
 class User:
-    def __init__(self, user_id: int, name: str):
+    def __init__(self, user_id: int, name: str, client_id: Optional[str] = None,
+                 joined_at: Optional[datetime] = None, qid: str = "default",
+                 priority: int = 0, slot_at: Optional[datetime] = None):
         self.id = user_id
         self.name = name
-        self.joined_at = datetime.now()
+        self.client_id = client_id  # Ключ идемпотентности, присланный клиентом
+        self.joined_at = joined_at or datetime.now()
+        self.qid = qid  # Название очереди (услуги), в которой стоит пользователь
+        self.priority = priority  # Полоса приоритета: 0 - обычная, чем больше, тем раньше вызов
+        self.slot_at = slot_at  # Время записи; до него пользователь ждет в календаре
+        self.lane = None  # Полоса, в которой стоит пользователь (None - ждет записи)
+        self.seq = 0  # Порядковый номер внутри полосы, задает Lane
+
+    def __getstate__(self):
+        # Между процессами (queue_service.py) полоса не передается: иначе
+        # вместе с пользователем ушла бы вся полоса с деревом Фенвика
+        state = self.__dict__.copy()
+        state["lane"] = None
+        return state
+
+    @property
+    def ready_at(self) -> datetime:
+        """С какого момента пользователь ждет вызова"""
+        if self.slot_at and self.slot_at > self.joined_at:
+            return self.slot_at
+        return self.joined_at
+
+
+class FenwickTree:
+    """Дерево Фенвика над номерами в очереди: позиция считается за O(log n)"""
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+        self.present = bytearray(size + 1)
+        self.tree = [0] * (size + 1)
+
+    def __contains__(self, index: int) -> bool:
+        return 0 < index <= self.size and self.present[index] == 1
+
+    def __len__(self) -> int:
+        return self.rank(self.size)
+
+    def build(self, indexes: Iterable[int]):
+        """Заполняет дерево сразу всеми номерами за O(n)"""
+        for index in indexes:
+            if index > self.size:
+                self._resize(index)
+            self.present[index] = 1
+        self._rebuild()
+
+    def _resize(self, index: int):
+        size = self.size
+        while size < index:
+            size *= 2
+        self.present.extend(bytearray(size - self.size))
+        self.size = size
+
+    def _rebuild(self):
+        """Линейное построение дерева по отметкам присутствия"""
+        tree = list(self.present)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def _update(self, index: int, delta: int):
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def insert(self, index: int):
+        """Отмечает номер как стоящий в очереди"""
+        if index > self.size:
+            self._resize(index)
+            self._rebuild()
+        if self.present[index]:
+            return
+        self.present[index] = 1
+        self._update(index, 1)
+
+    def remove(self, index: int) -> bool:
+        """Снимает отметку с номера, возвращает False если его не было"""
+        if index not in self:
+            return False
+        self.present[index] = 0
+        self._update(index, -1)
+        return True
+
+    def select(self, k: int) -> int:
+        """Номер k-го по порядку отмеченного элемента (k с единицы) за O(log n)"""
+        index = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            candidate = index + step
+            if candidate <= self.size and self.tree[candidate] < k:
+                index = candidate
+                k -= self.tree[candidate]
+            step >>= 1
+        return index + 1
+
+    def rank(self, index: int) -> int:
+        """Количество отмеченных номеров, не превышающих index"""
+        index = min(index, self.size)
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+
+DEFAULT_QUEUE = "default"  # Очередь для старых эндпоинтов без {qid}
+CHANGES_LIMIT = 1000  # Сколько последних изменений хранится для /queue/changes
+STATS_WINDOW = 3600  # Окно (в секундах) для среднего ожидания и пропускной способности
+# Полосы приоритета: 0 - обычная очередь, 1 - льготная (и пришедшие по записи),
+# 2 - вне очереди. Вызывается первый в самой старшей непустой полосе
+PRIORITY_LEVELS = 3
+APPOINTMENT_PRIORITY = 1
+EWMA_ALPHA = 0.2  # Вес нового замера в оценке времени ожидания
+IN_SERVICE_LIMIT = 100  # Сколько вызванных без отметки об окончании помнить
+LANE_COMPACT_MIN = 1024  # С какого числа выданных seq полоса перенумеровывается, если ушедших больше половины
+REMOTE_READERS = 8  # Потоков для чтений, когда очереди держит другой процесс
+WATCH_TIMEOUT = 30  # Секунд одного ожидания изменений в AsyncQueueManager.watch
+
+# Время методов очереди там, где выполняется QueueManager, и, если очереди
+# держит другой процесс, время вызова из процесса API вместе с сокетом
+METHOD_SECONDS = REGISTRY.histogram("queue_method_seconds", "Время методов QueueManager, секунд",
+                                    ("method",))
+CALL_SECONDS = REGISTRY.histogram("queue_call_seconds",
+                                  "Время вызова очереди из процесса API через сокет, секунд", ("method",))
+
+logger = logging.getLogger("queue")
+
+
+class WaitEstimator:
+    """Онлайн-оценка времени ожидания по экспоненциальному скользящему среднему.
+
+    Хранит EWMA интервала между вызовами и длительности обслуживания
+    отдельно для каждого часа суток и общее. Обновление и оценка - O(1),
+    история не пересматривается.
+    """
+
+    def __init__(self, alpha: float = EWMA_ALPHA):
+        self.alpha = alpha
+        self.interval = [None] * 24  # Интервал между вызовами по часам суток, секунд
+        self.service = [None] * 24   # Длительность обслуживания по часам суток, секунд
+        self.interval_all = None
+        self.service_all = None
+        self.last_call = None
+
+    def _update(self, values: List, total: Optional[float], hour: int, sample: float) -> float:
+        current = values[hour]
+        values[hour] = sample if current is None else current + self.alpha * (sample - current)
+        return sample if total is None else total + self.alpha * (sample - total)
+
+    def called(self, user: User, now: datetime):
+        """Вызов: интервал считается с момента, когда вызванный уже ждал"""
+        if self.last_call is not None:
+            gap = (now - max(self.last_call, user.ready_at)).total_seconds()
+            if gap >= 0:
+                self.interval_all = self._update(self.interval, self.interval_all, now.hour, gap)
+        self.last_call = now
+
+    def finished(self, called_at: datetime, now: datetime):
+        """Окончание обслуживания, вызванного в called_at"""
+        duration = (now - called_at).total_seconds()
+        self.service_all = self._update(self.service, self.service_all, called_at.hour, duration)
+
+    def pace(self, now: datetime) -> Optional[float]:
+        """Сколько секунд в среднем проходит между вызовами в этот час"""
+        for value in (self.interval[now.hour], self.interval_all,
+                      self.service[now.hour], self.service_all):
+            if value is not None:
+                return value
+        return None
+
+    def wait(self, position: int, now: datetime, ready_at: Optional[datetime] = None) -> Optional[float]:
+        """Ожидаемое время до вызова (в секундах) для позиции position"""
+        pace = self.pace(now)
+        if pace is None:
+            return None
+        wait = (position - 1) * pace
+        if ready_at and ready_at > now:
+            wait = max(wait, (ready_at - now).total_seconds())  # Раньше записи не вызовут
+        return wait
+
+
+class Lane:
+    """Полоса одного приоритета: FIFO с деревом Фенвика по номерам прихода в полосу.
+
+    Ушедшие оставляют в ids и дереве пустые места, поэтому, когда их
+    становится больше стоящих, полоса перенумеровывается (compact). Так
+    память и время операций зависят от длины очереди, а не от числа
+    приходов за все время; перенумерация за O(n) приходится на n уходов.
+    """
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.users = OrderedDict()  # {id: User} в порядке полосы
+        self.ids = []               # ids[seq - 1] = id
+        self.index = FenwickTree()  # отметки seq тех, кто еще в полосе
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def _attach(self, user: User):
+        self.ids.append(user.id)
+        user.lane = self
+        user.seq = len(self.ids)
+        self.users[user.id] = user
+
+    def append(self, user: User):
+        self._attach(user)
+        self.index.insert(user.seq)
+
+    def load(self, users: Iterable[User]):
+        """Заполняет пустую полосу при запуске за O(n)"""
+        for user in users:
+            self._attach(user)
+        self.index.build(range(1, len(self.ids) + 1))
+
+    def remove(self, user: User):
+        del self.users[user.id]
+        self.index.remove(user.seq)
+        user.lane = None
+
+    def sparse(self) -> bool:
+        """Пора ли перенумеровать: ушедших в ids больше, чем стоящих"""
+        return len(self.ids) > max(2 * len(self.users), LANE_COMPACT_MIN)
+
+    def compact(self) -> FenwickTree:
+        """Перенумеровывает стоящих с 1 за O(n) и возвращает прежнее дерево для пересчета курсоров"""
+        old = self.index
+        self.ids = []
+        self.index = FenwickTree()
+        for user in self.users.values():
+            self._attach(user)
+        self.index.build(range(1, len(self.ids) + 1))
+        return old
+
+    def at(self, k: int) -> User:
+        """k-й (с 1) пользователь полосы за O(log n)"""
+        return self.users[self.ids[self.index.select(k) - 1]]
+
+
+class QueueState:
+    """Состояние одной именованной очереди в памяти.
+
+    Планировщик состоит из полос приоритета и календаря записей.
+    Вызывается первый в самой приоритетной непустой полосе, внутри
+    полосы - по порядку прихода. Записавшиеся на время ждут в календаре
+    и в момент записи встают в полосу max(priority, APPOINTMENT_PRIORITY).
+    Номер в полосе (seq) свой у каждой полосы и очереди, поэтому операции
+    не зависят от размера соседних очередей. Блокировку держит QueueManager.
+    """
+
+    def __init__(self, qid: str):
+        self.qid = qid
+        self.users = {}             # {id: User} - все, кто стоит в очереди или ждет записи
+        self.lanes = [Lane(priority) for priority in range(PRIORITY_LEVELS)]
+        # Календарь записей: отсортированный список (slot_at, id). bisect
+        # находит место записи среди остальных за O(log n), но вставка и
+        # удаление при отказе сдвигают хвост списка - O(n) копирования (в C,
+        # для календаря в тысячи записей это микросекунды). Наступившие
+        # записи снимаются с головы одним срезом за вызов promote
+        self.calendar = []
+        # {id: (priority, seq)} недавно ушедших, для курсоров: место сразу за seq
+        self.departed = OrderedDict()
+        self.client_ids = {}        # {client_id: User} стоящих, для повторных запросов
+        self.issued = OrderedDict()  # {client_id: (User, когда ушел)} ушедших, в порядке ухода
+        # Лента изменений: версия растет и после перезапуска, поэтому курсор,
+        # полученный клиентом до перезапуска, не совпадет с новыми изменениями
+        self.version = int(time.time() * 1000)
+        self.changes = deque(maxlen=CHANGES_LIMIT)
+        self.now_serving = None
+        self.served = deque()  # (время вызова, ожидание в секундах) за STATS_WINDOW
+        self.served_wait_sum = 0.0
+        self.in_service = OrderedDict()  # {id: (User, время вызова)} еще не закончивших
+        self.estimator = WaitEstimator()
+
+    def __len__(self) -> int:
+        """Сколько человек стоит в живой очереди (без ожидающих записи)"""
+        return self.ahead(-1)
+
+    def add(self, user: User, now: datetime):
+        """Ставит пользователя в полосу или, если запись еще не наступила, в календарь"""
+        self.users[user.id] = user
+        if user.client_id:
+            self.client_ids[user.client_id] = user
+        if user.slot_at and user.slot_at > now:
+            insort(self.calendar, (user.slot_at, user.id))
+        else:
+            self.lanes[self.lane_for(user)].append(user)
+
+    def remove(self, user: User, now: datetime):
+        del self.users[user.id]
+        if user.client_id:
+            # Повтор запроса, ответ на который потерялся, вернет тот же номер и после ухода
+            self.client_ids.pop(user.client_id, None)
+            self.issued[user.client_id] = (user, now)
+        if user.lane is None:
+            del self.calendar[bisect_left(self.calendar, (user.slot_at, user.id))]
+            return
+        lane = user.lane
+        self.departed[user.id] = (lane.priority, user.seq)
+        if len(self.departed) > CHANGES_LIMIT:
+            self.departed.popitem(last=False)
+        lane.remove(user)
+        if lane.sparse():
+            # Курсор ушедшего переезжает за последнего стоявшего перед ним
+            old = lane.compact()
+            for user_id, (priority, seq) in list(self.departed.items()):
+                if priority == lane.priority:
+                    self.departed[user_id] = (priority, old.rank(seq))
+
+    def ticket(self, client_id: str) -> Optional[User]:
+        """Номер, уже выданный по client_id: стоящему в очереди или недавно ушедшему"""
+        user = self.client_ids.get(client_id)
+        if user is None:
+            entry = self.issued.get(client_id)
+            user = entry[0] if entry is not None else None
+        return user
+
+    def expire(self, before: datetime):
+        """Забывает client_id тех, кто ушел раньше before"""
+        while self.issued and next(iter(self.issued.values()))[1] < before:
+            self.issued.popitem(last=False)
+
+    @staticmethod
+    def lane_for(user: User) -> int:
+        if user.slot_at:
+            return max(user.priority, APPOINTMENT_PRIORITY)
+        return user.priority
+
+    def promote(self, now: datetime):
+        """Переводит наступившие записи из календаря в их полосы"""
+        count = 0
+        while count < len(self.calendar) and self.calendar[count][0] <= now:
+            count += 1
+        if not count:
+            return
+        due = self.calendar[:count]
+        del self.calendar[:count]
+        for _, user_id in due:
+            user = self.users[user_id]
+            self.lanes[self.lane_for(user)].append(user)
+            self.record("due", user, now)
+
+    def ahead(self, priority: int) -> int:
+        """Сколько человек стоит в полосах выше priority"""
+        count = 0
+        for lane in self.lanes[priority + 1:]:
+            count += len(lane.users)
+        return count
+
+    def rank_at(self, priority: int, seq: int) -> int:
+        """Сколько стоящих будет вызвано не позже места (priority, seq)"""
+        return self.ahead(priority) + self.lanes[priority].index.rank(seq)
+
+    def rank(self, user: User) -> int:
+        """Позиция (оценка ранга) пользователя за O(log n).
+
+        Для ждущего записи это место, которое он займет в момент записи,
+        если до нее никого не вызовут: впереди окажутся полосы не ниже его
+        и более ранние записи, которые встанут в такие же полосы. Если его
+        полоса выше APPOINTMENT_PRIORITY, более ранние записи перебираются -
+        O(k) по их числу. Обычная позиция не учитывает записи, которые
+        наступят раньше вызова.
+        """
+        if user.lane is not None:
+            return self.rank_at(user.lane.priority, user.seq)
+        lane = self.lane_for(user)
+        booked_before = bisect_left(self.calendar, (user.slot_at, user.id))
+        if lane > APPOINTMENT_PRIORITY:
+            # Ранние записи с полосой ниже встанут позади него
+            booked_before = sum(1 for _, user_id in islice(self.calendar, booked_before)
+                                if self.lane_for(self.users[user_id]) >= lane)
+        return self.ahead(lane - 1) + booked_before + 1
+
+    def place(self, user_id: int) -> Optional[tuple]:
+        """(priority, seq) стоящего или недавно ушедшего пользователя для курсора"""
+        user = self.users.get(user_id)
+        if user is not None:
+            return (user.lane.priority, user.seq) if user.lane is not None else None
+        return self.departed.get(user_id)
+
+    def at(self, position: int) -> User:
+        """Пользователь на позиции position (с 1) живой очереди за O(log n)"""
+        for lane in reversed(self.lanes):
+            if position <= len(lane):
+                return lane.at(position)
+            position -= len(lane)
+        raise IndexError(position)
+
+    def head(self) -> Optional[User]:
+        for lane in reversed(self.lanes):
+            if lane.users:
+                return next(iter(lane.users.values()))
+        return None
+
+    def ordered(self) -> Iterable[User]:
+        """Живая очередь в порядке вызова"""
+        return chain.from_iterable(lane.users.values() for lane in reversed(self.lanes))
+
+    def record(self, change: str, user: User, now: datetime):
+        """Добавляет изменение в ленту и обновляет статистику"""
+        self.version += 1
+        at = time.time()
+        entry = {
+            "version": self.version, "type": change, "at": at,
+            "user_id": user.id, "name": user.name
+        }
+        if change in ("join", "due") and user.lane is not None:
+            entry["position"] = self.rank(user)
+        self.changes.append(entry)
+        if change == "serve":
+            wait = (now - user.ready_at).total_seconds()
+            self.now_serving = user
+            self.served.append((at, wait))
+            self.served_wait_sum += wait
+            self.estimator.called(user, now)
+            self.in_service[user.id] = (user, now)
+            if len(self.in_service) > IN_SERVICE_LIMIT:
+                self.in_service.popitem(last=False)
+
+    def finish(self, user_id: int, now: datetime) -> Optional[float]:
+        """Отмечает окончание обслуживания и возвращает его длительность (None, если не вызывали)"""
+        user, called_at = self.in_service.pop(user_id, (None, None))
+        if user is None:
+            return None
+        self.estimator.finished(called_at, now)
+        self.record("finish", user, now)
+        return (now - called_at).total_seconds()
+
+    def estimate(self, user: User, now: datetime) -> Dict:
+        """Позиция и ожидаемое время до вызова (None, пока нет замеров)"""
+        position = self.rank(user)
+        return {"position": position,
+                "estimated_wait": self.estimator.wait(position, now, user.slot_at)}
+
+    def stats(self) -> Dict:
+        """Сводка для панели организатора за O(1) амортизированно"""
+        border = time.time() - STATS_WINDOW
+        while self.served and self.served[0][0] < border:
+            self.served_wait_sum -= self.served.popleft()[1]
+        served = len(self.served)
+        return {
+            "length": len(self.users),
+            "booked": len(self.calendar),
+            "now_serving": self.now_serving.id if self.now_serving else None,
+            "avg_wait": self.served_wait_sum / served if served else None,
+            "avg_service": self.estimator.service_all,
+            "served_per_hour": served * 3600 / STATS_WINDOW,
+        }
 
 
 class QueueManager:
-    def __init__(self, db_path: str = "queue.db"):
-        self.conn = sqlite3.connect(db_path)
-        self._init_db()
+    """Очереди хранятся в памяти, SQLite используется как журнал для восстановления.
+
+    Один экземпляр обслуживает любое число именованных очередей (qid)
+    через одно соединение с базой. Номера пользователей общие для всех
+    очередей, поэтому /status и /leave находят очередь по номеру.
+
+    flush_interval задает режим записи: 0 - каждое изменение сразу
+    фиксируется в базе, больше 0 - изменения копятся в журнале и
+    сбрасываются одной транзакцией раз в flush_interval секунд.
+    При аварийном завершении теряются только не сброшенные изменения.
+
+    db_path по умолчанию берется из QUEUE_DB, настройки SQLite - из
+    profile (StorageProfile.from_env(), если не задан). Чтения после
+    запуска идут из памяти, поэтому соединение с базой одно - писатель.
+
+    В таблице users лежат только те, кто сейчас в очереди. Ушедшие и
+    обслуженные попадают в архив визитов VisitHistory (history_db,
+    по умолчанию рядом с db_path), который пишется пачками. client_id
+    ушедших еще CLIENT_ID_TTL секунд хранится в таблице client_keys,
+    чтобы повтор запроса вернул прежний номер, а не выдал новый.
+
+    clock возвращает текущее время; подменяется в симуляции.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, flush_interval: Optional[float] = None,
+                 clock=datetime.now, history_db: Optional[str] = None,
+                 profile: Optional[StorageProfile] = None):
+        if db_path is None:
+            db_path = os.getenv("QUEUE_DB", "queue.db")
+        if flush_interval is None:
+            flush_interval = float(os.getenv("QUEUE_FLUSH_INTERVAL", "0"))
+        if history_db is None:
+            history_db = os.getenv("QUEUE_HISTORY_DB") or (
+                db_path if db_path == ":memory:" else os.path.splitext(db_path)[0] + "_history.db")
+        self.profile = profile or StorageProfile.from_env()
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.client_id_ttl = timedelta(seconds=float(os.getenv("CLIENT_ID_TTL", "86400")))
+        self.history = VisitHistory(history_db, int(os.getenv("HISTORY_RETENTION_DAYS", "90")),
+                                    self.profile)
+        self.conn = self.profile.connect(db_path)
+        self._lock = threading.Lock()      # состояние очередей в памяти
+        self._changed = threading.Condition(self._lock)  # для wait_changes
+        self._db_lock = threading.Lock()   # соединение с базой
+        self._queues = {}                  # {qid: QueueState}
+        self._owners = {}                  # {id: QueueState} для поиска по номеру
+        self._version = int(time.time() * 1000)  # Общая версия всех очередей, см. get_version
+        self._journal = []
+        self._next_id = 1
+        with SQLITE_SECONDS.time("queue_load"):
+            self._init_db()
+        REGISTRY.gauge("queue_length", "Человек в живой очереди", ("queue",), self._lengths)
+        REGISTRY.gauge("queue_booked", "Записей на время, которые еще не наступили", ("queue",),
+                       self._booked)
+        REGISTRY.gauge("queue_journal_pending", "Изменений очереди, еще не записанных в базу", (),
+                       lambda: {(): len(self._journal)})
+
+        self._stop = threading.Event()
+        self._flusher = None
+        if self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
 
     def _init_db(self):
-        """Создает таблицу для очереди"""
+        """Создает таблицу для очередей и восстанавливает состояние из базы"""
         cursor = self.conn.cursor()
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
-                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                client_id TEXT,
+                queue TEXT NOT NULL DEFAULT 'default',
+                priority INTEGER NOT NULL DEFAULT 0,
+                slot_at TIMESTAMP
             )
         """)
+        # Базы, созданные до появления client_id, queue и приоритетов
+        cursor.execute("PRAGMA table_info(users)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if "client_id" not in columns:
+            cursor.execute("ALTER TABLE users ADD COLUMN client_id TEXT")
+        if "queue" not in columns:
+            cursor.execute("ALTER TABLE users ADD COLUMN queue TEXT NOT NULL DEFAULT 'default'")
+        if "priority" not in columns:
+            cursor.execute("ALTER TABLE users ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+            cursor.execute("ALTER TABLE users ADD COLUMN slot_at TIMESTAMP")
+        # id монотонно растет (AUTOINCREMENT), поэтому внутри очереди он и
+        # служит ключом порядка; составной индекс отделяет очереди друг от друга
+        cursor.execute("CREATE INDEX IF NOT EXISTS users_queue_order ON users (queue, id)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS client_keys (
+                queue TEXT NOT NULL,
+                client_id TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                joined_at TIMESTAMP NOT NULL,
+                left_at TIMESTAMP NOT NULL,
+                PRIMARY KEY (queue, client_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS client_keys_left ON client_keys (left_at)")
         self.conn.commit()
 
-    def add_user(self, name: str) -> User:
-        """Добавляет пользователя в очередь и возвращает его данные"""
-        cursor = self.conn.cursor()
+        # Порядок в полосе восстанавливается по моменту, с которого человек
+        # ждет вызова: наступившие записи встают туда же, куда встали бы вживую
+        now = self.clock()
+        lanes = {}  # {(qid, priority): [User, ...]}
         cursor.execute(
-            "INSERT INTO users (name) VALUES (?)",
-            (name,)
+            "SELECT id, name, client_id, joined_at, queue, priority, slot_at FROM users ORDER BY id"
         )
-        self.conn.commit()
-        user_id = cursor.lastrowid
-        return User(user_id, name)
+        for user_id, name, client_id, joined_at, qid, priority, slot_at in cursor:
+            joined_at = datetime.fromisoformat(joined_at) if joined_at else None
+            slot_at = datetime.fromisoformat(slot_at) if slot_at else None
+            user = User(user_id, name, client_id, joined_at, qid, priority, slot_at)
+            state = self._state(qid)
+            state.users[user_id] = user
+            if client_id:
+                state.client_ids[client_id] = user
+            if slot_at and slot_at > now:
+                state.calendar.append((slot_at, user_id))
+            else:
+                lanes.setdefault((qid, state.lane_for(user)), []).append(user)
+            self._owners[user_id] = state
+        for (qid, priority), users in lanes.items():
+            users.sort(key=lambda user: (user.ready_at, user.id))
+            self._queues[qid].lanes[priority].load(users)
+        for state in self._queues.values():
+            state.calendar.sort()
 
-    def get_position(self, user_id: int) -> Optional[int]:
-        """Возвращает позицию пользователя"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT COUNT(*) FROM users 
-            WHERE joined_at <= (SELECT joined_at FROM users WHERE id = ?)
-        """, (user_id,))
-        return cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT queue, client_id, user_id, name, joined_at, left_at FROM client_keys"
+            " WHERE left_at >= ? ORDER BY left_at", (self._iso(now - self.client_id_ttl),)
+        )
+        for qid, client_id, user_id, name, joined_at, left_at in cursor.fetchall():
+            user = User(user_id, name, client_id, datetime.fromisoformat(joined_at), qid)
+            self._state(qid).issued[client_id] = (user, datetime.fromisoformat(left_at))
 
-    def get_next(self) -> Optional[User]:
-        """Возвращает следующего пользователя и удаляет его из очереди"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id, name FROM users ORDER BY joined_at LIMIT 1")
+        # Номера выдаются в памяти, продолжаем с последнего выданного базой
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'users'")
         row = cursor.fetchone()
-        if row:
-            user = User(row[0], row[1])
-            cursor.execute("DELETE FROM users WHERE id = ?", (user.id,))
+        self._next_id = (row[0] if row else 0) + 1
+
+    def _state(self, qid: str) -> QueueState:
+        """Возвращает состояние очереди, создавая его при первом обращении (только для записи)"""
+        state = self._queues.get(qid)
+        if state is None:
+            state = self._queues[qid] = QueueState(qid)
+        return state
+
+    def _queue(self, qid: str) -> QueueState:
+        """Очередь с переведенными в полосы наступившими записями (под self._lock)"""
+        state = self._state(qid)
+        self._promote(state)
+        return state
+
+    def _existing(self, qid: str) -> Optional[QueueState]:
+        """Очередь qid, если в нее уже кто-то вставал, иначе None (под self._lock)"""
+        state = self._queues.get(qid)
+        if state is not None:
+            self._promote(state)
+        return state
+
+    def _readable(self, qid: str) -> QueueState:
+        """Очередь qid для чтения; несуществующая не создается, вместо нее - пустая (под self._lock).
+
+        Иначе любой GET /queues/<случайное имя> навсегда добавлял бы очередь
+        в память, в /queues и в метрики.
+        """
+        state = self._existing(qid)
+        if state is None:
+            state = QueueState(qid)
+            state.version = 0  # Не меняется между запросами, пока очередь не появится
+        return state
+
+    def _promote(self, state: QueueState):
+        """Переводит наступившие записи в полосы; это тоже меняет общую версию (под self._lock)"""
+        version = state.version
+        state.promote(self.clock())
+        if state.version != version:
+            self._version += 1
+
+    def _owner(self, user_id: int, qid: Optional[str] = None) -> Optional[QueueState]:
+        """Очередь, в которой стоит пользователь, или None (под self._lock)"""
+        state = self._owners.get(user_id)
+        if state is None or (qid is not None and state.qid != qid):
+            return None
+        self._promote(state)
+        return state
+
+    @staticmethod
+    def _iso(moment: datetime) -> str:
+        return moment.isoformat(" ", "seconds")
+
+    def _write(self, *operation):
+        """Добавляет изменение в журнал (вызывается под self._lock)"""
+        self._journal.append(operation)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self._try_flush()
+
+    def _try_flush(self, history_batch: int = 1):
+        """flush и запись архива; ошибка SQLite не теряет изменений, они уйдут следующей попыткой"""
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("queue flush failed, %d changes kept for retry", len(self._journal))
+        try:
+            self.history.flush(history_batch)
+        except Exception:
+            logger.exception("history flush failed, events kept for retry")
+
+    def flush(self):
+        """Сбрасывает накопленный журнал в базу одной транзакцией.
+
+        Если запись не удалась, транзакция откатывается, а изменения
+        возвращаются в начало журнала перед новыми, и исключение уходит
+        вызывающему.
+        """
+        with self._db_lock:
+            with self._lock:
+                journal, self._journal = self._journal, []
+            if not journal:
+                return
+            try:
+                self._write_journal(journal)
+            except Exception:
+                self.conn.rollback()
+                with self._lock:
+                    self._journal[:0] = journal
+                SQLITE_FAILURES.inc("queue_flush")
+                raise
+            SQLITE_ROWS.inc("queue_flush", amount=len(journal))
+
+    def _write_journal(self, journal: List):
+        with SQLITE_SECONDS.time("queue_flush"):
+            cursor = self.conn.cursor()
+            # Подряд идущие операции одного вида - одним executemany, порядок сохраняется
+            for kind, operations in groupby(journal, key=lambda operation: operation[0]):
+                if kind == "insert":
+                    cursor.executemany(
+                        "INSERT INTO users (id, name, client_id, joined_at, queue, priority, slot_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (operation[1:] for operation in operations)
+                    )
+                elif kind == "issued":
+                    cursor.executemany(
+                        "INSERT OR REPLACE INTO client_keys"
+                        " (queue, client_id, user_id, name, joined_at, left_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (operation[1:] for operation in operations)
+                    )
+                    cursor.execute("DELETE FROM client_keys WHERE left_at < ?",
+                                   (self._iso(self.clock() - self.client_id_ttl),))
+                else:
+                    cursor.executemany("DELETE FROM users WHERE id = ?",
+                                       (operation[1:] for operation in operations))
             self.conn.commit()
-            return user
-        return None
 
-    def get_all_users(self):
+    def close(self):
+        """Останавливает фоновый сброс и записывает остаток журнала"""
+        self._stop.set()
+        if self._flusher and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        self.flush()
+        self.history.close()
+
+    def _commit(self):
+        """Будит ждущих wait_changes. В синхронном режиме сразу сбрасывает журнал в базу;
+        архив пишется полными пачками. Изменение в памяти уже сделано, поэтому
+        ошибка записи не возвращается вызывающему: журнал запишется со следующим"""
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+        if not self.flush_interval:
+            self._try_flush(HISTORY_BATCH)
+
+    def _lengths(self) -> Dict:
+        """{(qid,): длина живой очереди} для метрики queue_length"""
+        with self._lock:
+            return {(qid,): len(state) for qid, state in self._queues.items()}
+
+    def _booked(self) -> Dict:
+        with self._lock:
+            return {(qid,): len(state.calendar) for qid, state in self._queues.items()}
+
+    def get_queues(self) -> List[Dict]:
+        """Возвращает список очередей и их длину"""
+        with self._lock:
+            return [{"queue": qid, "length": len(state.users)}
+                    for qid, state in self._queues.items()]
+
+    def add_user(self, name: str, client_id: Optional[str] = None,
+                 qid: str = DEFAULT_QUEUE, priority: int = 0,
+                 slot_at: Optional[datetime] = None) -> User:
+        """Добавляет пользователя в очередь и возвращает его данные.
+
+        priority - полоса (см. PRIORITY_LEVELS), slot_at - время записи:
+        до него пользователь ждет в календаре, а не в очереди.
+        Повторный запрос с тем же client_id возвращает уже выданный номер,
+        пока человек в очереди и еще CLIENT_ID_TTL секунд после его ухода.
+        """
+        return self.add_users([(name, client_id, priority, slot_at)], qid)[0]
+
+    def add_users(self, entries: Iterable, qid: str = DEFAULT_QUEUE) -> List[User]:
+        """Добавляет пачку (name, client_id, priority, slot_at) в заданном порядке одной записью в базу"""
+        entries = list(entries)
+        if any(not 0 <= entry[2] < PRIORITY_LEVELS for entry in entries):
+            raise ValueError(f"priority must be in 0..{PRIORITY_LEVELS - 1}")
+        users = []
+        with self._lock:
+            state = self._queue(qid)
+            now = self.clock()
+            state.expire(now - self.client_id_ttl)
+            for name, client_id, priority, slot_at in entries:
+                user = state.ticket(client_id) if client_id else None
+                if user is None:
+                    user = User(self._next_id, name, client_id, now, qid, priority, slot_at)
+                    self._next_id += 1
+                    state.add(user, now)
+                    self._owners[user.id] = state
+                    self._write("insert", user.id, name, client_id,
+                                user.joined_at.isoformat(" ", "seconds"), qid, priority,
+                                slot_at.isoformat(" ", "seconds") if slot_at else None)
+                    state.record("join" if user.lane is not None else "book", user, now)
+                    self.history.add(qid, user.id, JOINED, now)
+                users.append(user)
+        self._commit()
+        return users
+
+    def _drop(self, state: QueueState, user: User, change: str):
+        """Убирает вышедшего из очереди из индексов (вызывается под self._lock)"""
+        now = self.clock()
+        state.remove(user, now)
+        del self._owners[user.id]
+        self._write("delete", user.id)
+        if user.client_id:
+            self._write("issued", state.qid, user.client_id, user.id, user.name,
+                        self._iso(user.joined_at), self._iso(now))
+            state.expire(now - self.client_id_ttl)
+        state.record(change, user, now)
+        if change == "serve":
+            self.history.add(state.qid, user.id, CALLED, now, (now - user.ready_at).total_seconds())
+        else:
+            self.history.add(state.qid, user.id, LEFT, now)
+
+    def get_changes(self, since: int, qid: str = DEFAULT_QUEUE) -> Dict:
+        """Возвращает изменения очереди после версии since.
+
+        Если такие изменения уже вытеснены из ленты (или курсор из прошлого
+        запуска), вместо них возвращается полный снимок очереди с reset=True.
+        """
+        with self._lock:
+            state = self._readable(qid)
+            result = {"version": state.version, "stats": state.stats()}
+            oldest = state.changes[0]["version"] if state.changes else state.version + 1
+            if since == state.version:
+                result["changes"] = []
+            elif oldest - 1 <= since < state.version:
+                changes = []
+                for change in reversed(state.changes):
+                    if change["version"] <= since:
+                        break
+                    changes.append(change)
+                result["changes"] = changes[::-1]
+            else:
+                result["reset"] = True
+                result["queue"] = [{"user_id": user.id, "name": user.name}
+                                   for user in state.ordered()]
+            return result
+
+    def get_version(self, qid: Optional[str] = None) -> int:
+        """Версия очереди qid или, без qid, всех очередей: растет при каждом изменении.
+
+        Читается без блокировки, поэтому годится для проверки кэша ответов
+        на каждый запрос. Наступившие записи меняют версию при первом же
+        обращении к очереди.
+        """
+        state = self._queues.get(qid) if qid is not None else None
+        return state.version if state is not None else self._version
+
+    def wait_changes(self, versions: Dict, timeout: float) -> Dict:
+        """Ждет до timeout секунд, пока версии очередей отличаются от versions, и возвращает текущие.
+
+        Ответ - {qid: версия очереди, None: общая версия}. Так процессы API,
+        обращающиеся к очереди через queue_service.py, узнают об изменениях,
+        сделанных через соседние процессы.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                current = {qid: state.version for qid, state in self._queues.items()}
+                current[None] = self._version
+                remaining = deadline - time.monotonic()
+                if current != versions or remaining <= 0:
+                    return current
+                self._changed.wait(remaining)
+
+    def get_position(self, user_id: int, qid: Optional[str] = None) -> Optional[int]:
+        """Возвращает позицию пользователя или None, если его нет в очереди qid (в любой, если не задана)"""
+        with self._lock:
+            state = self._owner(user_id, qid)
+            if state is None:
+                return None
+            return state.rank(state.users[user_id])
+
+    def get_ticket(self, client_id: str, qid: str = DEFAULT_QUEUE) -> Optional[User]:
+        """Номер, уже выданный по client_id в очереди qid: стоящему или ушедшему за CLIENT_ID_TTL"""
+        with self._lock:
+            state = self._queues.get(qid)
+            if state is None:
+                return None
+            state.expire(self.clock() - self.client_id_ttl)
+            return state.ticket(client_id)
+
+    def get_status(self, user_id: int, qid: Optional[str] = None) -> Optional[Dict]:
+        """Позиция и ожидаемое время до вызова или None, если пользователя нет в очереди"""
+        with self._lock:
+            state = self._owner(user_id, qid)
+            if state is None:
+                return None
+            return state.estimate(state.users[user_id], self.clock())
+
+    def finish_user(self, user_id: int, qid: str = DEFAULT_QUEUE) -> bool:
+        """Отмечает, что обслуживание вызванного пользователя закончилось"""
+        with self._lock:
+            now = self.clock()
+            state = self._queues.get(qid)
+            duration = state.finish(user_id, now) if state is not None else None
+            if duration is None:
+                return False
+            self.history.add(qid, user_id, FINISHED, now, duration)
+        self._commit()
+        return True
+
+    def get_stats(self, qid: Optional[str] = None, since: Optional[float] = None,
+                  until: Optional[float] = None, bucket: int = 3600) -> Dict:
+        """Сводка архива визитов по очереди qid (по всем, если не задана), см. VisitHistory.stats"""
+        return self.history.stats(qid, since, until, bucket)
+
+    def get_next(self, qid: str = DEFAULT_QUEUE) -> Optional[User]:
+        """Возвращает следующего пользователя и удаляет его из очереди"""
+        users = self.get_next_batch(1, qid)
+        return users[0] if users else None
+
+    def get_next_batch(self, count: int, qid: str = DEFAULT_QUEUE) -> List[User]:
+        """Атомарно вызывает до count первых пользователей одной записью в базу.
+
+        Выборка и удаление выполняются под одной блокировкой, поэтому два
+        оператора, нажавших /next одновременно, получат разных людей.
+        """
+        users = []
+        with self._lock:
+            state = self._existing(qid)
+            while state is not None and len(users) < count:
+                user = state.head()
+                if user is None:
+                    break
+                self._drop(state, user, "serve")
+                users.append(user)
+        if users:
+            self._commit()
+        return users
+
+    def get_positions(self, user_ids: Iterable[int]) -> Dict[int, int]:
+        """Возвращает позиции сразу для многих пользователей (отсутствующие пропускаются)"""
+        with self._lock:
+            positions = {}
+            for user_id in user_ids:
+                state = self._owner(user_id)
+                if state is not None:
+                    positions[user_id] = state.rank(state.users[user_id])
+            return positions
+
+    def get_head(self, count: int, qid: str = DEFAULT_QUEUE) -> List[int]:
+        """Возвращает номера первых count пользователей за O(count)"""
+        with self._lock:
+            return [user.id for user in islice(self._readable(qid).ordered(), count)]
+
+    def get_page(self, after: Optional[int] = None, before: Optional[int] = None,
+                 limit: int = 100, qid: str = DEFAULT_QUEUE) -> Dict:
+        """Страница очереди по курсору за O(limit * log n), без обхода всей очереди.
+
+        after - вернуть limit человек, стоящих после номера after;
+        before - вернуть limit человек, стоящих перед номером before.
+        Курсор может указывать на уже ушедшего, если с его ухода прошло не
+        больше CHANGES_LIMIT уходов; иначе страница начинается с края очереди.
+        Ждущие записи в страницы не входят, пока запись не наступит.
+        """
+        with self._lock:
+            state = self._readable(qid)
+            length = len(state)
+            if before is not None:
+                place = state.place(before)
+                # Перед стоящим - все до его seq, перед ушедшим - все до его места включительно
+                end = state.rank_at(*place) - (before in state.users) if place else length
+                start = max(0, end - limit)
+            else:
+                place = state.place(after) if after else None
+                start = state.rank_at(*place) if place else 0
+                end = min(length, start + limit)
+            rows = []
+            for position in range(start + 1, end + 1):
+                user = state.at(position)
+                rows.append({"user_id": user.id, "name": user.name, "position": position})
+            return {
+                "queue": rows,
+                "next_after": rows[-1]["user_id"] if rows and end < length else None,
+                "prev_before": rows[0]["user_id"] if rows and start > 0 else None,
+            }
+
+    def get_all_users(self, qid: str = DEFAULT_QUEUE):
         """Возвращает список всех пользователей в очереди"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id, name FROM users ORDER BY joined_at")
-        return [{"user_id": row[0], "name": row[1]} for row in cursor.fetchall()]
+        with self._lock:
+            return [{"user_id": user.id, "name": user.name}
+                    for user in self._readable(qid).ordered()]
 
-    def remove_user(self, user_id: int) -> bool:
+    def remove_user(self, user_id: int, qid: Optional[str] = None) -> bool:
         """Удаляет пользователя из очереди по ID"""
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
+        with self._lock:
+            state = self._owner(user_id, qid)
+            if state is None:
+                return False
+            self._drop(state, state.users[user_id], "leave")
+        self._commit()
+        return True
+
+
+class AsyncQueueManager:
+    """Асинхронная обертка над QueueManager для обработчиков FastAPI.
+
+    Записи выполняются в отдельном потоке базы данных, поэтому commit не
+    блокирует цикл событий. Чтения берутся из памяти и отвечают сразу.
+
+    manager - уже созданный менеджер вместо своего QueueManager, например
+    RemoteQueue (queue_service.py), когда очереди держит другой процесс.
+    Тогда и чтения идут через пул потоков, потому что каждое - запрос по сокету.
+    Запросы к архиву визитов (/stats) читают SQLite через ReaderPool в своем
+    пуле потоков: они не ждут записей и не попадают в оценку write_delay.
+
+    write_delay() оценивает, сколько новая запись прождет в потоке базы,
+    по числу начатых записей и сглаженному времени одной (EWMA_ALPHA) -
+    по ней /join отказывает, пока записи не разойдутся.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, flush_interval: Optional[float] = None,
+                 manager=None):
+        self.remote = manager is not None
+        self.manager = manager or QueueManager(db_path, flush_interval)
+        self._versions = {}  # Версии очередей у владельца, их присылает поток watch
+        self._writes = 0     # Записи через этот процесс, пока watch их еще не прислал
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="queue-db")
+        self._pending = 0          # Записей в потоке базы: выполняется и ждут
+        self._write_seconds = 0.0  # Сглаженное время одной записи
+        self._seconds = CALL_SECONDS if self.remote else METHOD_SECONDS
+        self.limiter = None if self.remote else JoinLimiter.from_env()
+        self._readers = None
+        if self.remote:
+            self._readers = ThreadPoolExecutor(max_workers=REMOTE_READERS,
+                                               thread_name_prefix="queue-read")
+        self._queries = self._readers or ThreadPoolExecutor(max_workers=max(1, self.manager.profile.readers),
+                                                            thread_name_prefix="queue-query")
+
+    def _timed(self, trace, func, *args):
+        """Выполняет func с замером времени; при трассировке запроса записывает вызов с его SQL"""
+        started = time.perf_counter()
+        try:
+            if trace is None:
+                return func(*args)
+            if self.remote:
+                return func(*args, trace=trace.calls)  # Запись с SQL присылает владелец очередей
+            with profiler.record(trace.calls, func.__name__):
+                return func(*args)
+        finally:
+            self._seconds.observe(time.perf_counter() - started, func.__name__)
+
+    def _write(self, trace, func, *args):
+        """Запись в потоке базы; время выполнения без ожидания в очереди идет в оценку write_delay"""
+        started = time.perf_counter()
+        try:
+            return self._timed(trace, func, *args)
+        finally:
+            seconds = time.perf_counter() - started
+            self._write_seconds += EWMA_ALPHA * (seconds - self._write_seconds)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        trace = profiler.current_trace()
+        self._pending += 1
+        try:
+            return await loop.run_in_executor(self._executor, self._write, trace, func, *args)
+        finally:
+            self._pending -= 1
+            self._writes += 1
+
+    def write_delay(self) -> float:
+        """Секунд, которые новая запись прождет, пока выполнятся уже начатые"""
+        return self._pending * self._write_seconds
+
+    def version(self, qid: Optional[str] = None):
+        """Метка состояния очереди qid (без qid - всех) для кэша ответов; None - не кэшировать.
+
+        Если очереди держит другой процесс, метка складывается из версии,
+        присланной watch, и числа своих записей: свой ответ после своей
+        записи не устареет, а чужие изменения приходят через watch.
+        """
+        if not self.remote:
+            return self.manager.get_version(qid)
+        version = self._versions.get(qid, self._versions.get(None))
+        return None if version is None else (version, self._writes)
+
+    async def _query(self, func, *args):
+        """Запрос к SQLite вне цикла событий и вне потока записей"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._queries, self._timed, profiler.current_trace(), func, *args)
+
+    async def _read(self, func, *args):
+        trace = profiler.current_trace()
+        if self._readers is None:
+            return self._timed(trace, func, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._timed, trace, func, *args)
+
+    async def collect_metrics(self, snapshot: Dict) -> Dict:
+        """Снимок метрик для /metrics по снимку snapshot этого процесса.
+
+        Если очереди держит другой процесс, он добавляет к snapshot свои
+        метрики (SQLite, длины очередей) и снимки соседних процессов API.
+        """
+        if not self.remote:
+            return snapshot
+        return await self._read(self.manager.collect_metrics, os.getpid(), snapshot)
+
+    async def sample_stacks(self, seconds: float):
+        """Стеки владельца очередей за seconds секунд (profiler.sample); пусто, если очереди свои"""
+        if not self.remote:
+            return Counter()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self.manager.sample_stacks, seconds)
+
+    async def admit_join(self, client: str, qid: str) -> Optional[Tuple[str, float]]:
+        """JoinLimiter.admit; если очереди держит другой процесс, лимиты считает он"""
+        if not self.remote:
+            return self.limiter.admit(client, qid)
+        return await self._read(self.manager.admit_join, client, qid)
+
+    async def get_queues(self) -> List[Dict]:
+        return await self._read(self.manager.get_queues)
+
+    async def add_user(self, name: str, client_id: Optional[str] = None,
+                       qid: str = DEFAULT_QUEUE, priority: int = 0,
+                       slot_at: Optional[datetime] = None) -> User:
+        return await self._run(self.manager.add_user, name, client_id, qid, priority, slot_at)
+
+    async def add_users(self, entries: List, qid: str = DEFAULT_QUEUE) -> List[User]:
+        return await self._run(self.manager.add_users, entries, qid)
+
+    async def get_position(self, user_id: int, qid: Optional[str] = None) -> Optional[int]:
+        return await self._read(self.manager.get_position, user_id, qid)
+
+    async def get_ticket(self, client_id: str, qid: str = DEFAULT_QUEUE) -> Optional[User]:
+        return await self._read(self.manager.get_ticket, client_id, qid)
+
+    async def get_status(self, user_id: int, qid: Optional[str] = None) -> Optional[Dict]:
+        return await self._read(self.manager.get_status, user_id, qid)
+
+    async def finish_user(self, user_id: int, qid: str = DEFAULT_QUEUE) -> bool:
+        return await self._run(self.manager.finish_user, user_id, qid)
+
+    async def get_stats(self, qid: Optional[str] = None, since: Optional[float] = None,
+                        until: Optional[float] = None, bucket: int = 3600) -> Dict:
+        return await self._query(self.manager.get_stats, qid, since, until, bucket)
+
+    async def get_next(self, qid: str = DEFAULT_QUEUE) -> Optional[User]:
+        return await self._run(self.manager.get_next, qid)
+
+    async def get_next_batch(self, count: int, qid: str = DEFAULT_QUEUE) -> List[User]:
+        return await self._run(self.manager.get_next_batch, count, qid)
+
+    async def get_positions(self, user_ids: Iterable[int]) -> Dict[int, int]:
+        return await self._read(self.manager.get_positions, list(user_ids))
+
+    async def get_changes(self, since: int, qid: str = DEFAULT_QUEUE) -> Dict:
+        return await self._read(self.manager.get_changes, since, qid)
+
+    async def get_head(self, count: int, qid: str = DEFAULT_QUEUE) -> List[int]:
+        return await self._read(self.manager.get_head, count, qid)
+
+    async def get_page(self, after: Optional[int] = None, before: Optional[int] = None,
+                       limit: int = 100, qid: str = DEFAULT_QUEUE) -> Dict:
+        return await self._read(self.manager.get_page, after, before, limit, qid)
+
+    async def get_all_users(self, qid: str = DEFAULT_QUEUE):
+        return await self._read(self.manager.get_all_users, qid)
+
+    async def remove_user(self, user_id: int, qid: Optional[str] = None) -> bool:
+        return await self._run(self.manager.remove_user, user_id, qid)
+
+    def watch(self, publish):
+        """Вызывает publish(qid) в текущем цикле событий после каждого изменения очереди qid.
+
+        Нужен, когда очереди держит другой процесс: изменения, сделанные
+        через соседние процессы API, иначе не разбудят поток /events.
+        Поток-наблюдатель фоновый и не задерживает завершение процесса.
+        """
+        loop = asyncio.get_running_loop()
+
+        def run():
+            versions = {}
+            while True:
+                try:
+                    current = self.manager.wait_changes(versions, WATCH_TIMEOUT)
+                except ConnectionError:
+                    self._versions = versions = {}  # Без версий ответы не кэшируются
+                    time.sleep(1)  # Владелец очередей перезапускается
+                    continue
+                self._versions = current
+                try:
+                    for qid, version in current.items():
+                        if qid is not None and versions.get(qid) != version:
+                            loop.call_soon_threadsafe(publish, qid)
+                except RuntimeError:
+                    return  # Цикл событий закрыт - процесс завершается
+                versions = current
+
+        threading.Thread(target=run, name="queue-watch", daemon=True).start()
+
+    def close(self):
+        """Дожидается незавершенных записей и закрывает менеджер"""
+        self._executor.shutdown(wait=True)
+        self._queries.shutdown(wait=True)  # Под supervisor.py это и пул чтений
+        self.manager.close()
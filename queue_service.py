@@ -0,0 +1,236 @@
+"""Единственный владелец очередей, когда API работает в нескольких процессах.
+
+QueueManager держит очереди в памяти и один пишет в SQLite, поэтому
+процессы API, запущенные supervisor.py, не создают его у себя. Они
+вызывают методы единственного экземпляра в этом процессе через
+Unix-сокет (multiprocessing.connection): запрос - (метод, аргументы,
+трассировать ли), ответ - (успех, результат или исключение, запись
+вызова с SQL для трассы profiler или None). Адрес сокета - QUEUE_SOCKET,
+ключ авторизации - QUEUE_SOCKET_KEY (hex). Без QUEUE_SOCKET main1.py,
+как и раньше, держит очередь у себя.
+
+    QUEUE_SOCKET=/tmp/queue.sock QUEUE_SOCKET_KEY=00ff python queue_service.py
+"""
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from typing import Dict, Optional
+import os
+import signal
+import sys
+import threading
+import time
+from metrics import REGISTRY, merge
+from queue_manager import METHOD_SECONDS, QueueManager
+from ratelimit import JoinLimiter
+import profiler
+
+# Методы QueueManager, доступные через сокет. Чтения можно безопасно повторить
+READS = frozenset({"get_queues", "get_position", "get_status", "get_positions", "get_changes",
+                   "get_head", "get_page", "get_all_users", "get_stats", "get_ticket"})
+WRITES = frozenset({"add_user", "add_users", "finish_user", "get_next", "get_next_batch",
+                    "remove_user"})
+# Их выполняет сам сервис, а не QueueManager
+SERVICES = frozenset({"collect_metrics", "sample_stacks", "admit_join"})
+EXPOSED = READS | WRITES | SERVICES | {"wait_changes"}
+METRICS_STALE = 60  # Процесс API, не присылавший метрики столько секунд, считается завершенным
+
+
+class QueueUnavailable(ConnectionError):
+    """Процесс-владелец очередей недоступен: перезапускается или остановлен"""
+
+
+def service_address() -> Optional[tuple]:
+    """(путь к сокету, ключ) из окружения или None, если очередь держит сам процесс API"""
+    address = os.getenv("QUEUE_SOCKET")
+    if not address:
+        return None
+    return address, bytes.fromhex(os.getenv("QUEUE_SOCKET_KEY", ""))
+
+
+class RemoteQueue:
+    """Заместитель QueueManager в процессе API: методы выполняются у владельца очередей.
+
+    Соединение у каждого потока свое, поэтому параллельные запросы не
+    ждут друг друга. Если владелец перезапустился, вызов повторяется
+    через новое соединение, когда это безопасно: запрос не ушел по
+    старому соединению или это чтение. Иначе - QueueUnavailable, потому
+    что запись могла успеть выполниться до обрыва.
+    """
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = set()
+
+    @classmethod
+    def from_env(cls) -> Optional["RemoteQueue"]:
+        address = service_address()
+        return cls(*address) if address else None
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, authkey=self.authkey)
+            with self._lock:
+                self._connections.add(conn)
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            with self._lock:
+                self._connections.discard(conn)
+            conn.close()
+
+    def _call(self, method: str, *args, retry: bool = True, trace: Optional[list] = None):
+        """trace - список вызовов трассы запроса: владелец добавит в него запись с SQL"""
+        reused = getattr(self._local, "conn", None) is not None
+        sent = False
+        started = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.send((method, args, trace is not None))
+            sent = True
+            ok, result, call = conn.recv()
+        except (OSError, EOFError) as e:
+            self._drop()
+            if retry and reused and (not sent or method in READS):
+                return self._call(method, *args, retry=False, trace=trace)
+            raise QueueUnavailable(f"queue service {self.address}: {e}") from e
+        if call is not None:
+            call["call_ms"] = round((time.perf_counter() - started) * 1000, 3)  # Вместе с сокетом
+            trace.append(call)
+        if not ok:
+            raise result
+        return result
+
+    def __getattr__(self, name: str):
+        if name not in EXPOSED:
+            raise AttributeError(name)
+
+        def call(*args, trace: Optional[list] = None):
+            return self._call(name, *args, trace=trace)
+
+        call.__name__ = name  # Метка method в метрике queue_call_seconds
+        return call
+
+    def close(self):
+        """Закрывает соединения; очереди закрывает их владелец"""
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for conn in connections:
+            conn.close()
+
+
+def wait_ready(address: str, authkey: bytes, timeout: float = 30) -> bool:
+    """Ждет, пока владелец очередей начнет принимать соединения"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            Client(address, authkey=authkey).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+class MetricsCollector:
+    """Сумма метрик владельца очередей и снимков, присланных процессами API.
+
+    Процесс API присылает снимок всех своих метрик с момента запуска, и
+    /metrics любого процесса отдает сумму по всем. Снимок процесса,
+    который давно ничего не присылал, переносится в итог завершенных:
+    его счетчики остаются в сумме, чтобы она не уменьшилась после
+    перезапуска процесса, а датчики - нет.
+    """
+
+    def __init__(self):
+        self._reports = {}  # {pid: (time.monotonic() получения, снимок)}
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def collect(self, source: int, snapshot: Dict) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            self._reports[source] = (now, snapshot)
+            for pid, (received, report) in list(self._reports.items()):
+                if now - received > METRICS_STALE:
+                    del self._reports[pid]
+                    self._retired = merge([self._retired, {
+                        name: metric for name, metric in report.items() if metric[0] != "gauge"}])
+            snapshots = [self._retired] + [report for _, report in self._reports.values()]
+        return merge([REGISTRY.snapshot()] + snapshots)
+
+
+def handle(queue: QueueManager, services: Dict, conn):
+    """Выполняет запросы одного соединения по порядку, пока клиент его не закроет.
+
+    services - {метод из SERVICES: функция}, общие для всех соединений.
+    """
+    with conn:
+        while True:
+            try:
+                method, args, traced = conn.recv()
+            except (EOFError, OSError):
+                return
+            started = time.perf_counter()
+            calls = [] if traced else None
+            try:
+                if method not in EXPOSED:
+                    raise AttributeError(method)
+                if method in SERVICES:
+                    result = services[method](*args)
+                elif traced:
+                    with profiler.record(calls, method):
+                        result = getattr(queue, method)(*args)
+                else:
+                    result = getattr(queue, method)(*args)
+                response = (True, result, calls[0] if calls else None)
+            except Exception as e:
+                response = (False, e, calls[0] if calls else None)
+            if method in READS or method in WRITES:
+                METHOD_SECONDS.observe(time.perf_counter() - started, method)
+            try:
+                conn.send(response)
+            except (EOFError, OSError):
+                return
+
+
+def serve(queue: QueueManager, address: str, authkey: bytes):
+    """Отдает queue через сокет address до SIGTERM/SIGINT, затем закрывает ее"""
+    if os.path.exists(address):
+        os.unlink(address)  # Сокет, оставшийся от упавшего процесса
+    listener = Listener(address, authkey=authkey)
+    label = f"queue_service-{os.getpid()}"
+    services = {
+        "collect_metrics": MetricsCollector().collect,
+        "sample_stacks": lambda seconds: profiler.sample(seconds, label=label),
+        "admit_join": JoinLimiter.from_env().admit,  # Лимиты общие для всех процессов API
+    }
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                continue  # Клиент отключился или не прошел авторизацию
+            threading.Thread(target=handle, args=(queue, services, conn), daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()  # Заодно удаляет файл сокета
+        queue.close()
+
+
+def main():
+    address = service_address()
+    if address is None:
+        sys.exit("QUEUE_SOCKET не задан")
+    serve(QueueManager(), *address)
+
+
+if __name__ == "__main__":
+    main()
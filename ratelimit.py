@@ -0,0 +1,97 @@
+"""Ограничение частоты /join: ведра токенов по клиенту и по очереди.
+
+У каждого ключа ведро на burst токенов, которое наполняется со
+скоростью rate токенов в секунду; /join забирает по токену из ведра
+клиента (адрес, с которого пришел запрос) и из ведра очереди. Так
+случайные повторные нажатия и скрипты одного клиента упираются в свой
+лимит, а общий поток записей в одну очередь - в лимит очереди, и
+commit в SQLite не копятся за счет чтений остальных.
+
+Под supervisor.py лимиты считает владелец очередей (queue_service.py),
+поэтому они общие для всех процессов API.
+"""
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+import os
+import threading
+import time
+
+LIMIT_KEYS = 10000  # Сколько ведер клиентов помнить; давно не приходившие забываются первыми
+
+
+class TokenBuckets:
+    """Ведра токенов по ключам; rate 0 - без ограничения.
+
+    Ведро хранится как (токенов, когда посчитано) и пополняется при
+    обращении, поэтому таймеров нет. Забытый ключ снова получает полное
+    ведро - то же, что он накопил бы за время простоя.
+    """
+
+    def __init__(self, rate: float, burst: float, size: int = LIMIT_KEYS):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.size = size
+        self._buckets = OrderedDict()  # {ключ: (токенов, time.monotonic())}
+
+    def _tokens(self, key, now: float) -> float:
+        entry = self._buckets.get(key)
+        if entry is None:
+            return self.burst
+        tokens, updated = entry
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def wait(self, key, now: float) -> float:
+        """Секунд до появления токена у key; 0 - токен есть"""
+        if self.rate <= 0:
+            return 0.0
+        return max(0.0, (1 - self._tokens(key, now)) / self.rate)
+
+    def take(self, key, now: float):
+        if self.rate <= 0:
+            return
+        self._buckets[key] = (self._tokens(key, now) - 1, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.size:
+            self._buckets.popitem(last=False)
+
+
+class JoinLimiter:
+    """Лимиты /join: rate запросов в секунду и burst подряд для клиента и для очереди.
+
+    clock возвращает секунды, как time.monotonic; подменяется в тестах.
+    """
+
+    def __init__(self, client_rate: float = 1, client_burst: float = 5,
+                 queue_rate: float = 20, queue_burst: float = 100,
+                 clock: Callable[[], float] = time.monotonic):
+        self.clients = TokenBuckets(client_rate, client_burst)
+        self.queues = TokenBuckets(queue_rate, queue_burst)
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "JoinLimiter":
+        return cls(
+            client_rate=float(os.getenv("JOIN_RATE_CLIENT", "1")),
+            client_burst=float(os.getenv("JOIN_BURST_CLIENT", "5")),
+            queue_rate=float(os.getenv("JOIN_RATE_QUEUE", "20")),
+            queue_burst=float(os.getenv("JOIN_BURST_QUEUE", "100")),
+        )
+
+    def admit(self, client: str, qid: str) -> Optional[Tuple[str, float]]:
+        """Пропускает /join клиента client в очередь qid или возвращает (какой лимит, секунд до повтора).
+
+        Токен забирается из обоих ведер, только если есть в обоих: отказ
+        по лимиту очереди не тратит лимит клиента, и наоборот.
+        """
+        now = self.clock()
+        with self._lock:
+            wait = self.clients.wait(client, now)
+            if wait > 0:
+                return "client", wait
+            wait = self.queues.wait(qid, now)
+            if wait > 0:
+                return "queue", wait
+            self.clients.take(client, now)
+            self.queues.take(qid, now)
+        return None
@@ -2,27 +2,159 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from PIL import Image, ImageTk
 import os
+import queue
+import threading
+import uuid
+from collections import OrderedDict, deque
 import requests
 import json
+import time
+from metrics import REGISTRY, serve as serve_metrics
 
 API_URL = "http://192.168.0.104:8000"  # Адрес FastAPI-сервера
+API_TIMEOUT = 5  # Секунд ожидания ответа сервера
+POLL_MS = 16  # Проверка ответа сервера ~60 раз в секунду, не блокируя экран
+JOURNAL_PATH = "tickets_journal.jsonl"  # Билеты, выданные без связи с сервером
+SYNC_INTERVAL = 10  # Секунд между попытками отправить журнал на сервер
+SYNC_BATCH = 1000  # Билетов в одном /join/batch: больше сервер не принимает (max_items)
+RETRY_STATUSES = (408, 429)  # Ответы 4xx, после которых та же пачка пройдет позже
+SETTINGS_PATH = 'settings.json'  # Файл темы, который сохраняет organizator.py
+SETTINGS_CHECK_MS = 1000  # Как часто проверять, не изменилась ли тема
+METRICS_PORT = int(os.getenv("KIOSK_METRICS_PORT", "0"))  # Порт /metrics киоска; 0 - не публиковать
+DEFAULT_SETTINGS = {  # Значения по умолчанию
+    'bg_color': '#FFE4E1',
+    'text_color': '#8B4513',
+    'btn_color': '#FF69B4',
+    'num_color': '#FF1493'
+}
+
+session = requests.Session()  # Keep-alive соединение с сервером
+sync_session = requests.Session()  # Отдельное соединение для фоновой синхронизации
+
+# result: ok, offline (нет связи - выдан временный билет) или error
+JOIN_SECONDS = REGISTRY.histogram("kiosk_join_seconds", "Запрос /join с киоска, секунд", ("result",))
+# result: ok, error (нет связи или ошибка сервера - повтор позже) или rejected (пачка отклонена)
+SYNC_SECONDS = REGISTRY.histogram("kiosk_sync_seconds", "Отправка журнала временных билетов, секунд",
+                                  ("result",))
+
+
+def load_settings(fallback=None):
+    """Читает тему; если файла нет или он поврежден, возвращает fallback"""
+    try:
+        with open(SETTINGS_PATH, 'r') as f:
+            return {**DEFAULT_SETTINGS, **json.load(f)}
+    except (OSError, ValueError):
+        return fallback
 
 
-def load_settings():
+def settings_mtime():
     try:
-        with open('settings.json', 'r') as f:
-            return json.load(f)
-    except:
-        return {  # Значения по умолчанию
-            'bg_color': '#FFE4E1',
-            'text_color': '#8B4513',
-            'btn_color': '#FF69B4',
-            'num_color': '#FF1493'
-        }
+        return os.stat(SETTINGS_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def format_ticket_info(data):
+    """Сколько человек впереди и сколько примерно ждать"""
+    if data['position'] is None:
+        return "Этот номер уже вызван"  # Повтор запроса, ответ на который потерялся
+    info = f"Перед вами: {data['position'] - 1} человек"
+    wait = data.get("estimated_wait")
+    if wait is not None:
+        info += f"\nПримерное ожидание: {max(1, round(wait / 60))} мин"
+    return info
+
+
+class TicketJournal:
+    """Журнал временных билетов: записи только дописываются в конец файла.
+
+    Строка {"client_id", "local_number", "name"} - билет выдан без связи,
+    строка {"client_id", "user_id"} - сервер присвоил ему постоянный номер,
+    строка {"client_id", "rejected"} - сервер отказался его принять.
+    Недописанная последняя строка (питание пропало во время записи)
+    отбрасывается при открытии.
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()  # {client_id: запись} еще не отправленные
+        self.last_number = 0
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            lines = f.readlines()
+        good_end = 0  # Конец последней целой строки
+        for number, line in enumerate(lines, 1):
+            try:
+                entry = json.loads(line)
+                client_id = entry["client_id"]
+                if "user_id" in entry or "rejected" in entry:
+                    self.pending.pop(client_id, None)
+                else:
+                    self.last_number = max(self.last_number, entry["local_number"])
+                    self.pending[client_id] = entry
+            except (ValueError, KeyError, TypeError):
+                if number == len(lines):
+                    # Оборванная запись в конце: обрезаем, чтобы следующая строка начиналась с новой
+                    with open(self.path, 'r+b') as f:
+                        f.truncate(good_end)
+                    return
+                # Испорченная строка в середине пропускается: остальные билеты важнее
+            good_end += len(line)
+        if lines and not lines[-1].endswith(b"\n"):
+            with open(self.path, 'ab') as f:  # Запись целая, но перевод строки не успел записаться
+                f.write(b"\n")
+
+    def _append(self, entries):
+        with open(self.path, 'a') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def issue(self, name, client_id=None):
+        """Выдает временный билет и сразу записывает его на диск.
+
+        client_id - ключ уже отправленного /join: если сервер успел его
+        принять, при синхронизации вернется тот же номер, а не второй.
+        """
+        with self.lock:
+            self.last_number += 1
+            entry = {"client_id": client_id or uuid.uuid4().hex, "local_number": self.last_number,
+                     "name": name}
+            self._append([entry])
+            self.pending[entry["client_id"]] = entry
+            return entry
+
+    def unsynced(self):
+        with self.lock:
+            return list(self.pending.values())
+
+    def mark_synced(self, tickets):
+        """Отмечает билеты, получившие номера от сервера; пустой журнал очищается"""
+        self._settle([{"client_id": t["client_id"], "user_id": t["user_id"]} for t in tickets])
+
+    def mark_rejected(self, ticket, reason):
+        """Убирает билет, который сервер отказался принять, чтобы он не держал остальные"""
+        self._settle([{"client_id": ticket["client_id"], "rejected": reason[:200]}])
+
+    def _settle(self, records):
+        with self.lock:
+            self._append(records)
+            for record in records:
+                self.pending.pop(record["client_id"], None)
+            if not self.pending:
+                open(self.path, 'w').close()
+                self.last_number = 0
+
 
 class CatQueueApp:
     def __init__(self, root):
-        self.settings = load_settings()
+        self.settings_mtime = settings_mtime()
+        self.settings = load_settings(DEFAULT_SETTINGS)
         self.root = root
         self.root.title("Chatty Queue")
         self.root.geometry("800x600")
@@ -30,6 +162,17 @@ class CatQueueApp:
         self.qr_image_path = "qr_bot.jpg"  # Путь к QR-коду
         self.return_timer = None  # Для хранения ID таймера возврата
 
+        # Автономный режим: билеты выдаются из локального журнала
+        self.journal = TicketJournal()
+        self.offline = bool(self.journal.pending)
+        self.ticket_client_id = None  # Временный билет, показанный на экране
+        self.join_key = None  # Idempotency-Key посетителя у экрана: повторный /join вернет тот же номер
+        self.reconciled = deque(maxlen=5)  # Последние "К-1 → 42"
+        self.sync_results = queue.Queue()
+        self.sync_wakeup = threading.Event()
+        REGISTRY.gauge("kiosk_pending_tickets", "Временных билетов, еще не отправленных на сервер", (),
+                       lambda: {(): len(self.journal.pending)})
+
         # Проверяем, существует ли файл QR-кода
         if not os.path.exists(self.qr_image_path):
             messagebox.showerror("Ошибка", f"Файл QR-кода не найден: {self.qr_image_path}")
@@ -39,10 +182,7 @@ class CatQueueApp:
         self.setup_ui()
 
     def setup_ui(self):
-        self.bg_color = self.settings['bg_color']
-        self.btn_color = self.settings['btn_color']
-        self.text_color = self.settings['text_color']
-        self.num_color = self.settings['num_color']
+        self.setup_colors()
 
         # Загружаем QR-код заранее
         try:
@@ -53,15 +193,82 @@ class CatQueueApp:
             self.root.destroy()
             return
 
+        self.setup_style()
+
+        # Все экраны строятся один раз и лежат друг на друге в одной ячейке,
+        # переключение - tkraise без пересоздания виджетов
+        self.root.grid_rowconfigure(0, weight=1)
+        self.root.grid_columnconfigure(0, weight=1)
+        self.frames = {
+            "welcome": self.build_welcome_frame(),
+            "name": self.build_name_frame(),
+            "wait": self.build_wait_frame(),
+            "ticket": self.build_ticket_frame(),
+            "qr": self.build_qr_frame(),
+        }
+        for frame in self.frames.values():
+            frame.grid(row=0, column=0, sticky="nsew")
+
+        threading.Thread(target=self.sync_worker, daemon=True).start()
+        self.root.after(500, self.poll_sync)
+        self.root.after(SETTINGS_CHECK_MS, self.watch_settings)
         self.show_welcome_frame()
 
-    def clear_frame(self):
-        if self.current_frame:
-            if self.return_timer:
-                self.root.after_cancel(self.return_timer)
-                self.return_timer = None
-            self.current_frame.pack_forget()
-            self.current_frame.destroy()
+    def setup_colors(self):
+        self.bg_color = self.settings['bg_color']
+        self.btn_color = self.settings['btn_color']
+        self.text_color = self.settings['text_color']
+        self.num_color = self.settings['num_color']
+
+    def setup_style(self):
+        """Тема ttk выбирается один раз при запуске"""
+        ttk.Style().theme_use('clam')
+        self.configure_button_style()
+
+    def configure_button_style(self):
+        style = ttk.Style()
+        style.configure("Pink.TButton", background=self.btn_color, foreground="black",
+                        font=("Arial", 12, "bold"))
+
+        style.map('Pink.TButton',
+                  background=[('active', self.btn_color),
+                              ('disabled', self.btn_color)],
+                  foreground=[('pressed', 'black'),
+                              ('active', 'black')])
+
+    def watch_settings(self):
+        """Сверяет mtime settings.json и перекрашивает экраны, если тема изменилась"""
+        mtime = settings_mtime()
+        if mtime != self.settings_mtime:
+            settings = load_settings()
+            # Файл может читаться в момент записи - тогда повторим на следующей проверке
+            if settings is not None:
+                self.settings_mtime = mtime
+                self.settings = settings
+                self.apply_theme()
+        self.root.after(SETTINGS_CHECK_MS, self.watch_settings)
+
+    def apply_theme(self):
+        """Перекрашивает уже построенные экраны, не пересоздавая их"""
+        self.setup_colors()
+        self.configure_button_style()
+        for frame in self.frames.values():
+            frame.config(bg=self.bg_color)
+            for widget in frame.winfo_children():
+                if isinstance(widget, tk.Label):
+                    widget.config(bg=self.bg_color, fg=self.text_color)
+        # Номера выделены отдельным цветом
+        self.ticket_number_label.config(fg=self.num_color)
+        self.reconciled_label.config(fg=self.num_color)
+
+    def show_frame(self, name):
+        """Поднимает готовый экран наверх"""
+        if self.return_timer:
+            self.root.after_cancel(self.return_timer)
+            self.return_timer = None
+        self.ticket_client_id = None
+        self.current_frame = self.frames[name]
+        self.current_frame.tkraise()
 
     def schedule_return(self, delay_seconds=10):
         """Запланировать автоматический возврат на главную страницу"""
@@ -69,115 +276,273 @@ class CatQueueApp:
             self.root.after_cancel(self.return_timer)
         self.return_timer = self.root.after(delay_seconds * 1000, self.show_welcome_frame)
 
-    def show_welcome_frame(self):
-        self.clear_frame()
-        self.current_frame = tk.Frame(self.root, bg=self.bg_color)
-        self.current_frame.pack(fill="both", expand=True)
+    def build_welcome_frame(self):
+        frame = tk.Frame(self.root, bg=self.bg_color)
 
         # Приветственный текст с котиком
-        tk.Label(self.current_frame, text="🐱", font=("Arial", 120), bg=self.bg_color, fg=self.text_color).pack(
+        tk.Label(frame, text="🐱", font=("Arial", 120), bg=self.bg_color, fg=self.text_color).pack(
             pady=(120, 20))
-        tk.Label(self.current_frame, text="Добро пожаловать!",
+        tk.Label(frame, text="Добро пожаловать!",
                  font=("Arial", 24, "bold"), bg=self.bg_color, fg=self.text_color).pack(pady=10)
 
-        ttk.Button(self.current_frame, text="Занять очередь", command=self.show_name_frame,
+        ttk.Button(frame, text="Занять очередь", command=self.show_name_frame,
                    style="Pink.TButton").pack(pady=30, ipadx=20, ipady=10)
 
-        # Стиль для кнопок
-        style = ttk.Style()
-        style.theme_use('clam')
-        style.configure("Pink.TButton", background=self.btn_color, foreground="black",
-                        font=("Arial", 12, "bold"))
+        # Постоянные номера для недавно выданных временных билетов
+        self.reconciled_label = tk.Label(frame, text="",
+                                         font=("Arial", 14), bg=self.bg_color, fg=self.num_color)
+        self.reconciled_label.pack(pady=10)
+        return frame
 
-        style.map('Pink.TButton',
-                  background=[('active', self.btn_color),
-                              ('disabled', self.btn_color)],
-                  foreground=[('pressed', 'black'),
-                              ('active', 'black')])
+    def show_welcome_frame(self):
+        if self.reconciled:
+            self.reconciled_label.config(text="Постоянные номера: " + ", ".join(self.reconciled))
+        self.show_frame("welcome")
 
-    def show_name_frame(self):
-        self.clear_frame()
-        self.current_frame = tk.Frame(self.root, bg=self.bg_color)
-        self.current_frame.pack(fill="both", expand=True)
+    def build_name_frame(self):
+        frame = tk.Frame(self.root, bg=self.bg_color)
 
-        tk.Label(self.current_frame, text="Как вас зовут?",
+        tk.Label(frame, text="Как вас зовут?",
                  font=("Arial", 20), bg=self.bg_color, fg=self.text_color).pack(pady=(210, 20))
 
-        self.name_entry = ttk.Entry(self.current_frame, font=("Arial", 14))
+        self.name_entry = ttk.Entry(frame, font=("Arial", 14))
         self.name_entry.pack(pady=10, ipadx=50, ipady=8)
 
-        ttk.Button(self.current_frame, text="Продолжить", command=self.show_queue_info,
+        ttk.Button(frame, text="Продолжить", command=self.show_queue_info,
                    style="Pink.TButton").pack(pady=30, ipadx=20, ipady=10)
+        return frame
+
+    def show_name_frame(self):
+        self.join_key = uuid.uuid4().hex  # Новый посетитель
+        self.name_entry.delete(0, "end")
+        self.show_frame("name")
+        self.name_entry.focus_set()
 
     def show_queue_info(self):
+        if self.current_frame is not self.frames["name"]:
+            return  # Второе нажатие "Продолжить", пока ждем ответа сервера
         name = self.name_entry.get().strip()
         if not name:
             messagebox.showwarning("Ой!", "Пожалуйста, введите ваше имя")
             return
 
+        if self.offline:
+            # Сервер недоступен - не ждем сеть, сразу выдаем временный билет
+            self.show_ticket_frame(name, self.issue_offline_ticket(name))
+            return
+
+        self.show_wait_frame()
+
+        # Запрос к серверу выполняется в фоновом потоке, экран остается отзывчивым
+        results = queue.Queue()
+        threading.Thread(target=self.join_worker, args=(name, self.join_key, results),
+                         daemon=True).start()
+        self.root.after(POLL_MS, self.poll_join, name, results)
+
+    @staticmethod
+    def join_worker(name, key, results):
+        """Выполняет /join в фоновом потоке и кладет результат в очередь.
+
+        503 (сервер перегружен или перезапускается) - как нет связи:
+        выдается временный билет с тем же ключом.
+        """
+        started = time.perf_counter()
         try:
-            response = requests.post(
-                f"{API_URL}/join",
-                json={"name": name}
-            )
+            response = session.post(f"{API_URL}/join", json={"name": name},
+                                    headers={"Idempotency-Key": key}, timeout=API_TIMEOUT)
             if response.status_code == 200:
-                data = response.json()
+                result = ("ok", response.json())
+            elif response.status_code == 503:
+                result = ("offline", None)
+            elif response.status_code == 429:
+                retry = response.headers.get("Retry-After", "1")
+                result = ("error", f"Слишком много записей подряд, попробуйте через {retry} с")
+            else:
+                result = ("error", f"Сервер вернул ошибку: {response.text}")
+        except (requests.ConnectionError, requests.Timeout):
+            result = ("offline", None)
+        except Exception as e:
+            result = ("error", f"Не удалось подключиться к серверу: {e}")
+        JOIN_SECONDS.observe(time.perf_counter() - started, result[0])
+        results.put(result)
 
-                self.clear_frame()
-                self.current_frame = tk.Frame(self.root, bg=self.bg_color)
-                self.current_frame.pack(fill="both", expand=True)
+    def poll_join(self, name, results):
+        """Проверяет ответ сервера в главном потоке Tk"""
+        try:
+            status, data = results.get_nowait()
+        except queue.Empty:
+            self.root.after(POLL_MS, self.poll_join, name, results)
+            return
 
-                tk.Label(self.current_frame, text=f"{name}, ваш номер:",
-                         font=("Arial", 20), bg=self.bg_color, fg=self.text_color).pack(pady=(120, 20))
+        if status == "ok":
+            self.show_ticket_frame(name, data)
+        elif status == "offline":
+            self.offline = True
+            self.show_ticket_frame(name, self.issue_offline_ticket(name))
+        else:
+            messagebox.showerror("Ошибка", data)
+            self.show_frame("name")  # Введенное имя сохраняется для повтора
+
+    def issue_offline_ticket(self, name):
+        entry = self.journal.issue(name, self.join_key)
+        return {"user_id": None, "position": None, **entry}
+
+    def sync_worker(self):
+        """Фоновый поток: отправляет журнал на /join/batch, когда связь вернулась"""
+        while True:
+            self.sync_wakeup.wait(SYNC_INTERVAL)
+            self.sync_wakeup.clear()
+            self.sync_journal()
+
+    def sync_journal(self):
+        """Отправляет журнал пачками по SYNC_BATCH, пока есть связь"""
+        tickets = self.journal.unsynced()
+        if not tickets:
+            return
+        for start in range(0, len(tickets), SYNC_BATCH):
+            if not self.sync_batch(tickets[start:start + SYNC_BATCH]):
+                break  # Связи нет: остаток уйдет в следующую попытку
+        self.offline = bool(self.journal.pending)
+
+    def sync_batch(self, tickets):
+        """Отправляет пачку билетов; False - нет связи или сервер просит повторить позже.
+
+        Если сервер отклонил пачку (4xx), она делится пополам, пока
+        отклоненный билет не останется один; он помечается в журнале как
+        непринятый, а остальные получают номера.
+        """
+        started = time.perf_counter()
+        try:
+            response = sync_session.post(
+                f"{API_URL}/join/batch",
+                json={"tickets": [{"client_id": t["client_id"], "name": t["name"]} for t in tickets]},
+                timeout=API_TIMEOUT
+            )
+            rejected = 400 <= response.status_code < 500 and response.status_code not in RETRY_STATUSES
+            if not rejected:
+                response.raise_for_status()
+                synced = response.json()["tickets"]
+        except (requests.RequestException, ValueError, KeyError):
+            SYNC_SECONDS.observe(time.perf_counter() - started, "error")
+            return False
+        if rejected:
+            SYNC_SECONDS.observe(time.perf_counter() - started, "rejected")
+            if len(tickets) > 1:
+                half = len(tickets) // 2
+                return self.sync_batch(tickets[:half]) and self.sync_batch(tickets[half:])
+            self.journal.mark_rejected(tickets[0], response.text)
+            self.sync_results.put([{**tickets[0], "user_id": None, "position": None}])
+            return True
+        SYNC_SECONDS.observe(time.perf_counter() - started, "ok")
+        self.journal.mark_synced(synced)
+        local_numbers = {t["client_id"]: t["local_number"] for t in tickets}
+        for ticket in synced:
+            ticket["local_number"] = local_numbers[ticket["client_id"]]
+        self.sync_results.put(synced)
+        return True
+
+    def poll_sync(self):
+        """Показывает на экране номера, присвоенные сервером временным билетам"""
+        while not self.sync_results.empty():
+            for ticket in self.sync_results.get_nowait():
+                if ticket["user_id"] is None:
+                    self.reconciled.append(f"К-{ticket['local_number']}: не принят сервером")
+                    if ticket["client_id"] == self.ticket_client_id:
+                        self.ticket_info_label.config(text="Билет не принят, обратитесь к администратору")
+                    continue
+                self.reconciled.append(f"К-{ticket['local_number']} → {ticket['user_id']}")
+                if ticket["client_id"] == self.ticket_client_id:
+                    self.ticket_number_label.config(text=str(ticket["user_id"]))
+                    if ticket["position"]:
+                        self.ticket_info_label.config(text=format_ticket_info(ticket))
+        self.root.after(500, self.poll_sync)
+
+    def build_wait_frame(self):
+        frame = tk.Frame(self.root, bg=self.bg_color)
+
+        tk.Label(frame, text="🐱", font=("Arial", 120), bg=self.bg_color, fg=self.text_color).pack(
+            pady=(120, 20))
+        tk.Label(frame, text="Пожалуйста, подождите...",
+                 font=("Arial", 20), bg=self.bg_color, fg=self.text_color).pack(pady=10)
+        return frame
 
-                tk.Label(self.current_frame, text=str(data['user_id']),
-                         font=("Arial", 48, "bold"), bg=self.bg_color, fg=self.num_color).pack(pady=10)
+    def show_wait_frame(self):
+        self.show_frame("wait")
 
-                tk.Label(self.current_frame, text=f"Перед вами: {data['position'] - 1} человек",
-                         font=("Arial", 14), bg=self.bg_color, fg=self.text_color).pack(pady=20)
+    def build_ticket_frame(self):
+        frame = tk.Frame(self.root, bg=self.bg_color)
 
-                # Кнопка для перехода к QR-коду
-                ttk.Button(self.current_frame, text="Узнать об окончании очереди в Telegram",
-                           command=self.show_qr_frame,
-                           style="Pink.TButton").pack(pady=10, ipadx=20, ipady=10)
+        self.ticket_name_label = tk.Label(frame, text="",
+                                          font=("Arial", 20), bg=self.bg_color, fg=self.text_color)
+        self.ticket_name_label.pack(pady=(120, 20))
 
-                # Кнопка для немедленного возврата
-                ttk.Button(self.current_frame, text="Вернуться на главную",
-                           command=self.show_welcome_frame,
-                           style="Pink.TButton").pack(pady=10, ipadx=20, ipady=10)
+        self.ticket_number_label = tk.Label(frame, text="",
+                                            font=("Arial", 48, "bold"), bg=self.bg_color, fg=self.num_color)
+        self.ticket_number_label.pack(pady=10)
 
-                # Автоматический возврат через 10 секунд
-                self.schedule_return(10)
+        self.ticket_info_label = tk.Label(frame, text="",
+                                          font=("Arial", 14), bg=self.bg_color, fg=self.text_color)
+        self.ticket_info_label.pack(pady=20)
 
-            else:
-                messagebox.showerror("Ошибка", f"Сервер вернул ошибку: {response.text}")
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось подключиться к серверу: {e}")
+        # Кнопка для перехода к QR-коду
+        ttk.Button(frame, text="Узнать об окончании очереди в Telegram",
+                   command=self.show_qr_frame,
+                   style="Pink.TButton").pack(pady=10, ipadx=20, ipady=10)
 
-    def show_qr_frame(self):
-        self.clear_frame()
-        self.current_frame = tk.Frame(self.root, bg=self.bg_color)
-        self.current_frame.pack(fill="both", expand=True)
+        # Кнопка для немедленного возврата
+        ttk.Button(frame, text="Вернуться на главную",
+                   command=self.show_welcome_frame,
+                   style="Pink.TButton").pack(pady=10, ipadx=20, ipady=10)
+        return frame
+
+    def show_ticket_frame(self, name, data):
+        self.show_frame("ticket")
+
+        if data['user_id'] is None:
+            # Временный билет: номер заменится, когда журнал уйдет на сервер
+            self.ticket_client_id = data['client_id']
+            number = f"К-{data['local_number']}"
+            info = "Нет связи с сервером: это временный номер,\nпостоянный появится на этом экране"
+        else:
+            number = str(data['user_id'])
+            info = format_ticket_info(data)
+
+        # Обновляем только изменяемые надписи
+        self.ticket_name_label.config(text=f"{name}, ваш номер:")
+        self.ticket_number_label.config(text=number)
+        self.ticket_info_label.config(text=info)
+
+        # Автоматический возврат через 10 секунд
+        self.schedule_return(10)
 
-        tk.Label(self.current_frame, text="Отсканируйте QR-код\nчтобы подключиться к боту",
+    def build_qr_frame(self):
+        frame = tk.Frame(self.root, bg=self.bg_color)
+
+        tk.Label(frame, text="Отсканируйте QR-код\nчтобы подключиться к боту",
                  font=("Arial", 16), bg=self.bg_color, fg=self.text_color).pack(pady=(80, 20))
 
         # Показываем заранее загруженный QR-код
-        tk.Label(self.current_frame, image=self.qr_photo, bg=self.bg_color).pack(pady=10)
+        tk.Label(frame, image=self.qr_photo, bg=self.bg_color).pack(pady=10)
 
-        tk.Label(self.current_frame, text="@chatty_queue_bot",
+        tk.Label(frame, text="@chatty_queue_bot",
                  font=("Arial", 14), bg=self.bg_color, fg=self.text_color).pack(pady=10)
 
         # Кнопка для немедленного возврата
-        ttk.Button(self.current_frame, text="Вернуться на главную",
+        ttk.Button(frame, text="Вернуться на главную",
                    command=self.show_welcome_frame,
                    style="Pink.TButton").pack(pady=20, ipadx=20, ipady=10)
+        return frame
 
-        # Автоматический возврат через 10 секунд
+    def show_qr_frame(self):
+        self.show_frame("qr")
+
+        # Автоматический возврат через 20 секунд
         self.schedule_return(20)
 
 
 if __name__ == "__main__":
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
     root = tk.Tk()
     app = CatQueueApp(root)
     root.mainloop()
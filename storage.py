@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+import os
+import queue
+import sqlite3
+import threading
+from metrics import REGISTRY
+from profiler import trace_sql
+
+# Общие для базы очереди и архива: операция - queue_load, queue_flush, history_flush, history_stats
+SQLITE_SECONDS = REGISTRY.histogram("sqlite_seconds", "Время операций с SQLite, секунд", ("operation",))
+SQLITE_ROWS = REGISTRY.counter("sqlite_rows_total", "Строк, записанных в SQLite", ("operation",))
+SQLITE_FAILURES = REGISTRY.counter("sqlite_failures_total",
+                                   "Неудачные записи в SQLite; изменения остаются для повтора", ("operation",))
+
+
+class StorageProfile:
+    """Настройки SQLite для базы очереди и архива.
+
+    По умолчанию: WAL (читатели не ждут писателя), synchronous=NORMAL
+    (fsync только при контрольной точке WAL, а не на каждый commit),
+    busy_timeout вместо мгновенной ошибки "database is locked", mmap для
+    чтения без лишнего копирования и увеличенный кэш подготовленных
+    запросов. Любой параметр можно переопределить переменной окружения.
+    """
+
+    def __init__(self, journal_mode: str = "WAL", synchronous: str = "NORMAL",
+                 busy_timeout: int = 5000, mmap_size: int = 256 * 2 ** 20,
+                 cache_size: int = -16000, cached_statements: int = 256, readers: int = 4):
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout  # мс
+        self.mmap_size = mmap_size  # байт
+        self.cache_size = cache_size  # страниц, отрицательное значение - в КиБ
+        self.cached_statements = cached_statements
+        self.readers = readers  # соединений в пуле читателей
+
+    @classmethod
+    def from_env(cls) -> "StorageProfile":
+        defaults = cls()
+        return cls(
+            journal_mode=os.getenv("SQLITE_JOURNAL_MODE", defaults.journal_mode),
+            synchronous=os.getenv("SQLITE_SYNCHRONOUS", defaults.synchronous),
+            busy_timeout=int(os.getenv("SQLITE_BUSY_TIMEOUT", defaults.busy_timeout)),
+            mmap_size=int(os.getenv("SQLITE_MMAP_SIZE", defaults.mmap_size)),
+            cache_size=int(os.getenv("SQLITE_CACHE_SIZE", defaults.cache_size)),
+            cached_statements=int(os.getenv("SQLITE_CACHED_STATEMENTS", defaults.cached_statements)),
+            readers=int(os.getenv("SQLITE_READERS", defaults.readers)),
+        )
+
+    def connect(self, db_path: str, readonly: bool = False) -> sqlite3.Connection:
+        """Открывает соединение с настройками профиля (каталог базы создается при необходимости)"""
+        if db_path != ":memory:" and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=self.busy_timeout / 1000, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        if not readonly:
+            # Режим журнала хранится в самой базе, его меняет только писатель
+            conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        if readonly:
+            conn.execute("PRAGMA query_only = 1")
+        trace_sql(conn)
+        return conn
+
+
+class ReaderPool:
+    """Пул соединений только для чтения, отдельный от единственного писателя.
+
+    В режиме WAL читатели видят последнее зафиксированное состояние и не
+    ждут транзакцию писателя. Соединения открываются по мере надобности,
+    но не больше profile.readers.
+    """
+
+    def __init__(self, db_path: str, profile: StorageProfile):
+        self.db_path = db_path
+        self.profile = profile
+        self._idle = queue.LifoQueue()  # Свободные открытые соединения
+        self._slots = threading.BoundedSemaphore(max(1, profile.readers))
+
+    @contextmanager
+    def connection(self):
+        with self._slots:  # Ждем, если все читатели заняты
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self.profile.connect(self.db_path, readonly=True)
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
@@ -0,0 +1,110 @@
+from typing import Dict, List, Optional, Set
+from storage import StorageProfile
+
+
+class SubscriptionStore:
+    """Подписки чатов бота на номера в очереди, сохраняемые в SQLite.
+
+    Держит в памяти индексы в обе стороны: chat_id -> номер и
+    номер -> множество чатов, поэтому поиск по вызванному номеру
+    выполняется за O(1), а один номер могут отслеживать несколько чатов.
+    База открывается с настройками StorageProfile (WAL, busy_timeout),
+    каталог базы создается при необходимости.
+    """
+
+    def __init__(self, db_path: str = "subscriptions.db", profile: Optional[StorageProfile] = None):
+        profile = profile or StorageProfile()
+        self.conn = profile.connect(db_path)
+        self._by_chat = {}   # {chat_id: {"queue_id": int, "notified_position": int}}
+        self._by_ticket = {}  # {queue_id: {chat_id, ...}}
+        self._init_db()
+
+    def _init_db(self):
+        """Создает таблицу подписок и загружает ее в память"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                chat_id INTEGER PRIMARY KEY,
+                queue_id INTEGER NOT NULL,
+                notified_position INTEGER
+            )
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS subscriptions_queue_id ON subscriptions (queue_id)"
+        )
+        self.conn.commit()
+        cursor.execute("SELECT chat_id, queue_id, notified_position FROM subscriptions")
+        for chat_id, queue_id, notified_position in cursor:
+            self._add(chat_id, queue_id, notified_position)
+
+    def _add(self, chat_id: int, queue_id: int, notified_position: Optional[int] = None):
+        self._by_chat[chat_id] = {"queue_id": queue_id, "notified_position": notified_position}
+        self._by_ticket.setdefault(queue_id, set()).add(chat_id)
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self._by_chat
+
+    def __len__(self) -> int:
+        return len(self._by_chat)
+
+    def get(self, chat_id: int) -> Optional[Dict]:
+        """Возвращает подписку чата или None"""
+        return self._by_chat.get(chat_id)
+
+    def chats_for(self, queue_id: int) -> Set[int]:
+        """Возвращает чаты, отслеживающие номер"""
+        return set(self._by_ticket.get(queue_id, ()))
+
+    def queue_ids(self) -> List[int]:
+        """Возвращает все отслеживаемые номера"""
+        return list(self._by_ticket)
+
+    def subscribe(self, chat_id: int, queue_id: int):
+        """Подписывает чат на номер (прежняя подписка чата заменяется)"""
+        self._remove(chat_id)
+        self._add(chat_id, queue_id)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO subscriptions (chat_id, queue_id) VALUES (?, ?)",
+            (chat_id, queue_id)
+        )
+        self.conn.commit()
+
+    def _remove(self, chat_id: int) -> bool:
+        data = self._by_chat.pop(chat_id, None)
+        if data is None:
+            return False
+        chats = self._by_ticket[data["queue_id"]]
+        chats.discard(chat_id)
+        if not chats:
+            del self._by_ticket[data["queue_id"]]
+        return True
+
+    def unsubscribe(self, chat_id: int) -> bool:
+        """Отписывает чат, возвращает False если подписки не было"""
+        if not self._remove(chat_id):
+            return False
+        self.conn.execute("DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,))
+        self.conn.commit()
+        return True
+
+    def unsubscribe_ticket(self, queue_id: int) -> Set[int]:
+        """Отписывает все чаты номера и возвращает их"""
+        chats = self._by_ticket.pop(queue_id, set())
+        for chat_id in chats:
+            del self._by_chat[chat_id]
+        if chats:
+            self.conn.execute("DELETE FROM subscriptions WHERE queue_id = ?", (queue_id,))
+            self.conn.commit()
+        return chats
+
+    def set_notified(self, chat_id: int, position: int):
+        """Запоминает позицию, о которой чат уже предупрежден"""
+        data = self._by_chat.get(chat_id)
+        if data is None:
+            return
+        data["notified_position"] = position
+        self.conn.execute(
+            "UPDATE subscriptions SET notified_position = ? WHERE chat_id = ?",
+            (position, chat_id)
+        )
+        self.conn.commit()
@@ -0,0 +1,178 @@
+"""Точка входа контейнера: владелец очередей, несколько процессов API и бот.
+
+Запускает queue_service.py, затем API_WORKERS процессов uvicorn с
+main1:app на общем слушающем сокете и, если RUN_BOT=1, tg_bot.py.
+Процессы API обращаются к очередям через сокет владельца, поэтому
+пишет в SQLite по-прежнему один процесс, а запросы делят все ядра.
+
+Упавший процесс перезапускается с паузой, которая растет при частых
+падениях. По SIGTERM/SIGINT процессы API и бот получают SIGTERM и
+дорабатывают начатые запросы (не дольше GRACEFUL_TIMEOUT секунд),
+после них останавливается владелец очередей и сбрасывает журнал в базу.
+
+    API_WORKERS=4 API_PORT=8000 python supervisor.py
+"""
+import argparse
+import logging
+import os
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dotenv import load_dotenv
+from queue_service import wait_ready
+
+RESTART_DELAY = 1  # Пауза перед первым перезапуском, секунд
+RESTART_DELAY_MAX = 30
+STABLE_AFTER = 30  # Проработавший столько секунд процесс считается стабильным
+KILL_AFTER = 5  # Сколько еще ждать после GRACEFUL_TIMEOUT, прежде чем убить процесс
+
+logger = logging.getLogger("supervisor")
+
+
+class Child:
+    """Процесс под наблюдением: перезапускается, если завершился не по команде"""
+
+    def __init__(self, name: str, args: list, env: dict, pass_fds: tuple = ()):
+        self.name = name
+        self.args = args
+        self.env = env
+        self.pass_fds = pass_fds
+        self.process = None
+        self.started_at = 0.0
+        self.restart_at = None
+        self.delay = RESTART_DELAY
+
+    def start(self):
+        # Своя сессия: Ctrl+C в терминале получает только супервизор,
+        # и он останавливает процессы в нужном порядке
+        self.process = subprocess.Popen(self.args, env=self.env, pass_fds=self.pass_fds,
+                                        start_new_session=True)
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        logger.info("%s started, pid %d", self.name, self.process.pid)
+
+    def check(self):
+        """Перезапускает процесс, если он завершился и пауза перед перезапуском прошла"""
+        now = time.monotonic()
+        if self.restart_at is None:
+            code = self.process.poll()
+            if code is None:
+                return
+            if now - self.started_at > STABLE_AFTER:
+                self.delay = RESTART_DELAY
+            self.restart_at = now + self.delay
+            logger.warning("%s exited with code %s, restart in %ss", self.name, code, self.delay)
+            self.delay = min(self.delay * 2, RESTART_DELAY_MAX)
+        elif now >= self.restart_at:
+            self.start()
+
+    def terminate(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+
+    def wait(self, deadline: float):
+        """Ждет завершения до deadline (time.monotonic), затем убивает процесс"""
+        try:
+            self.process.wait(max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            logger.warning("%s did not stop in time, killing", self.name)
+            self.process.kill()
+            self.process.wait()
+
+
+def listen(host: str, port: int) -> socket.socket:
+    """Слушающий сокет, который наследуют все процессы API"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(fd: int):
+    """Процесс API: uvicorn на унаследованном сокете fd"""
+    import uvicorn
+    sock = socket.socket(fileno=fd)
+    config = uvicorn.Config("main1:app", log_level=os.getenv("API_LOG_LEVEL", "info"),
+                            timeout_graceful_shutdown=float(os.getenv("GRACEFUL_TIMEOUT", "10")))
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def supervise(args):
+    env = dict(os.environ)
+    # Сокет и ключ владельца очередей; ключ новый при каждом запуске
+    env.setdefault("QUEUE_SOCKET", os.path.join(tempfile.gettempdir(), f"queue-{os.getpid()}.sock"))
+    env.setdefault("QUEUE_SOCKET_KEY", secrets.token_hex(16))
+    # Бот в том же контейнере ходит в API напрямую
+    env.setdefault("QUEUE_API_URL", f"http://127.0.0.1:{args.port}")
+    authkey = bytes.fromhex(env["QUEUE_SOCKET_KEY"])
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    owner = Child("queue_service", [sys.executable, "queue_service.py"], env)
+    owner.start()
+    if not wait_ready(env["QUEUE_SOCKET"], authkey):
+        owner.terminate()
+        sys.exit("queue_service не запустился")
+
+    sock = listen(args.host, args.port)
+    logger.info("listening on %s:%d, %d API workers", args.host, args.port, args.workers)
+    children = [Child(f"api-{index}", [sys.executable, __file__, "--worker-fd", str(sock.fileno())],
+                      env, (sock.fileno(),))
+                for index in range(args.workers)]
+    if args.bot:
+        children.append(Child("tg_bot", [sys.executable, "tg_bot.py"], env))
+    for child in children:
+        child.start()
+
+    while not stop.wait(0.5):
+        owner.check()
+        for child in children:
+            child.check()
+
+    logger.info("shutting down")
+    # uvicorn сам закрывает оставшиеся соединения (/events) по GRACEFUL_TIMEOUT
+    deadline = time.monotonic() + args.graceful_timeout + KILL_AFTER
+    for child in children:
+        child.terminate()
+    for child in children:
+        child.wait(deadline)
+    sock.close()
+    owner.terminate()
+    owner.wait(time.monotonic() + args.graceful_timeout + KILL_AFTER)
+
+
+def main():
+    load_dotenv()  # .env задает и значения по умолчанию ниже, и окружение всех процессов
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("API_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("API_WORKERS", "0")),
+                        help="процессов API (0 - по числу ядер)")
+    parser.add_argument("--bot", type=int, default=int(os.getenv("RUN_BOT", "1")),
+                        help="1 - запускать tg_bot.py")
+    parser.add_argument("--graceful-timeout", type=float,
+                        default=float(os.getenv("GRACEFUL_TIMEOUT", "10")))
+    parser.add_argument("--worker-fd", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if args.worker_fd is not None:
+        run_worker(args.worker_fd)
+        return
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    args.workers = args.workers or os.cpu_count() or 1
+    supervise(args)
+
+
+if __name__ == "__main__":
+    main()
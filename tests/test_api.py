@@ -0,0 +1,149 @@
+"""API очереди (main1.py) через TestClient: повтор /join и кэш ответов чтений.
+
+Нужны зависимости API (fastapi, httpx); сервер не поднимается.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import importlib
+import importlib.util
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+HAS_API = all(importlib.util.find_spec(name) for name in ("fastapi", "httpx"))
+main1 = None
+
+
+def setUpModule():
+    """main1 читает окружение при загрузке: база во временном каталоге, лимит - один /join"""
+    global main1, directory
+    if not HAS_API:
+        return
+    directory = tempfile.TemporaryDirectory()
+    env = {"QUEUE_DB": os.path.join(directory.name, "queue.db"), "QUEUE_FLUSH_INTERVAL": "0",
+           "JOIN_RATE_CLIENT": "0.001", "JOIN_BURST_CLIENT": "1", "JOIN_RATE_QUEUE": "0",
+           "JOIN_SHED_MS": "500"}
+    with mock.patch.dict(os.environ, env):
+        main1 = importlib.import_module("main1")
+
+
+def tearDownModule():
+    if main1 is not None:
+        main1.queue.manager.close()
+        directory.cleanup()
+
+
+@unittest.skipUnless(HAS_API, "нужны зависимости API")
+class JoinReplayTest(unittest.TestCase):
+    def setUp(self):
+        from fastapi.testclient import TestClient
+        self.client = TestClient(main1.app)
+
+    def join(self, key: str, qid: str):
+        return self.client.post(f"/queues/{qid}/join", json={"name": "a"}, headers={"Idempotency-Key": key})
+
+    def test_replay_skips_rate_limit_and_shedding(self):
+        first = self.join("replay-1", "replay")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.join("replay-2", "replay").status_code, 429)  # Лимит клиента исчерпан
+
+        replay = self.join("replay-1", "replay")
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json()["user_id"], first.json()["user_id"])
+
+        with mock.patch.object(main1.queue, "write_delay", return_value=60):
+            self.assertEqual(self.join("replay-1", "replay").status_code, 200)
+            self.assertEqual(self.join("replay-3", "replay").status_code, 503)
+
+        self.client.get("/queues/replay/next")
+        replay = self.join("replay-1", "replay")
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json()["user_id"], first.json()["user_id"])
+        self.assertIsNone(replay.json()["position"])
+
+
+@unittest.skipUnless(HAS_API, "нужны зависимости API")
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = main1.ResponseCache(size=2, ttl=60)
+        self.data = {"length": 1}
+        self.computed = 0
+
+    async def compute(self):
+        self.computed += 1
+        return self.data
+
+    def respond(self, version, key=("queues",), if_none_match=None):
+        request = SimpleNamespace(headers={"if-none-match": if_none_match} if if_none_match else {})
+        return asyncio.run(self.cache.respond(request, key, version, self.compute))
+
+    def test_keyed_by_version(self):
+        first = self.respond(1)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.body, b'{"length":1}')
+        self.respond(1)
+        self.assertEqual(self.computed, 1)
+
+        self.data = {"length": 2}
+        second = self.respond(2)  # Очередь изменилась - ответ пересчитан
+        self.assertEqual(self.computed, 2)
+        self.assertEqual(second.body, b'{"length":2}')
+        self.assertNotEqual(second.headers["etag"], first.headers["etag"])
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_no_caching_without_version(self):
+        self.respond(None)
+        self.respond(None)
+        self.assertEqual(self.computed, 2)
+        self.assertEqual(len(self.cache.entries), 0)
+
+    def test_expired_and_evicted_entries_are_recomputed(self):
+        self.cache.ttl = 0
+        self.respond(1)
+        self.respond(1)
+        self.assertEqual(self.computed, 2)
+
+        self.cache.ttl = 60
+        for key in ("a", "b", "c"):
+            self.respond(1, key=(key,))
+        self.assertEqual(list(self.cache.entries), [("b",), ("c",)])  # size=2, "a" вытеснен
+
+    def test_if_none_match_returns_304(self):
+        etag = self.respond(1).headers["etag"]
+        cached = self.respond(1, if_none_match=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.body, b"")
+        self.assertEqual(cached.headers["etag"], etag)
+        # Версия сменилась, а тело то же - ETag совпадает, снова 304
+        self.assertEqual(self.respond(2, if_none_match=etag).status_code, 304)
+
+        self.data = {"length": 2}
+        self.assertEqual(self.respond(3, if_none_match=etag).status_code, 200)
+        self.assertEqual(self.cache.not_modified, 2)
+
+    def test_matches(self):
+        matches = main1.ResponseCache.matches
+        self.assertTrue(matches('"abc"', '"abc"'))
+        self.assertTrue(matches('W/"abc"', '"abc"'))
+        self.assertTrue(matches('"x", W/"abc" ,"y"', '"abc"'))
+        self.assertTrue(matches("*", '"abc"'))
+        self.assertFalse(matches('"abcd"', '"abc"'))
+        self.assertFalse(matches('W/"x"', '"abc"'))
+        self.assertFalse(matches("", '"abc"'))
+        self.assertFalse(matches(None, '"abc"'))
+
+    def test_http_304(self):
+        from fastapi.testclient import TestClient
+        client = TestClient(main1.app)
+        first = client.get("/queue?limit=5")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers["cache-control"], "no-cache")
+        repeat = client.get("/queue?limit=5", headers={"If-None-Match": first.headers["etag"]})
+        self.assertEqual(repeat.status_code, 304)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Поток событий бота: переподключение после обрыва и ошибок в обработке событий.
+
+Нужны зависимости бота (aiogram, httpx); Telegram и API не нужны.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import importlib
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+HAS_BOT = all(importlib.util.find_spec(name) for name in ("aiogram", "httpx"))
+
+
+@unittest.skipUnless(HAS_BOT, "нужны зависимости бота")
+class EventStreamTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        env = {"TELEGRAM_BOT_TOKEN": "123456:TEST-token", "ADMINS": "1",
+               "SUBSCRIPTIONS_DB": os.path.join(cls.directory.name, "subscriptions.db")}
+        with mock.patch.dict(os.environ, env):
+            cls.tg_bot = importlib.import_module("tg_bot")  # Бот читает окружение при загрузке
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_reconnects_quickly_and_survives_bad_events(self):
+        import httpx
+        tg_bot = self.tg_bot
+        connections, heads = [], []
+
+        def handler(request):
+            connections.append(asyncio.get_event_loop().time())
+            if len(connections) == 1:
+                raise httpx.ConnectError("API is not up yet")
+            if len(connections) == 2:
+                return httpx.Response(503)
+            body = b'data: {"queue": "default"}\n\ndata: not json\n\ndata: {"head": [7, 8]}\n\n'
+            return httpx.Response(200, content=body)
+
+        async def process(head):
+            heads.append(head)
+
+        async def run():
+            tg_bot.http_client = httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(handler))
+            task = asyncio.create_task(tg_bot.listen_queue_events())
+            while len(connections) < 4:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await tg_bot.http_client.aclose()
+
+        with mock.patch.multiple(tg_bot, RECONNECT_DELAY=0.05, RECONNECT_DELAY_MAX=0.2,
+                                 process_queue_event=process), \
+                self.assertLogs("bot") as logs:
+            asyncio.run(asyncio.wait_for(run(), 10))
+
+        self.assertEqual(heads[:2], [[7, 8], [7, 8]])  # Событие без head и не-JSON пропущены
+        self.assertTrue(any("queue event failed" in line for line in logs.output))
+        gaps = [later - earlier for earlier, later in zip(connections, connections[1:])]
+        self.assertLess(max(gaps), 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+"""Календарь записей: наступившие записи встают в полосу по порядку времени записи.
+
+    python -m unittest discover tests
+"""
+import unittest
+from datetime import datetime, timedelta
+
+from queue_manager import QueueManager
+
+
+class CalendarTest(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime.now().replace(microsecond=0)
+        self.queue = QueueManager(":memory:", 0, clock=lambda: self.now)
+        self.addCleanup(self.queue.close)
+
+    def test_due_slots_promoted_in_slot_order(self):
+        walk_in = self.queue.add_user("walk-in")
+        slots = [7, 3, 5, 1, 9]
+        booked = {minutes: self.queue.add_user(f"slot{minutes}", slot_at=self.now + timedelta(minutes=minutes))
+                  for minutes in slots}
+        self.queue.remove_user(booked[5].id)  # Отказ до наступления записи
+        self.assertEqual(self.queue.get_position(booked[7].id), 3)  # Перед ним записи на 1 и 3
+
+        self.now += timedelta(minutes=8)
+        names = [user["name"] for user in self.queue.get_all_users()]
+        self.assertEqual(names, ["slot1", "slot3", "slot7", "walk-in"])
+        self.assertEqual(self.queue.get_position(walk_in.id), 4)
+        self.assertEqual(self.queue.get_position(booked[9].id), 4)  # Еще ждет записи, встанет за ними
+        self.assertEqual(self.queue.get_next().name, "slot1")
+
+    def test_earlier_booking_in_lower_lane_is_not_ahead(self):
+        first = self.queue.add_user("a", slot_at=self.now + timedelta(minutes=5))
+        urgent = self.queue.add_user("b", priority=2, slot_at=self.now + timedelta(minutes=10))
+        self.assertEqual(self.queue.get_position(first.id), 1)
+        self.assertEqual(self.queue.get_position(urgent.id), 1)  # Запись "a" встанет в полосу ниже
+
+        self.now += timedelta(minutes=10)
+        self.assertEqual(self.queue.get_position(urgent.id), 1)
+        self.assertEqual(self.queue.get_position(first.id), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""Одновременные вызовы /next: каждый номер вызывается ровно один раз.
+
+Потоки в одном процессе делят QueueManager, процессы API под
+supervisor.py - владельца очередей queue_service.py.
+
+    python -m unittest discover tests
+"""
+import collections
+import importlib.util
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from queue_manager import QueueManager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CALLERS = 8
+
+
+def call_until_empty(call_batch, seed: int, served: list):
+    """Вызывает пачками случайного размера (1 - как /next), пока очередь не опустеет"""
+    rng = random.Random(seed)
+    while True:
+        users = call_batch(rng.choice((1, 1, 2, 5)))
+        if not users:
+            return
+        served.extend(users)
+
+
+def run_callers(call_batch) -> list:
+    """Запускает CALLERS потоков call_until_empty и возвращает все вызванные номера"""
+    served = [[] for _ in range(CALLERS)]
+    threads = [threading.Thread(target=call_until_empty, args=(call_batch, index, served[index]))
+               for index in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [user_id for ids in served for user_id in ids]
+
+
+class ThreadedServeTest(unittest.TestCase):
+    def check(self, flush_interval: float):
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "queue.db")
+            queue = QueueManager(db_path, flush_interval)
+            try:
+                ids = [user.id for user in queue.add_users((f"u{index}", None, 0, None) for index in range(2000))]
+                # Пока вызывают, в очередь продолжают вставать
+                joined = []
+                joiner = threading.Thread(target=lambda: joined.extend(
+                    queue.add_user(f"j{index}").id for index in range(500)))
+                joiner.start()
+                served = run_callers(lambda count: [user.id for user in queue.get_next_batch(count)])
+                joiner.join()
+                served += run_callers(lambda count: [user.id for user in queue.get_next_batch(count)])
+            finally:
+                queue.close()
+
+            duplicates = [user_id for user_id, times in collections.Counter(served).items() if times > 1]
+            self.assertEqual(duplicates, [])
+            self.assertEqual(sorted(served), sorted(ids + joined))
+            queue = QueueManager(db_path, flush_interval)
+            try:
+                self.assertEqual(queue.get_all_users(), [])
+            finally:
+                queue.close()
+
+    def test_sync(self):
+        self.check(0)
+
+    def test_write_behind(self):
+        self.check(0.05)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@unittest.skipUnless(importlib.util.find_spec("httpx") and importlib.util.find_spec("uvicorn"),
+                     "нужны httpx и uvicorn")
+class SupervisorServeTest(unittest.TestCase):
+    """/next/batch из нескольких процессов API под supervisor.py"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        port = free_port()
+        env = {**os.environ, "QUEUE_DB": os.path.join(self.directory.name, "queue.db"),
+               "API_HOST": "127.0.0.1", "API_PORT": str(port), "API_WORKERS": "2",
+               "RUN_BOT": "0", "API_LOG_LEVEL": "warning", "JOIN_RATE_CLIENT": "0",
+               "JOIN_RATE_QUEUE": "0", "JOIN_SHED_MS": "0"}
+        self.process = subprocess.Popen([sys.executable, "supervisor.py"], cwd=ROOT, env=env)
+        self.addCleanup(self.stop)
+        self.url = f"http://127.0.0.1:{port}"
+        self.wait_ready()
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(20)
+
+    def wait_ready(self):
+        import httpx
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{self.url}/queues", timeout=1)
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def test_each_ticket_called_once(self):
+        import httpx
+        with httpx.Client(base_url=self.url, timeout=30) as http:
+            for qid in ("default", "cash"):
+                path = "/join/batch" if qid == "default" else f"/queues/{qid}/join/batch"
+                tickets = [{"client_id": f"{qid}-{index}", "name": f"u{index}"} for index in range(300)]
+                response = http.post(path, json={"tickets": tickets})
+                response.raise_for_status()
+                ids = [ticket["user_id"] for ticket in response.json()["tickets"]]
+
+                def call_batch(count):
+                    # Свой клиент на вызов: запросы расходятся по соединениям и процессам API
+                    with httpx.Client(base_url=self.url, timeout=30) as caller:
+                        response = caller.get(path.replace("join/batch", "next/batch"), params={"count": count})
+                    if response.status_code == 404:
+                        return []
+                    response.raise_for_status()
+                    return [user["user_id"] for user in response.json()["users"]]
+
+                served = run_callers(call_batch)
+                self.assertEqual(len(served), len(set(served)))
+                self.assertEqual(sorted(served), sorted(ids))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""Архив визитов: интервалы /stats по местному времени, чтение сводки без записи в базу.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import history
+from history import CALLED, JOINED, VisitHistory
+from queue_manager import AsyncQueueManager
+
+
+@unittest.skipUnless(hasattr(time, "tzset"), "нужен time.tzset")
+class LocalBucketsTest(unittest.TestCase):
+    def use_zone(self, zone: str):
+        previous = os.environ.get("TZ")
+        os.environ["TZ"] = zone
+        time.tzset()
+
+        def restore():
+            if previous is None:
+                os.environ.pop("TZ", None)
+            else:
+                os.environ["TZ"] = previous
+            time.tzset()
+        self.addCleanup(restore)
+
+    def stats(self, events, **kwargs):
+        history = VisitHistory(":memory:")
+        self.addCleanup(history.close)
+        for user_id, at in enumerate(events):
+            history.add("cash", user_id, JOINED, at)
+            history.add("cash", user_id, CALLED, at, 60.0)
+        history.flush()
+        return history.stats(**kwargs)
+
+    def test_day_starts_at_local_midnight(self):
+        self.use_zone("Asia/Novosibirsk")  # UTC+7: в UTC эти визиты пришлись бы на два дня
+        events = [datetime(2024, 5, 1, 1, 30), datetime(2024, 5, 1, 12, 0), datetime(2024, 5, 1, 23, 30),
+                  datetime(2024, 5, 2, 0, 30)]
+        result = self.stats(events, since=datetime(2024, 4, 30).timestamp(),
+                            until=datetime(2024, 5, 3).timestamp(), bucket=86400)
+        self.assertEqual([(datetime.fromtimestamp(row["at"]), row["joined"]) for row in result["series"]],
+                         [(datetime(2024, 5, 1), 3), (datetime(2024, 5, 2), 1)])
+        self.assertEqual(result["totals"]["called"], 4)
+        self.assertEqual(result["totals"]["avg_wait"], 60.0)
+
+    def test_day_of_daylight_saving_switch_is_one_bucket(self):
+        self.use_zone("Europe/Berlin")  # 31 марта 2024 в 02:00 часы переводятся на 03:00
+        events = [datetime(2024, 3, 31, 0, 30), datetime(2024, 3, 31, 4, 0), datetime(2024, 3, 31, 23, 30)]
+        result = self.stats(events, since=datetime(2024, 3, 30).timestamp(),
+                            until=datetime(2024, 4, 2).timestamp(), bucket=86400)
+        self.assertEqual([(datetime.fromtimestamp(row["at"]), row["joined"]) for row in result["series"]],
+                         [(datetime(2024, 3, 31), 3)])
+
+    def test_hourly_buckets_unchanged(self):
+        self.use_zone("Asia/Novosibirsk")
+        events = [datetime(2024, 5, 1, 10, 5), datetime(2024, 5, 1, 10, 55), datetime(2024, 5, 1, 11, 0)]
+        result = self.stats(events, since=datetime(2024, 5, 1).timestamp(),
+                            until=datetime(2024, 5, 2).timestamp())
+        self.assertEqual([(datetime.fromtimestamp(row["at"]).hour, row["joined"]) for row in result["series"]],
+                         [(10, 2), (11, 1)])
+
+
+
+class StatsReadTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "history.db")
+
+    def test_read_does_not_flush(self):
+        visits = VisitHistory(self.path)
+        self.addCleanup(visits.close)
+        visits.add("cash", 1, JOINED, datetime.now())
+        self.assertEqual(visits.stats()["totals"]["joined"], 0)  # Событие еще в буфере
+        visits.flush(history.HISTORY_BATCH)
+        self.assertEqual(visits.stats()["totals"]["joined"], 0)  # Пачка не набралась
+        with mock.patch.object(history, "HISTORY_MAX_AGE", 0):
+            visits.flush(history.HISTORY_BATCH)  # Но событие ждет слишком долго
+        self.assertEqual(visits.stats()["totals"]["joined"], 1)
+
+    def test_stats_skip_writer_thread(self):
+        queue = AsyncQueueManager(os.path.join(os.path.dirname(self.path), "queue.db"), 0)
+        self.addCleanup(queue.close)
+        threads = []
+        stats = queue.manager.history.stats
+
+        def recorded(*args):
+            threads.append(threading.current_thread().name)
+            return stats(*args)
+
+        async def run():
+            await queue.add_user("a")
+            with mock.patch.object(queue.manager.history, "stats", recorded):
+                result = await queue.get_stats()
+            return result, queue._writes
+
+        result, writes = asyncio.run(run())
+        self.assertEqual(result["queue"], None)
+        self.assertTrue(threads[0].startswith("queue-query"))
+        self.assertEqual(writes, 1)  # Только add_user
+
+
+if __name__ == "__main__":
+    unittest.main()
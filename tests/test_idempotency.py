@@ -0,0 +1,82 @@
+"""Повторный /join с тем же client_id: тот же номер и после вызова, в пределах CLIENT_ID_TTL.
+
+    python -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from queue_manager import QueueManager
+
+
+class Clock:
+    """Часы, которые двигает тест"""
+
+    def __init__(self):
+        self.now = datetime.now().replace(microsecond=0)
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+class ClientIdTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.db_path = os.path.join(self.directory.name, "queue.db")
+        self.clock = Clock()
+
+    def open(self) -> QueueManager:
+        queue = QueueManager(self.db_path, 0, clock=self.clock)
+        queue.client_id_ttl = timedelta(hours=1)
+        return queue
+
+    def test_replay_after_serve_returns_same_ticket(self):
+        queue = self.open()
+        self.addCleanup(queue.close)
+        first = queue.add_user("a", "key1")
+        self.assertEqual(queue.add_user("a", "key1").id, first.id)
+        self.assertEqual(queue.get_next().id, first.id)
+        replay = queue.add_user("a", "key1")
+        self.assertEqual(replay.id, first.id)
+        self.assertIsNone(queue.get_status(replay.id))  # Уже вызван, в очередь не вернулся
+        self.assertEqual(queue.get_all_users(), [])
+
+    def test_replay_after_leave_and_restart(self):
+        queue = self.open()
+        first = queue.add_user("a", "key1")
+        queue.remove_user(first.id)
+        queue.close()
+
+        queue = self.open()
+        self.addCleanup(queue.close)
+        self.assertEqual(queue.add_user("a", "key1").id, first.id)
+        self.assertEqual(queue.get_all_users(), [])
+
+    def test_client_id_expires_after_ttl(self):
+        queue = self.open()
+        self.addCleanup(queue.close)
+        first = queue.add_user("a", "key1")
+        queue.get_next()
+        self.clock.now += timedelta(minutes=59)
+        self.assertEqual(queue.add_user("a", "key1").id, first.id)
+        self.clock.now += timedelta(minutes=2)
+        fresh = queue.add_user("a", "key1")
+        self.assertNotEqual(fresh.id, first.id)
+        self.assertEqual(queue.get_position(fresh.id), 1)
+
+    def test_expired_client_ids_are_not_loaded(self):
+        queue = self.open()
+        first = queue.add_user("a", "key1")
+        queue.get_next()
+        queue.close()
+
+        self.clock.now += timedelta(hours=2)
+        queue = self.open()
+        self.addCleanup(queue.close)
+        self.assertNotEqual(queue.add_user("a", "key1").id, first.id)
+
+
+if __name__ == "__main__":
+    unittest.main()
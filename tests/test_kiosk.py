@@ -0,0 +1,145 @@
+"""Журнал временных билетов киоска: переживает обрыв записи и уходит на сервер пачками.
+
+Нужны зависимости киоска (tkinter, Pillow, requests); экран не нужен.
+
+    python -m unittest discover tests
+"""
+from json import dumps
+import os
+import queue
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    import requests
+    import robot_interface
+    from robot_interface import CatQueueApp, TicketJournal
+except ImportError:  # Киоск ставится отдельно от сервера
+    robot_interface = None
+
+
+class FakeSession:
+    """Сервер /join/batch: 422 на пачку больше max_items или с пустым именем, ConnectionError по флагу"""
+
+    def __init__(self, limit=1000):
+        self.limit = limit
+        self.sizes = []
+        self.next_id = 1
+        self.down = False
+
+    def post(self, url, json, timeout):
+        if self.down:
+            raise requests.ConnectionError("no route to host")
+        tickets = json["tickets"]
+        self.sizes.append(len(tickets))
+        response = requests.Response()
+        if len(tickets) > self.limit or any(not ticket["name"] for ticket in tickets):
+            response.status_code = 422
+            response._content = b'{"detail": "invalid"}'
+            return response
+        issued = []
+        for ticket in tickets:
+            issued.append({"client_id": ticket["client_id"], "user_id": self.next_id, "position": self.next_id})
+            self.next_id += 1
+        response.status_code = 200
+        response._content = dumps({"tickets": issued}).encode()
+        return response
+
+
+class Kiosk:
+    """Часть CatQueueApp, которая синхронизирует журнал, без окна Tk"""
+
+    if robot_interface is not None:
+        sync_journal = CatQueueApp.sync_journal
+        sync_batch = CatQueueApp.sync_batch
+
+    def __init__(self, journal):
+        self.journal = journal
+        self.sync_results = queue.Queue()
+        self.offline = True
+
+
+@unittest.skipIf(robot_interface is None, "нужны зависимости киоска")
+class TicketJournalTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "journal.jsonl")
+
+    def test_torn_last_line_is_dropped(self):
+        journal = TicketJournal(self.path)
+        first = journal.issue("a")
+        journal.issue("b")
+        with open(self.path, "rb+") as f:
+            f.truncate(os.path.getsize(self.path) - 7)  # Питание пропало посреди второй записи
+
+        journal = TicketJournal(self.path)
+        self.assertEqual([entry["client_id"] for entry in journal.unsynced()], [first["client_id"]])
+        third = journal.issue("c")
+        self.assertEqual(third["local_number"], 2)
+        journal = TicketJournal(self.path)
+        self.assertEqual([entry["name"] for entry in journal.unsynced()], ["a", "c"])
+
+    def test_broken_middle_line_is_skipped(self):
+        with open(self.path, "w") as f:
+            f.write(dumps({"client_id": "x", "local_number": 1, "name": "a"}) + "\n")
+            f.write("{garbage\n")
+            f.write(dumps({"client_id": "y", "local_number": 2, "name": "b"}))  # Без перевода строки
+        journal = TicketJournal(self.path)
+        journal.issue("c")
+        journal = TicketJournal(self.path)
+        self.assertEqual([entry["name"] for entry in journal.unsynced()], ["a", "b", "c"])
+
+
+@unittest.skipIf(robot_interface is None, "нужны зависимости киоска")
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal = TicketJournal(os.path.join(directory.name, "journal.jsonl"))
+        self.kiosk = Kiosk(self.journal)
+        self.server = FakeSession(limit=10)
+        patcher = mock.patch.multiple(robot_interface, sync_session=self.server, SYNC_BATCH=10)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def synced(self):
+        tickets = []
+        while not self.kiosk.sync_results.empty():
+            tickets.extend(self.kiosk.sync_results.get_nowait())
+        return tickets
+
+    def test_long_outage_syncs_in_chunks(self):
+        for index in range(25):
+            self.journal.issue(f"u{index}")
+        self.kiosk.sync_journal()
+        self.assertEqual(self.server.sizes, [10, 10, 5])
+        self.assertEqual([ticket["user_id"] for ticket in self.synced()], list(range(1, 26)))
+        self.assertFalse(self.kiosk.offline)
+        self.assertEqual(self.journal.unsynced(), [])
+
+    def test_rejected_ticket_does_not_block_others(self):
+        for index in range(8):
+            self.journal.issue("" if index == 5 else f"u{index}")
+        self.kiosk.sync_journal()
+        tickets = self.synced()
+        self.assertEqual([ticket["local_number"] for ticket in tickets if ticket["user_id"] is None], [6])
+        self.assertEqual(sorted(ticket["local_number"] for ticket in tickets if ticket["user_id"]),
+                         [1, 2, 3, 4, 5, 7, 8])
+        self.assertFalse(self.kiosk.offline)
+        self.assertEqual(TicketJournal(self.journal.path).unsynced(), [])
+
+    def test_no_connection_keeps_journal(self):
+        self.journal.issue("a")
+        self.server.down = True
+        self.kiosk.sync_journal()
+        self.assertTrue(self.kiosk.offline)
+        self.assertEqual(len(self.journal.unsynced()), 1)
+        self.server.down = False
+        self.kiosk.sync_journal()
+        self.assertFalse(self.kiosk.offline)
+
+
+if __name__ == "__main__":
+    unittest.main()
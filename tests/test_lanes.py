@@ -0,0 +1,68 @@
+"""Полосы очереди: перенумерация держит индекс по длине очереди и не сбивает курсоры страниц.
+
+    python -m unittest discover tests
+"""
+import random
+import unittest
+from unittest import mock
+
+import queue_manager
+from queue_manager import QueueManager
+
+
+class LaneCompactionTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(queue_manager, "LANE_COMPACT_MIN", 16)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queue = QueueManager(":memory:", 3600)
+        self.addCleanup(self.queue.close)
+        self.lane = self.queue._queue(queue_manager.DEFAULT_QUEUE).lanes[0]
+
+    def test_index_stays_bounded_by_queue_length(self):
+        for index in range(50):
+            self.queue.add_user(f"u{index}")
+        for index in range(5000):
+            self.queue.add_user(f"v{index}")
+            self.queue.get_next()
+            self.assertLessEqual(len(self.lane.ids), max(2 * len(self.lane), 16) + 1)
+        self.assertLessEqual(self.lane.index.size, 1024)
+        users = self.queue.get_all_users()
+        self.assertEqual(len(users), 50)
+        for position, user in enumerate(users, 1):
+            self.assertEqual(self.queue.get_position(user["user_id"]), position)
+
+    def test_cursors_survive_compaction(self):
+        rng = random.Random(1)
+        joined, standing, departed = [], set(), []
+        for step in range(3000):
+            if rng.random() < 0.55 or not standing:
+                user_id = self.queue.add_user(f"u{step}").id
+                joined.append(user_id)
+                standing.add(user_id)
+            else:
+                if rng.random() < 0.5:
+                    user_id = self.queue.get_next().id
+                else:
+                    user_id = rng.choice(sorted(standing))
+                    self.queue.remove_user(user_id)
+                standing.discard(user_id)
+                departed.append(user_id)
+            if step % 50 == 0:
+                for cursor in departed[-20:] + rng.sample(sorted(standing), min(5, len(standing))):
+                    self.check_page(cursor, joined, standing)
+
+    def check_page(self, cursor: int, joined: list, standing: set):
+        order = joined.index(cursor)
+        before = [user_id for user_id in joined[:order] if user_id in standing]
+        after = [user_id for user_id in joined[order + 1:] if user_id in standing]
+        page = self.queue.get_page(after=cursor, limit=5)["queue"]
+        self.assertEqual([row["user_id"] for row in page], after[:5])
+        first = len(before) + (cursor in standing) + 1
+        self.assertEqual([row["position"] for row in page], list(range(first, first + len(page))))
+        page = self.queue.get_page(before=cursor, limit=5)["queue"]
+        self.assertEqual([row["user_id"] for row in page], before[-5:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+"""Именованные очереди: чтение несуществующей очереди ее не создает.
+
+    python -m unittest discover tests
+"""
+import unittest
+
+from queue_manager import QueueManager
+
+
+class UnknownQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = QueueManager(":memory:", 0)
+        self.addCleanup(self.queue.close)
+
+    def test_reads_do_not_create_queues(self):
+        self.queue.add_user("a", qid="cash")
+        for index in range(100):
+            qid = f"junk{index}"
+            self.assertEqual(self.queue.get_page(qid=qid)["queue"], [])
+            self.assertEqual(self.queue.get_head(5, qid), [])
+            self.assertEqual(self.queue.get_all_users(qid), [])
+            self.assertEqual(self.queue.get_changes(0, qid)["changes"], [])
+            self.assertEqual(self.queue.get_next_batch(3, qid), [])
+            self.assertFalse(self.queue.finish_user(1, qid))
+        self.assertEqual([entry["queue"] for entry in self.queue.get_queues()], ["cash"])
+        self.assertEqual(set(self.queue._lengths()), {("cash",)})
+
+    def test_changes_cursor_of_missing_queue_leads_to_snapshot(self):
+        changes = self.queue.get_changes(0, "later")
+        self.assertEqual(changes["version"], 0)
+        self.assertEqual(self.queue.get_changes(0, "later")["version"], 0)
+        user = self.queue.add_user("a", qid="later")
+        changes = self.queue.get_changes(0, "later")
+        self.assertTrue(changes["reset"])
+        self.assertEqual(changes["queue"], [{"user_id": user.id, "name": "a"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
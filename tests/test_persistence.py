@@ -0,0 +1,128 @@
+"""Журнал QueueManager: сбой записи в SQLite и аварийное завершение не теряют сброшенного.
+
+    python -m unittest discover tests
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from queue_manager import QueueManager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Процесс с фоновым сбросом: 50 человек и 10 вызовов успевают уйти в базу
+# потоком сброса, затем сброс останавливается, и хвост из 20 постановок и
+# одного вызова остается только в журнале, когда процесс убивают SIGKILL
+CRASHING_WRITER = """
+import os, signal, sys, time
+from queue_manager import QueueManager
+queue = QueueManager(sys.argv[1], 0.05)
+for index in range(50):
+    queue.add_user(f"a{index}")
+for _ in range(10):
+    queue.get_next()
+time.sleep(0.5)
+queue._stop.set()
+queue._flusher.join()
+for index in range(20):
+    queue.add_user(f"b{index}")
+queue.get_next()
+os.kill(os.getpid(), signal.SIGKILL)
+"""
+
+
+class FlakyConnection:
+    """Соединение, у которого первые failures вызовов cursor() падают, как при "database is locked" """
+
+    def __init__(self, conn: sqlite3.Connection, failures: int = 1):
+        self.conn = conn
+        self.failures = failures
+
+    def cursor(self):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return self.conn.cursor()
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def stored_names(db_path: str) -> list:
+    conn = sqlite3.connect(db_path)
+    try:
+        return [name for name, in conn.execute("SELECT name FROM users ORDER BY id")]
+    finally:
+        conn.close()
+
+
+class FailedFlushTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.directory.name, "queue.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open(self, flush_interval: float) -> QueueManager:
+        queue = QueueManager(self.db_path, flush_interval)
+        self.addCleanup(queue.close)
+        queue.conn = FlakyConnection(queue.conn)
+        return queue
+
+    def test_write_behind_retries_and_keeps_flushing(self):
+        queue = self.open(0.05)
+        with self.assertLogs("queue", "ERROR"):
+            queue.add_user("a")
+            time.sleep(0.3)
+        queue.add_user("b")
+        time.sleep(0.3)
+        self.assertTrue(queue._flusher.is_alive())
+        self.assertEqual(stored_names(self.db_path), ["a", "b"])
+
+    def test_sync_mode_writes_failed_change_with_next(self):
+        queue = self.open(0)
+        with self.assertLogs("queue", "ERROR"):
+            user = queue.add_user("a")  # Ошибка записи не отменяет изменения в памяти
+        self.assertEqual(queue.get_position(user.id), 1)
+        self.assertEqual(stored_names(self.db_path), [])
+        queue.add_user("b")
+        self.assertEqual(stored_names(self.db_path), ["a", "b"])
+
+    def test_journal_keeps_order_after_failure(self):
+        queue = self.open(3600)
+        first = queue.add_user("a")
+        with self.assertRaises(sqlite3.OperationalError):
+            queue.flush()
+        queue.remove_user(first.id)  # delete после insert, который не записался
+        queue.add_user("b")
+        queue.flush()
+        self.assertEqual(stored_names(self.db_path), ["b"])
+
+
+class CrashRecoveryTest(unittest.TestCase):
+    def test_flushed_changes_survive_kill(self):
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "queue.db")
+            process = subprocess.run([sys.executable, "-c", CRASHING_WRITER, db_path], cwd=ROOT)
+            self.assertEqual(process.returncode, -9)
+
+            queue = QueueManager(db_path, 0.05)
+            try:
+                # Сброшенное на месте в прежнем порядке, несброшенный хвост потерян
+                users = queue.get_all_users()
+                self.assertEqual([user["name"] for user in users], [f"a{index}" for index in range(10, 50)])
+                self.assertEqual(queue.get_position(users[0]["user_id"]), 1)
+                self.assertEqual(queue.get_next().name, "a10")
+                # Номера сброшенных билетов не выдаются повторно
+                self.assertGreater(queue.add_user("c").id, 50)
+            finally:
+                queue.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""Лимиты /join: пополнение ведер, предел burst и отказ по очереди без траты токенов клиента.
+
+    python -m unittest discover tests
+"""
+import unittest
+
+from ratelimit import JoinLimiter, TokenBuckets
+
+
+class TokenBucketsTest(unittest.TestCase):
+    def test_refill_and_burst_cap(self):
+        buckets = TokenBuckets(rate=2, burst=3)
+        for _ in range(3):
+            self.assertEqual(buckets.wait("a", 0), 0)
+            buckets.take("a", 0)
+        self.assertAlmostEqual(buckets.wait("a", 0), 0.5)  # Токен появится через 1/rate
+        self.assertAlmostEqual(buckets.wait("a", 0.25), 0.25)
+        self.assertEqual(buckets.wait("a", 0.5), 0)
+
+        # Простой в 100 секунд дает не больше burst токенов подряд
+        for _ in range(3):
+            self.assertEqual(buckets.wait("a", 100), 0)
+            buckets.take("a", 100)
+        self.assertGreater(buckets.wait("a", 100), 0)
+        self.assertEqual(buckets.wait("b", 100), 0)  # У другого ключа свое ведро
+
+    def test_zero_rate_is_unlimited(self):
+        buckets = TokenBuckets(rate=0, burst=1)
+        for _ in range(100):
+            buckets.take("a", 0)
+            self.assertEqual(buckets.wait("a", 0), 0)
+
+    def test_forgotten_key_gets_full_bucket(self):
+        buckets = TokenBuckets(rate=1, burst=1, size=2)
+        for key in ("a", "b", "c"):
+            buckets.take(key, 0)
+        self.assertEqual(buckets.wait("a", 0), 0)  # "a" вытеснен
+        self.assertGreater(buckets.wait("c", 0), 0)
+
+
+class JoinLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.limiter = JoinLimiter(client_rate=1, client_burst=2, queue_rate=1, queue_burst=3,
+                                   clock=lambda: self.now)
+
+    def test_client_limit_and_refill(self):
+        self.assertIsNone(self.limiter.admit("10.0.0.1", "q"))
+        self.assertIsNone(self.limiter.admit("10.0.0.1", "q"))
+        limit, wait = self.limiter.admit("10.0.0.1", "q")
+        self.assertEqual(limit, "client")
+        self.assertAlmostEqual(wait, 1)
+
+        self.now += 1
+        self.assertIsNone(self.limiter.admit("10.0.0.1", "q"))
+
+    def test_queue_refusal_keeps_client_tokens(self):
+        for client in ("a", "b", "c"):
+            self.assertIsNone(self.limiter.admit(client, "q"))
+        for _ in range(5):
+            self.assertEqual(self.limiter.admit("d", "q")[0], "queue")
+        # Отказы по очереди не тронули ведро "d": в другую очередь он проходит burst раз
+        self.assertIsNone(self.limiter.admit("d", "other"))
+        self.assertIsNone(self.limiter.admit("d", "other"))
+        self.assertEqual(self.limiter.admit("d", "other")[0], "client")
+
+    def test_client_refusal_keeps_queue_tokens(self):
+        self.limiter.admit("a", "q")
+        self.limiter.admit("a", "q")
+        for _ in range(5):
+            self.assertEqual(self.limiter.admit("a", "q")[0], "client")
+        self.assertIsNone(self.limiter.admit("b", "q"))  # В ведре очереди остался третий токен
+        self.assertEqual(self.limiter.admit("c", "q")[0], "queue")
+
+
+if __name__ == "__main__":
+    unittest.main()
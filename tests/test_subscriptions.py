@@ -0,0 +1,36 @@
+"""Подписки бота: база в подкаталоге (SUBSCRIPTIONS_DB=data/subscriptions.db) и WAL.
+
+    python -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+
+from subscriptions import SubscriptionStore
+
+
+class SubscriptionStoreTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "data", "subscriptions.db")
+
+    def open(self):
+        store = SubscriptionStore(self.path)
+        self.addCleanup(store.conn.close)
+        return store
+
+    def test_creates_directory_and_persists(self):
+        store = self.open()
+        self.assertEqual(store.conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        store.subscribe(1, 42)
+        store.subscribe(2, 42)
+        store.set_notified(1, 3)
+
+        store = self.open()
+        self.assertEqual(store.chats_for(42), {1, 2})
+        self.assertEqual(store.get(1)["notified_position"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,20 +1,51 @@
 import httpx
 import asyncio
+import json
+import logging
+import random
+import time
 from aiogram import Bot, Dispatcher, types
+from aiogram.bot.api import TELEGRAM_PRODUCTION, TelegramAPIServer
 from aiogram.utils import executor
+from aiogram.utils.exceptions import BotBlocked, CantInitiateConversation, ChatNotFound, UserDeactivated
 from aiogram.dispatcher import FSMContext
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from config import Config
+from metrics import REGISTRY, serve as serve_metrics
+import profiler
+from subscriptions import SubscriptionStore
 
 # Конфигурация
 BOT_TOKEN = Config.TOKEN
-API_URL = "http://192.168.0.104:8000"
+API_URL = Config.API_URL
 ADMINS = [int(i) for i in Config.ADMINS.split(",")]
 NOTIFY_BEFORE = 3  # Уведомлять за 3 позиции до очереди
+SEND_LIMIT = 25  # Не больше 25 сообщений в секунду (лимит Telegram - около 30)
+API_TIMEOUT = 5  # Секунд на один запрос к API
+API_RETRIES = 2  # Повторы при таймауте или ответе 5xx
+LIST_PAGE_SIZE = 20  # Строк очереди на одной странице /list
+RECONNECT_DELAY = 1  # Пауза перед переподключением к потоку /events, секунд
+RECONNECT_DELAY_MAX = 5  # Предел паузы при повторяющихся обрывах
+# Ошибки Telegram, после которых чату больше не писать
+UNREACHABLE = (BotBlocked, CantInitiateConversation, ChatNotFound, UserDeactivated)
+
+# Метрики; /metrics (и /debug/profile, если задан PROFILE_TOKEN) на порту BOT_METRICS_PORT
+POLL_SECONDS = REGISTRY.histogram("bot_poll_seconds", "Цикл опроса позиций подписчиков с рассылкой, секунд")
+EVENT_SECONDS = REGISTRY.histogram("bot_event_seconds", "Обработка события потока /events, секунд")
+API_SECONDS = REGISTRY.histogram("bot_api_request_seconds",
+                                 "Запрос бота к API очереди, секунд; result - код ответа или ошибка",
+                                 ("method", "result"))
+SEND_SECONDS = REGISTRY.histogram("telegram_send_seconds", "Отправка сообщения в Telegram, секунд",
+                                  ("kind",))
+SEND_FAILURES = REGISTRY.counter("telegram_send_failures_total", "Неудачные отправки в Telegram",
+                                 ("kind", "error"))
+
+logger = logging.getLogger("bot")
 
 # Инициализация
-bot = Bot(token=BOT_TOKEN)
+bot = Bot(token=BOT_TOKEN, server=TelegramAPIServer.from_base(Config.TELEGRAM_API_URL)
+          if Config.TELEGRAM_API_URL else TELEGRAM_PRODUCTION)
 storage = MemoryStorage()
 dp = Dispatcher(bot, storage=storage)
 
@@ -24,7 +55,10 @@ class UserStates(StatesGroup):
 
 
 # Хранилище данных
-user_data = {}  # {chat_id: {"queue_id": int, "name": str}}
+user_data = SubscriptionStore(Config.SUBSCRIPTIONS_DB)  # chat_id <-> номер в очереди
+send_semaphore = asyncio.Semaphore(SEND_LIMIT)
+http_client = None  # Общий keep-alive клиент, создается в on_startup
+REGISTRY.gauge("bot_subscriptions", "Подписанных чатов", (), lambda: {(): len(user_data)})
 
 
 # Клавиатуры
@@ -38,16 +72,38 @@ def get_main_keyboard(is_admin=False):
 
 
 # API клиент
-async def api_request(method: str, endpoint: str, data=None):
-    async with httpx.AsyncClient() as client:
+class ApiError(Exception):
+    """API очереди недоступно: таймаут, обрыв соединения или ответ 5xx"""
+
+
+async def api_request(method: str, endpoint: str, data=None, retries=API_RETRIES):
+    """Запрос к API через общий клиент; повторяет с разбросом и бросает ApiError.
+
+    Для неидемпотентных запросов (например, /next) передавайте retries=0.
+    """
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
         try:
-            if method == "GET":
-                response = await client.get(f"{API_URL}{endpoint}")
-            elif method == "POST":
-                response = await client.post(f"{API_URL}{endpoint}", json=data)
-            return response.json()
-        except httpx.RequestError:
-            return None
+            response = await http_client.request(method, endpoint, json=data)
+            API_SECONDS.observe(time.perf_counter() - started, method, str(response.status_code))
+            if response.status_code < 500:
+                return response.json()
+            error = ApiError(f"{method} {endpoint}: HTTP {response.status_code}")
+        except httpx.TransportError as e:
+            API_SECONDS.observe(time.perf_counter() - started, method, type(e).__name__)
+            error = ApiError(f"{method} {endpoint}: {e!r}")
+        if attempt < retries:
+            await asyncio.sleep(0.2 * 2 ** attempt * random.uniform(0.5, 1.5))
+    raise error
+
+
+@dp.errors_handler(exception=ApiError)
+async def api_error_handler(update: types.Update, exception: ApiError):
+    if update.message:
+        await update.message.answer("❌ Сервер очереди недоступен, попробуйте позже")
+    elif update.callback_query:
+        await update.callback_query.answer("❌ Сервер очереди недоступен, попробуйте позже")
+    return True
 
 
 # Обработчики команд
@@ -95,7 +151,7 @@ async def process_queue_id(message: types.Message, state: FSMContext):
         return
 
     # Сохраняем данные пользователя
-    user_data[message.from_user.id] = {"queue_id": queue_id}
+    user_data.subscribe(message.from_user.id, queue_id)
 
     await message.answer(
         f"✅ Вы успешно подключены!\n"
@@ -111,7 +167,7 @@ async def cmd_position(message: types.Message):
         await message.answer("❌ Сначала введите /start для полключения")
         return
 
-    queue_id = user_data[message.from_user.id]["queue_id"]
+    queue_id = user_data.get(message.from_user.id)["queue_id"]
     response = await api_request("GET", f"/status/{queue_id}")
 
     if not response or "position" not in response:
@@ -123,10 +179,15 @@ async def cmd_position(message: types.Message):
         status = "Сейчас ваша очередь!"
     elif position <= NOTIFY_BEFORE:
         status = "Ваша очередь скоро подойдёт!"
+    else:
+        status = ""
+    wait = response.get("estimated_wait")
+    if wait is not None and position > 1:
+        status += f"\n⏳ Примерное ожидание: {max(1, round(wait / 60))} мин"
 
     await message.answer(
         f"📍 Ваша позиция: {position}\n"
-        f"{status}",
+        f"{status.strip()}",
         reply_markup=get_main_keyboard(is_admin=message.from_user.id in ADMINS)
     )
 
@@ -137,11 +198,11 @@ async def cmd_leave(message: types.Message):
         await message.answer("❌ Вы не в очереди")
         return
 
-    queue_id = user_data[message.from_user.id]["queue_id"]
+    queue_id = user_data.get(message.from_user.id)["queue_id"]
     response = await api_request("POST", f"/leave/{queue_id}", {})
 
     if response and "success" in response:
-        del user_data[message.from_user.id]
+        user_data.unsubscribe(message.from_user.id)
         await message.answer("✅ Вы вышли из очереди", reply_markup=types.ReplyKeyboardRemove())
     else:
         await message.answer("❌ Ошибка при выходе из очереди")
@@ -153,17 +214,73 @@ async def cmd_list(message: types.Message):
         await message.answer("❌ Эта команда доступна только администраторам")
         return
 
-    response = await api_request("GET", "/queue")
+    response = await api_request("GET", f"/queue?limit={LIST_PAGE_SIZE}")
     if not response or "queue" not in response:
         await message.answer("❌ Ошибка при получении очереди")
         return
 
+    text, markup = format_queue_page(response)
+    await message.answer(text, reply_markup=markup)
+
+
+def format_queue_page(response):
+    """Текст страницы очереди и кнопки перехода к соседним страницам"""
+    if not response["queue"]:
+        return "📋 Очередь пуста", None
+
     queue_list = []
-    for index, user in enumerate(response["queue"]):
-        queue_list.append(f"{index + 1}. {user['name']} (ID: {user['user_id']})")
+    for user in response["queue"]:
+        queue_list.append(f"{user['position']}. {user['name']} (ID: {user['user_id']})")
 
-    await message.answer(
-        "📋 Текущая очередь:\n" + "\n".join(queue_list))
+    markup = types.InlineKeyboardMarkup()
+    buttons = []
+    if response["prev_before"] is not None:
+        buttons.append(types.InlineKeyboardButton("⬅️ Назад", callback_data=f"list:before:{response['prev_before']}"))
+    if response["next_after"] is not None:
+        buttons.append(types.InlineKeyboardButton("Вперёд ➡️", callback_data=f"list:after:{response['next_after']}"))
+    markup.row(*buttons)
+
+    return "📋 Текущая очередь:\n" + "\n".join(queue_list), markup
+
+
+@dp.callback_query_handler(lambda call: call.data.startswith("list:"))
+async def list_page(call: types.CallbackQuery):
+    if call.from_user.id not in ADMINS:
+        await call.answer("❌ Эта команда доступна только администраторам")
+        return
+
+    _, direction, cursor = call.data.split(":")
+    response = await api_request("GET", f"/queue?limit={LIST_PAGE_SIZE}&{direction}={cursor}")
+    if not response or "queue" not in response:
+        await call.answer("❌ Ошибка при получении очереди")
+        return
+
+    text, markup = format_queue_page(response)
+    await call.message.edit_text(text, reply_markup=markup)
+    await call.answer()
+
+
+async def send_message(kind: str, chat_id: int, text: str, **kwargs):
+    """bot.send_message с замером времени; ошибка учитывается по виду сообщения и пробрасывается"""
+    started = time.perf_counter()
+    try:
+        return await bot.send_message(chat_id, text, **kwargs)
+    except Exception as e:
+        SEND_FAILURES.inc(kind, type(e).__name__)
+        raise
+    finally:
+        SEND_SECONDS.observe(time.perf_counter() - started, kind)
+
+
+async def notify_served(user_id: int):
+    """Уведомляет подписчиков, что номер вызвали, и перестает его отслеживать"""
+    for chat_id in user_data.unsubscribe_ticket(user_id):
+        try:
+            # Отправляем уведомление пользователю
+            await send_message("served", chat_id, "🎉 Ваша очередь подошла! Пожалуйста, подойдите к стойке.")
+        except Exception:
+            # Подписка уже снята; ошибка учтена в telegram_send_failures_total
+            pass
 
 
 @dp.message_handler(commands=['next'])
@@ -173,67 +290,132 @@ async def cmd_next(message: types.Message):
         await message.answer("❌ Эта команда доступна только администраторам")
         return
 
-    # Получаем следующего пользователя из очереди через API
-    response = await api_request("GET", "/next")
+    # /next 3 - вызвать сразу нескольких (по одному на каждое окно)
+    args = message.get_args()
+    count = min(int(args), 50) if args.isdigit() and int(args) > 0 else 1
+
+    # Получаем следующих пользователей из очереди одним запросом к API
+    response = await api_request("GET", f"/next/batch?count={count}", retries=0)
 
-    if not response or "user_id" not in response:
+    if not response or "users" not in response:
         await message.answer("❌ Очередь пуста или произошла ошибка")
         return
 
     # Формируем сообщение для администратора
-    admin_msg = (
-        f"✅ Следующий пользователь:\n"
-        f"🔢 Номер в очереди: {response['user_id']}\n"
-        f"👤 Имя: {response['name']}"
-    )
-
-    # Удаляем пользователя из локального хранилища, если он был зарегистрирован в боте
-    for chat_id, data in list(user_data.items()):
-        if data["queue_id"] == response["user_id"]:
-            try:
-                # Отправляем уведомление пользователю
-                await bot.send_message(
-                    chat_id,
-                    "🎉 Ваша очередь подошла! Пожалуйста, подойдите к стойке."
-                )
-                del user_data[chat_id]  # Удаляем из отслеживания
-            except:
-                # Если пользователь заблокировал бота, просто удаляем
-                del user_data[chat_id]
-            break
+    admin_msg = "✅ Следующий пользователь:" if len(response["users"]) == 1 else "✅ Следующие пользователи:"
+    for user in response["users"]:
+        admin_msg += (
+            f"\n🔢 Номер в очереди: {user['user_id']}\n"
+            f"👤 Имя: {user['name']}"
+        )
+        # Удаляем пользователя из локального хранилища, если он был зарегистрирован в боте
+        await notify_served(user["user_id"])
 
     await message.answer(admin_msg, reply_markup=get_main_keyboard(is_admin=True))
 
-# Периодическая проверка очереди
+async def notify_position(chat_id: int, position: int):
+    """Предупреждает о приближении очереди, если позиция перешла порог"""
+    data = user_data.get(chat_id)
+    if not data or not 1 < position <= NOTIFY_BEFORE + 1:
+        return
+    if data["notified_position"] == position:
+        return  # Об этой позиции уже сообщали
+    user_data.set_notified(chat_id, position)
+    async with send_semaphore:
+        try:
+            await send_message(
+                "position",
+                chat_id,
+                f"🔔 Ваша очередь приближается! Вы на позиции: {position}.",
+                reply_markup=get_main_keyboard(is_admin=chat_id in ADMINS)
+            )
+        except UNREACHABLE:
+            user_data.unsubscribe(chat_id)  # Удаляем если пользователь заблокировал бота
+        except Exception:
+            pass  # Сбой сети или лимит Telegram: подписка остается до следующей позиции
+        await asyncio.sleep(1)  # Место в семафоре освобождается через секунду
+
+
+async def notify_positions(positions: dict):
+    """Параллельно рассылает уведомления по словарю {queue_id: позиция}"""
+    await asyncio.gather(*(
+        notify_position(chat_id, position)
+        for queue_id, position in positions.items()
+        for chat_id in user_data.chats_for(queue_id)
+    ))
+
+
+# Периодическая проверка очереди (используется, пока поток событий недоступен)
 async def check_queue_and_notify():
-    for chat_id, data in user_data.items():
-        queue_id = data["queue_id"]
-        response = await api_request("GET", f"/status/{queue_id}")
-
-        if not response or "position" not in response:
-            continue
-
-        position = response["position"]
-        if 1 < position <= NOTIFY_BEFORE + 1:
-            try:
-                await bot.send_message(
-                    chat_id,
-                    f"🔔 Ваша очередь приближается! Вы на позиции: {position}.",
-                    reply_markup=get_main_keyboard(is_admin=chat_id in ADMINS)
-                )
-            except:
-                del user_data[chat_id]  # Удаляем если пользователь заблокировал бота
-
-
-async def scheduler():
+    if not user_data:
+        return
+    with POLL_SECONDS.time():
+        queue_ids = user_data.queue_ids()
+        response = await api_request("POST", "/status/batch", {"user_ids": queue_ids})
+
+        if not response or "positions" not in response:
+            return
+
+        await notify_positions({int(queue_id): position
+                                for queue_id, position in response["positions"].items()})
+
+
+async def process_queue_event(head: list):
+    """Пересчитывает позиции только для тех, кто попал в начало своей очереди"""
+    with EVENT_SECONDS.time():
+        await notify_positions({queue_id: index + 1 for index, queue_id in enumerate(head)})
+
+
+async def listen_queue_events():
+    """Подписывается на поток /events/all (все очереди); при обрыве опрашивает API и переподключается.
+
+    Переподключение - через RECONNECT_DELAY секунд со случайной добавкой,
+    при обрывах подряд пауза удваивается до RECONNECT_DELAY_MAX: так
+    перезапуск API или его процесса почти не задерживает уведомления, а
+    боты не приходят все разом. Ошибка разбора или рассылки одного события
+    пишется в лог и не останавливает поток.
+    """
+    delay = RECONNECT_DELAY
     while True:
-        await check_queue_and_notify()
-        await asyncio.sleep(30)  # Проверяем каждые 30 секунд
+        try:
+            async with http_client.stream("GET", "/events/all", params={"head": NOTIFY_BEFORE + 1},
+                                          timeout=None) as response:
+                response.raise_for_status()
+                delay = RECONNECT_DELAY  # Подключились: следующий обрыв снова с короткой паузы
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    try:
+                        await process_queue_event(json.loads(line[6:])["head"])
+                    except Exception:
+                        logger.exception("queue event failed: %s", line)
+        except httpx.HTTPError as e:
+            logger.warning("queue events stream dropped: %s", e)
+        except Exception:
+            logger.exception("queue events stream failed")
+        try:
+            await check_queue_and_notify()  # Изменения, пришедшие во время обрыва
+        except Exception:
+            logger.exception("queue poll failed")
+        await asyncio.sleep(delay * random.uniform(0.5, 1))
+        delay = min(delay * 2, RECONNECT_DELAY_MAX)
 
 
 async def on_startup(dp):
-    asyncio.create_task(scheduler())
+    global http_client
+    http_client = httpx.AsyncClient(
+        base_url=API_URL,
+        timeout=API_TIMEOUT,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+    )
+    if Config.METRICS_PORT:
+        serve_metrics(int(Config.METRICS_PORT), routes={"/debug/profile": profiler.http_profile})
+    asyncio.create_task(listen_queue_events())
+
+
+async def on_shutdown(dp):
+    await http_client.aclose()
 
 
 if __name__ == '__main__':
-    executor.start_polling(dp, on_startup=on_startup, skip_updates=True)
+    executor.start_polling(dp, on_startup=on_startup, on_shutdown=on_shutdown, skip_updates=True)